@@ -0,0 +1,84 @@
+# bio_vectors_benchmark.py
+"""TF-IDF описаний: пересборка, правка одной анкеты, пакетная схожесть.
+
+Запуск из каталога bot2:
+    python benchmarks/bio_vectors_benchmark.py [кол-во анкет]
+
+Описания - случайные слова с частотами по закону Ципфа из словаря в
+VOCABULARY_SIZE слов, по 5-40 слов.
+"""
+import itertools
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bio_vectors import BioVectorStore
+from profile_codec import personality_code
+
+VOCABULARY_SIZE = 20000
+CANDIDATES = 10000
+LETTERS = 'абвгдежзиклмнопрстуфхцчшэюя'
+
+def random_bios(rng, count):
+    words = [''.join(rng.choice(LETTERS) for _ in range(rng.randint(4, 9))) for _ in range(VOCABULARY_SIZE)]
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY_SIZE + 1)))
+    return [' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(5, 40))) for _ in range(count)]
+
+def main(count=100000, seed=3):
+    rng = random.Random(seed)
+    bios = random_bios(rng, count)
+    rows = list(enumerate(bios, start=1))
+
+    store = BioVectorStore()
+    started = time.perf_counter()
+    store.rebuild(rows)
+    rebuild_seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    measured = BioVectorStore()
+    measured.rebuild(rows)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del measured
+    stats = store.get_stats()
+    print(f"Анкет {count}: пересборка {rebuild_seconds:.2f} с, слов {stats['terms']}, ненулевых {stats['nonzeros']}, "
+          f"память {current / 1024 / 1024:.1f} МБ (пик {peak / 1024 / 1024:.1f} МБ)")
+
+    edited = rng.sample(range(1, count + 1), 1000)
+    new_bios = random_bios(rng, len(edited))
+    started = time.perf_counter()
+    for telegram_id, bio in zip(edited, new_bios):
+        store.update(telegram_id, bio)
+    update_us = (time.perf_counter() - started) / len(edited) * 1e6
+
+    candidates = np.array(rng.sample(range(1, count + 1), min(CANDIDATES, count)), dtype=np.int64)
+    viewers = rng.sample(range(1, count + 1), 50)
+    started = time.perf_counter()
+    for viewer in viewers:
+        similarity = store.similarity_many(viewer, candidates)
+    batch_ms = (time.perf_counter() - started) / len(viewers) * 1000
+
+    started = time.perf_counter()
+    scalar = [store.similarity(viewers[-1], int(candidate)) for candidate in candidates[:1000]]
+    scalar_ms = (time.perf_counter() - started) / 1000 * len(candidates) * 1000
+    equal = all((value is None and np.isnan(batch)) or value == batch
+                for value, batch in zip(scalar, similarity[:1000]))
+
+    # Прежний расчет: тип личности по ключевым словам, на каждое описание
+    started = time.perf_counter()
+    for bio in bios[:len(candidates)]:
+        personality_code(bio)
+    keywords_ms = (time.perf_counter() - started) * 1000
+
+    print(f"Правка описания: {update_us:.1f} мкс")
+    print(f"Схожесть с {len(candidates)} кандидатами: пакетно {batch_ms:.2f} мс, по одной паре {scalar_ms:.0f} мс, "
+          f"совпадает: {equal}; типы личности по ключевым словам {keywords_ms:.1f} мс")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,75 @@
+# compatibility_benchmark.py
+"""Сравнение скалярного и пакетного расчета совместимости.
+
+Запуск из каталога bot2:
+    python benchmarks/compatibility_benchmark.py [кол-во кандидатов]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scratch_database import use_scratch_database
+use_scratch_database()
+
+from batch_scoring import rank_candidates, score_arrays, profiles_to_arrays
+from database import AdvancedCompatibilitySystem
+from profile_codec import (
+    INTEREST_NAMES, RELATIONSHIP_GOAL_NAMES, LIFESTYLE_NAMES, HABITS_NAMES, ZODIAC_NAMES,
+    PERSONALITY_WORDS, profile_features
+)
+
+BIO_WORDS = sorted(set().union(*PERSONALITY_WORDS)) + ['привет', 'люблю', 'гулять', 'кофе']
+
+def random_profile(rng, user_id):
+    """Случайная анкета; часть полей пустая или вне словаря, как в реальной базе"""
+    user = {
+        'user_id': user_id,
+        'age': rng.randint(18, 45),
+        'interests': rng.sample(INTEREST_NAMES, rng.randint(0, 6)),
+        'relationship_goal': rng.choice(RELATIONSHIP_GOAL_NAMES + [None]),
+        'lifestyle': rng.choice(LIFESTYLE_NAMES + [None, 'Другое']),
+        'habits': rng.choice(HABITS_NAMES + [None]),
+        'zodiac': rng.choice(ZODIAC_NAMES + [None]),
+        'bio': ' '.join(rng.choice(BIO_WORDS) for _ in range(rng.randint(0, 12)))
+    }
+    user.update(profile_features(user))
+    return user
+
+def main(count=10000, seed=42):
+    rng = random.Random(seed)
+    system = AdvancedCompatibilitySystem()
+    viewer = random_profile(rng, 0)
+    candidates = [random_profile(rng, user_id) for user_id in range(1, count + 1)]
+
+    started = time.perf_counter()
+    scalar = [system.calculate_advanced_compatibility(viewer, candidate)['overall'] for candidate in candidates]
+    scalar_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    arrays = profiles_to_arrays(candidates)
+    convert_time = time.perf_counter() - started
+    started = time.perf_counter()
+    batch = score_arrays(viewer, arrays, system.weights).tolist()
+    score_time = time.perf_counter() - started
+
+    mismatches = sum(1 for a, b in zip(scalar, batch) if a != b)
+    assert mismatches == 0, f"{mismatches} баллов не совпали со скалярным расчетом"
+
+    started = time.perf_counter()
+    ranked = rank_candidates(viewer, candidates, system.weights, top_k=50, min_score=70)
+    rank_time = time.perf_counter() - started
+    expected = sorted(range(count), key=lambda index: -scalar[index])
+    expected = [index + 1 for index in expected if scalar[index] >= 70][:50]
+    assert [user['user_id'] for user, score in ranked] == expected, "порядок ранжирования отличается"
+
+    print(f"Кандидатов: {count}, баллы совпадают")
+    print(f"Скалярный расчет:     {scalar_time * 1000:8.1f} мс")
+    print(f"Перевод в массивы:    {convert_time * 1000:8.1f} мс")
+    print(f"Пакетный расчет:      {score_time * 1000:8.1f} мс ({scalar_time / score_time:.0f}x)")
+    print(f"rank_candidates top-50: {rank_time * 1000:6.1f} мс")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
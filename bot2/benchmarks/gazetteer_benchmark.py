@@ -0,0 +1,91 @@
+# gazetteer_benchmark.py
+"""Загрузка справочника населенных пунктов: время, память, скорость запросов.
+
+Запуск из каталога bot2:
+    python benchmarks/gazetteer_benchmark.py [путь к TSV | кол-во пунктов]
+
+Без пути генерируется файл в формате GeoNames со случайными пунктами на
+территории России (по умолчанию 50 тыс.).
+"""
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gazetteer import Gazetteer, read_gazetteer
+
+def write_geonames(path, count, rng):
+    with open(path, 'w', encoding='utf-8') as geonames_file:
+        for number in range(1, count + 1):
+            latitude = rng.uniform(42, 72)
+            longitude = rng.uniform(27, 180)
+            alternates = f"Пункт {number},Punkt {number}"
+            fields = [str(number), f"Punkt {number}", f"Punkt {number}", alternates,
+                      f"{latitude:.5f}", f"{longitude:.5f}", 'P', 'PPL', 'RU', '', '', '', '', '',
+                      str(rng.randint(100, 100000)), '', '0', 'Asia/Tomsk', '2024-01-01']
+            geonames_file.write('\t'.join(fields) + '\n')
+
+def brute_force_km(gazetteer, latitude, longitude):
+    lat1, lat2 = math.radians(latitude), np.radians(gazetteer.latitudes.astype(np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(gazetteer.longitudes.astype(np.float64) - longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return float((2 * 6371 * np.arcsin(np.sqrt(np.minimum(a, 1)))).min())
+
+def main(source, seed=7):
+    rng = random.Random(seed)
+    root = None
+    if os.path.exists(source):
+        path = source
+    else:
+        root = tempfile.mkdtemp(prefix='gazetteer-')
+        path = os.path.join(root, 'synthetic.txt')
+        write_geonames(path, int(source), rng)
+
+    try:
+        started = time.perf_counter()
+        gazetteer = Gazetteer(read_gazetteer(path))
+        load_seconds = time.perf_counter() - started
+
+        # Память - отдельной загрузкой: tracemalloc в разы замедляет выделения
+        tracemalloc.start()
+        measured = Gazetteer(read_gazetteer(path))
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del measured
+        stats = gazetteer.get_stats()
+        print(f"Пунктов {stats['settlements']}, названий {stats['names']}: загрузка {load_seconds:.2f} с, "
+              f"память {current / 1024 / 1024:.1f} МБ (пик {peak / 1024 / 1024:.1f} МБ), "
+              f"из них массивы {stats['array_bytes'] / 1024 / 1024:.1f} МБ")
+
+        queries = [(rng.uniform(42, 72), rng.uniform(27, 180)) for _ in range(5000)]
+        started = time.perf_counter()
+        results = [gazetteer.nearest(latitude, longitude) for latitude, longitude in queries]
+        nearest_us = (time.perf_counter() - started) / len(queries) * 1e6
+
+        started = time.perf_counter()
+        expected = [brute_force_km(gazetteer, latitude, longitude) for latitude, longitude in queries[:500]]
+        brute_us = (time.perf_counter() - started) / 500 * 1e6
+        errors = sum(abs(result['distance_km'] - distance) > 0.1 for result, distance in zip(results, expected))
+
+        names = [gazetteer.names[rng.randrange(len(gazetteer))] for _ in range(5000)]
+        started = time.perf_counter()
+        found = sum(gazetteer.find(name) is not None for name in names)
+        find_us = (time.perf_counter() - started) / len(names) * 1e6
+
+        print(f"Ближайший пункт: {nearest_us:.1f} мкс (полный перебор {brute_us:.1f} мкс), расхождений {errors}/500")
+        print(f"Поиск по названию: {find_us:.1f} мкс, найдено {found}/{len(names)}")
+    finally:
+        if root:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '50000')
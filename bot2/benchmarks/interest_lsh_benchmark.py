@@ -0,0 +1,99 @@
+# interest_lsh_benchmark.py
+"""Полнота и скорость отбора кандидатов через MinHash/LSH против полного перебора.
+
+Запуск из каталога bot2:
+    python benchmarks/interest_lsh_benchmark.py [кол-во анкет в разделе]
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scratch_database import use_scratch_database
+use_scratch_database()
+
+from compatibility_benchmark import random_profile
+from batch_scoring import POPCOUNT_16, rank_arrays
+from candidate_index import CandidateIndex
+from config import config
+from database import AdvancedCompatibilitySystem
+from interest_lsh import minhash_signature
+
+TOP_K = 50
+KEY = (0, 'Женский', '👨 Парни')
+
+def random_row(rng, user_id):
+    row = random_profile(rng, user_id)
+    row.update({
+        'telegram_id': user_id,
+        'geo_cell': KEY[0],
+        'gender': KEY[1],
+        'target_gender': KEY[2],
+        'is_active': 1,
+        'trust_score': rng.randint(0, 100),
+        'created_at': 1700000000 + user_id
+    })
+    return row
+
+def recall(expected_scores, got_scores):
+    """Доля мест top-K, занятых анкетами не хуже K-й из полного перебора (равные баллы взаимозаменяемы)"""
+    if not len(expected_scores):
+        return 1.0
+    threshold = expected_scores[-1]
+    return min(len(expected_scores), int((got_scores >= threshold).sum())) / len(expected_scores)
+
+def main(count=100000, queries=200, seed=11):
+    rng = random.Random(seed)
+    weights = AdvancedCompatibilitySystem().weights
+    index = CandidateIndex()
+    started = time.perf_counter()
+    index.load(random_row(rng, user_id) for user_id in range(1, count + 1))
+    print(f"Анкет {count}: индекс с LSH построен за {time.perf_counter() - started:.2f} с, {index.get_stats()['lsh']}")
+
+    viewers = [random_profile(rng, -number) for number in range(1, queries * 2)]
+    viewers = [viewer for viewer in viewers if viewer['interests_mask']][:queries]
+    full_time = lsh_time = 0.0
+    shortlist_sizes, overall_recall, interest_recall = [], [], []
+    for viewer in viewers:
+        started = time.perf_counter()
+        candidates = index.candidates([KEY], 0, 200)
+        order, expected = rank_arrays(viewer, candidates, weights, top_k=TOP_K)
+        full_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        shortlist = index.similar(minhash_signature(viewer['interests_mask']), [KEY], 0, 200,
+                                  limit=config.INTEREST_LSH_SHORTLIST)
+        order, got = rank_arrays(viewer, shortlist, weights, top_k=TOP_K)
+        lsh_time += time.perf_counter() - started
+
+        shortlist_sizes.append(len(shortlist['telegram_id']))
+        overall_recall.append(recall(expected, got))
+
+        # Полнота по одному Жаккару интересов: лучшие K из всех против лучших K из короткого списка
+        def jaccard(masks):
+            return POPCOUNT_16[masks & viewer['interests_mask']] / POPCOUNT_16[masks | viewer['interests_mask']]
+        exact = np.sort(jaccard(candidates['interests_mask']))[::-1][:TOP_K]
+        found = np.sort(jaccard(shortlist['interests_mask']))[::-1][:TOP_K]
+        interest_recall.append(recall(exact, found))
+
+    started = time.perf_counter()
+    for user_id in range(1, 1001):
+        index.upsert(random_row(rng, user_id))
+    for user_id in range(1, 1001):
+        index.remove(user_id)
+    update_us = (time.perf_counter() - started) / 2000 * 1e6
+
+    print(f"Запросов {len(viewers)}, top-{TOP_K}, короткий список не больше {config.INTEREST_LSH_SHORTLIST}")
+    print(f"Полный перебор: {full_time / len(viewers) * 1000:6.2f} мс на запрос")
+    print(f"LSH:            {lsh_time / len(viewers) * 1000:6.2f} мс на запрос, "
+          f"в среднем {np.mean(shortlist_sizes):.0f} кандидатов")
+    print(f"Полнота по Жаккару интересов: {np.mean(interest_recall):.3f}, "
+          f"по итоговой совместимости: {np.mean(overall_recall):.3f}")
+    print(f"Вставка/удаление анкеты: {update_us:.1f} мкс")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,87 @@
+# like_neighbours_benchmark.py
+"""Пересчет похожих анкет по лайкам: время и память на нескольких миллионах лайков.
+
+Запуск из каталога bot2:
+    python benchmarks/like_neighbours_benchmark.py [кол-во пользователей]
+
+Лайки пишутся во временную базу SQLite: активность пользователей -
+логнормальная (в среднем около 33 лайков), популярность анкет - по закону
+Ципфа. Дальше те же шаги, что у Database.rebuild_like_neighbours: чтение
+likes, расчет, запись таблицы соседей.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from like_neighbours import item_neighbours, peak_rss_mb, read_likes
+
+TOP_K = 20
+
+def random_likes(rng, users):
+    activity = np.minimum(rng.lognormal(3, 1, users).astype(np.int64) + 1, 2000)
+    popularity = 1 / np.arange(1, users + 1) ** 0.8
+    targets = rng.choice(users, size=int(activity.sum()), p=popularity / popularity.sum())
+    likers = np.repeat(np.arange(users), activity)
+    keys = np.unique(likers * users + rng.permutation(users)[targets])
+    keys = keys[keys // users != keys % users]
+    return rng.permutation(np.column_stack(np.divmod(keys, users)) + 1000000)
+
+def main(users=100000, seed=9):
+    rng = np.random.default_rng(seed)
+    root = tempfile.mkdtemp(prefix='likes-')
+    try:
+        connection = sqlite3.connect(os.path.join(root, 'likes.db'))
+        connection.execute("""
+            CREATE TABLE likes (id INTEGER PRIMARY KEY AUTOINCREMENT, from_user_id INTEGER NOT NULL,
+                                to_user_id INTEGER NOT NULL, UNIQUE(from_user_id, to_user_id))
+        """)
+        connection.executemany("INSERT INTO likes (from_user_id, to_user_id) VALUES (?, ?)",
+                               random_likes(rng, users).tolist())
+        connection.commit()
+
+        started = time.perf_counter()
+        likes = read_likes(connection.execute("SELECT from_user_id, to_user_id FROM likes ORDER BY id"))
+        loaded = time.perf_counter()
+        neighbours = item_neighbours(likes[:, 0], likes[:, 1], top_k=TOP_K)
+        computed = time.perf_counter()
+        connection.execute("""
+            CREATE TABLE like_neighbours (user_id INTEGER NOT NULL, neighbour_id INTEGER NOT NULL,
+                                          score REAL NOT NULL, co_likes INTEGER NOT NULL,
+                                          PRIMARY KEY (user_id, neighbour_id)) WITHOUT ROWID
+        """)
+        connection.executemany("INSERT INTO like_neighbours VALUES (?, ?, ?, ?)", zip(
+            neighbours['user_id'].tolist(), neighbours['neighbour_id'].tolist(),
+            neighbours['score'].tolist(), neighbours['co_likes'].tolist()
+        ))
+        connection.commit()
+        written = time.perf_counter()
+        process_peak = peak_rss_mb()
+
+        # Память расчета - отдельным прогоном: tracemalloc замедляет выделения
+        tracemalloc.start()
+        item_neighbours(likes[:, 0], likes[:, 1], top_k=TOP_K)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        connection.close()
+        table_mb = os.path.getsize(os.path.join(root, 'likes.db')) / 1024 / 1024
+
+        print(f"Лайков {len(likes)} от {users} пользователей")
+        print(f"Чтение {loaded - started:.1f} с, расчет {computed - loaded:.1f} с, запись {written - computed:.1f} с, "
+              f"всего {written - started:.1f} с")
+        print(f"Соседей {len(neighbours['user_id'])} у {len(np.unique(neighbours['user_id']))} анкет, "
+              f"файл базы {table_mb:.0f} МБ")
+        print(f"Пик памяти расчета {peak / 1024 / 1024:.0f} МБ (массив лайков {likes.nbytes / 1024 / 1024:.0f} МБ), "
+              f"пик процесса {process_peak} МБ")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,76 @@
+# recommendations_benchmark.py
+"""Масштабирование ночного расчета рекомендаций по числу процессов.
+
+Запуск из каталога bot2:
+    python benchmarks/recommendations_benchmark.py [кол-во анкет]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scratch_database import use_scratch_database
+use_scratch_database()
+
+from compatibility_benchmark import random_profile
+from candidate_index import CandidateIndex, GENDERS, TARGET_GENDER_TO_GENDERS
+from database import AdvancedCompatibilitySystem, AdvancedLocationSystem
+from geo_index import cell_of
+from recommendation_worker import compute_recommendations
+from snapshot_store import SnapshotWriter
+
+CITIES = ['Томск', 'Новосибирск', 'Москва', 'Казань']
+CITY_COORDINATES = AdvancedLocationSystem().city_coordinates
+
+def random_row(rng, user_id):
+    row = random_profile(rng, user_id)
+    city = rng.choice(CITIES)
+    latitude, longitude = CITY_COORDINATES[city]
+    # Разброс вокруг центра города, примерно до 20 км
+    latitude += rng.uniform(-0.15, 0.15)
+    longitude += rng.uniform(-0.25, 0.25)
+    row.update({
+        'telegram_id': user_id,
+        'gender': rng.choice(GENDERS[:2]),
+        'target_gender': rng.choice(list(TARGET_GENDER_TO_GENDERS)),
+        'city': city,
+        'latitude': latitude,
+        'longitude': longitude,
+        'geo_cell': cell_of(latitude, longitude),
+        'is_premium': rng.random() < 0.1,
+        'is_active': 1,
+        'trust_score': rng.randint(0, 100),
+        'created_at': 1700000000 + user_id
+    })
+    return row
+
+def main(count=20000, seed=7):
+    rng = random.Random(seed)
+    index = CandidateIndex()
+    index.load(random_row(rng, user_id) for user_id in range(1, count + 1))
+    columns, meta = index.export()
+    weights = AdvancedCompatibilitySystem().weights
+
+    root = tempfile.mkdtemp(prefix='snapshots-')
+    try:
+        generation = SnapshotWriter(root).publish(columns, meta)
+        size = sum(os.path.getsize(os.path.join(root, generation, name)) for name in os.listdir(os.path.join(root, generation)))
+        print(f"Снимок {generation}: {size / 1024 / 1024:.1f} МБ, общий для всех процессов")
+
+        baseline = None
+        cpu_count = os.cpu_count() or 1
+        workers = 1
+        while workers <= cpu_count:
+            stats = compute_recommendations(root, generation, workers, weights)
+            baseline = baseline or stats['users_per_sec']
+            print(f"{workers:2d} процессов: {stats['seconds']:6.2f} с, {stats['users_per_sec']:9.1f} польз./с, "
+                  f"ускорение {stats['users_per_sec'] / baseline:4.1f}x, строк {stats['recommendations']}")
+            workers *= 2
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,28 @@
+# scratch_database.py
+"""Временная база для бенчмарков.
+
+Импорт database создает глобальный Database(): миграции, поток записи,
+загрузку индексов. Бенчмаркам нужны только классы из database, поэтому до
+этого импорта путь к базе переводится во временный каталог - рабочая
+data/tochkasvoda.db не открывается. Каталог удаляется при выходе.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+from config import config
+
+_path = None
+
+def use_scratch_database() -> str:
+    """Путь временной базы; вызывать до первого импорта database"""
+    global _path
+    if _path is None:
+        if 'database' in sys.modules:
+            raise RuntimeError("database is already imported with the working database path")
+        directory = tempfile.mkdtemp(prefix='benchmark-db-')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        _path = config.DATABASE_PATH = os.path.join(directory, 'benchmark.db')
+    return _path
@@ -0,0 +1,260 @@
+# bio_vectors.py
+"""TF-IDF описаний анкет для оценки схожести личностей.
+
+Описание разбивается на слова; слова короче 3 букв и служебные отбрасываются,
+у остальных отсекаются типичные окончания ("книгами" -> "книг"). Вес слова -
+(1 + log tf) * idf, вектор нормирован, поэтому схожесть - скалярное
+произведение. Векторы хранятся разреженно (номера слов по возрастанию и веса)
+в таблице bio_vectors, словарь - в bio_vocabulary.
+
+Правка описания пересчитывает только вектор этой анкеты с текущими idf;
+ночная пересборка (Database.rebuild_bio_vectors) заново считает словарь и
+все веса в отдельном хранилище и подменяет им текущее после сохранения.
+"""
+import functools
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Схожесть 0 - как у таблицы типов личности для пустого описания, 1 - 100
+BIO_SCORE_FLOOR = 40
+
+WORD = re.compile('[a-zа-яё0-9]+')
+STOP_WORDS = {
+    'все', 'всё', 'что', 'это', 'как', 'так', 'или', 'для', 'еще', 'ещё', 'уже', 'меня', 'мне',
+    'мой', 'моя', 'мои', 'тебя', 'тебе', 'его', 'она', 'они', 'оно', 'был', 'была', 'быть',
+    'есть', 'нет', 'где', 'кто', 'чем', 'тут', 'там', 'очень', 'люблю', 'просто', 'когда',
+    'если', 'только', 'можно', 'буду', 'будет', 'себя', 'свой', 'свою', 'про', 'при', 'над',
+    'под', 'без', 'тоже', 'чтобы', 'the', 'and'
+}
+ENDINGS = {
+    'иями', 'ями', 'ами', 'ией', 'ия', 'ие', 'ий', 'ой', 'ей', 'ый', 'ого', 'его', 'ому', 'ему',
+    'ыми', 'ими', 'ах', 'ях', 'ом', 'ем', 'ам', 'ям', 'ою', 'ею', 'ую', 'юю', 'ая', 'яя', 'ое',
+    'ее', 'ые', 'ов', 'ев', 'ться', 'ть', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь'
+}
+ENDING_LENGTHS = sorted({len(ending) for ending in ENDINGS}, reverse=True)
+MIN_STEM = 3
+
+def bio_score(similarity):
+    """Балл личности по косинусу описаний (число или массив NumPy)"""
+    return BIO_SCORE_FLOOR + (100 - BIO_SCORE_FLOOR) * similarity
+
+@functools.lru_cache(maxsize=100000)
+def _stem(word: str) -> str:
+    # Сначала длинные: отсекается самое длинное подходящее окончание
+    for length in ENDING_LENGTHS:
+        if len(word) - length >= MIN_STEM and word[-length:] in ENDINGS:
+            return word[:-length]
+    return word
+
+def tokenize(bio: str) -> List[str]:
+    words = WORD.findall((bio or '').lower().replace('ё', 'е'))
+    return [_stem(word) for word in words if len(word) >= 3 and word not in STOP_WORDS]
+
+def csr_similarity(viewer_indices: np.ndarray, viewer_weights: np.ndarray,
+                   indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Косинус вектора viewer со строками CSR; NaN - пустой вектор с любой стороны"""
+    rows = len(indptr) - 1
+    lengths = np.diff(indptr)
+    if not len(viewer_indices):
+        return np.full(rows, np.nan)
+    # Номера слов viewer отсортированы: совпадения ищутся двоичным поиском
+    positions = np.minimum(np.searchsorted(viewer_indices, indices), len(viewer_indices) - 1)
+    products = np.where(viewer_indices[positions] == indices,
+                        weights.astype(np.float64) * viewer_weights.astype(np.float64)[positions], 0.0)
+    similarity = np.bincount(np.repeat(np.arange(rows), lengths), weights=products,
+                             minlength=rows).astype(np.float64)
+    similarity[lengths == 0] = np.nan
+    return similarity
+
+class BioVectorStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.vocabulary: Dict[str, int] = {}
+        self._df = np.zeros(0, dtype=np.int64)
+        self._documents = 0
+        self._vectors: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}  # telegram_id -> (номера слов, веса)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def items(self) -> List[Tuple[int, Tuple[np.ndarray, np.ndarray]]]:
+        with self._lock:
+            return list(self._vectors.items())
+
+    @staticmethod
+    def _vectorize(counts: Counter, df: np.ndarray, documents: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Нормированный вектор по числу вхождений слов; df - частоты слов в порядке номеров"""
+        indices = np.array(sorted(counts), dtype=np.int32)
+        tf = 1 + np.log(np.array([counts[index] for index in indices], dtype=np.float64))
+        idf = np.log((1 + documents) / (1 + df)) + 1
+        weights = tf * idf
+        return indices, (weights / np.linalg.norm(weights)).astype(np.float32)
+
+    def rebuild(self, rows: Iterable[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        """Полный пересчет словаря и векторов; возвращает словарь для сохранения.
+
+        Описания токенизируются один раз, веса всех анкет считаются одной
+        CSR-матрицей; векторы анкет - срезы ее массивов.
+        """
+        telegram_ids = []
+        documents = []
+        df = Counter()
+        for telegram_id, bio in rows:
+            terms = Counter(tokenize(bio))
+            if terms:
+                telegram_ids.append(telegram_id)
+                documents.append(terms)
+                df.update(terms.keys())
+
+        vocabulary = {term: number for number, term in enumerate(sorted(df))}
+        lengths = np.fromiter((len(terms) for terms in documents), dtype=np.int64, count=len(documents))
+        indptr = np.zeros(len(documents) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        counts = np.empty(indptr[-1], dtype=np.float64)
+        for number, terms in enumerate(documents):
+            row = sorted((vocabulary[term], count) for term, count in terms.items())
+            indices[indptr[number]:indptr[number + 1]], counts[indptr[number]:indptr[number + 1]] = zip(*row)
+
+        document_frequency = np.zeros(len(vocabulary), dtype=np.int64)
+        for term, frequency in df.items():
+            document_frequency[vocabulary[term]] = frequency
+        weights = (1 + np.log(counts)) * (np.log((1 + len(documents)) / (1 + document_frequency[indices])) + 1)
+        rows_of = np.repeat(np.arange(len(documents)), lengths)
+        weights /= np.sqrt(np.bincount(rows_of, weights=weights * weights, minlength=len(documents)))[rows_of]
+        weights = weights.astype(np.float32)
+
+        with self._lock:
+            self.vocabulary = vocabulary
+            self._df = document_frequency
+            self._documents = len(documents)
+            self._vectors = {
+                telegram_id: (indices[indptr[number]:indptr[number + 1]], weights[indptr[number]:indptr[number + 1]])
+                for number, telegram_id in enumerate(telegram_ids)
+            }
+            return [(number, term) for term, number in vocabulary.items()]
+
+    def load(self, vocabulary: Iterable[Tuple[int, str]], vectors: Iterable[Tuple[int, bytes, bytes]]):
+        """Восстановление из bio_vocabulary и bio_vectors; частоты слов считаются по векторам"""
+        loaded_vocabulary = {term: number for number, term in vocabulary}
+        loaded_vectors = {
+            telegram_id: (np.frombuffer(terms, dtype=np.int32), np.frombuffer(weights, dtype=np.float32))
+            for telegram_id, terms, weights in vectors
+        }
+        size = max(loaded_vocabulary.values(), default=-1) + 1
+        df = np.zeros(size, dtype=np.int64)
+        for indices, weights in loaded_vectors.values():
+            df[indices] += 1
+        with self._lock:
+            self.vocabulary = loaded_vocabulary
+            self._df = df
+            self._documents = len(loaded_vectors)
+            self._vectors = loaded_vectors
+
+    def replace(self, other: 'BioVectorStore'):
+        """Подмена словаря и векторов пересчитанными в другом хранилище"""
+        with other._lock:
+            state = (other.vocabulary, other._df, other._documents, other._vectors)
+        with self._lock:
+            self.vocabulary, self._df, self._documents, self._vectors = state
+
+    def missing_terms(self, bio: str) -> List[str]:
+        """Слова описания, которых еще нет в словаре, в порядке появления"""
+        with self._lock:
+            return list(dict.fromkeys(term for term in tokenize(bio) if term not in self.vocabulary))
+
+    def compute(self, telegram_id: int, bio: str, new_terms: Dict[str, int]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Вектор анкеты с текущими idf, как если бы описание уже было заменено; хранилище не меняется.
+
+        new_terms - номера слов из missing_terms. None - в описании нет слов.
+        """
+        with self._lock:
+            counts = Counter()
+            for term in tokenize(bio):
+                number = self.vocabulary.get(term)
+                counts[new_terms[term] if number is None else number] += 1
+            if not counts:
+                return None
+
+            indices = np.array(sorted(counts), dtype=np.int64)
+            df = np.zeros(len(indices), dtype=np.int64)
+            known = indices < len(self._df)
+            df[known] = self._df[indices[known]]
+            documents = self._documents + 1
+            old = self._vectors.get(telegram_id)
+            if old is not None:
+                df -= np.isin(indices, old[0])
+                documents -= 1
+            return self._vectorize(counts, df + 1, documents)
+
+    def apply(self, telegram_id: int, new_terms: Dict[str, int], vector: Optional[Tuple[np.ndarray, np.ndarray]]):
+        """Заменяет вектор анкеты посчитанным compute и добавляет новые слова в словарь"""
+        with self._lock:
+            self.vocabulary.update(new_terms)
+            size = max(new_terms.values(), default=-1) + 1
+            if size > len(self._df):
+                self._df = np.concatenate([self._df, np.zeros(size - len(self._df), dtype=np.int64)])
+
+            old = self._vectors.pop(telegram_id, None)
+            if old is not None:
+                self._df[old[0]] -= 1
+                self._documents -= 1
+            if vector is not None:
+                self._df[vector[0]] += 1
+                self._documents += 1
+                self._vectors[telegram_id] = vector
+
+    def update(self, telegram_id: int, bio: str) -> Tuple[List[Tuple[int, str]], Optional[Tuple[np.ndarray, np.ndarray]]]:
+        """compute и apply сразу, новые слова - следующими номерами; возвращает новые слова словаря и вектор"""
+        missing = self.missing_terms(bio)
+        new_terms = {term: len(self.vocabulary) + number for number, term in enumerate(missing)}
+        vector = self.compute(telegram_id, bio, new_terms)
+        self.apply(telegram_id, new_terms, vector)
+        return [(number, term) for term, number in new_terms.items()], vector
+
+    def similarity_many(self, telegram_id: int, candidate_ids: Sequence[int]) -> np.ndarray:
+        """Косинус описания telegram_id с каждой из candidate_ids; NaN - нет вектора"""
+        with self._lock:
+            viewer = self._vectors.get(telegram_id)
+            if viewer is None:
+                return np.full(len(candidate_ids), np.nan)
+            vectors = [self._vectors.get(int(candidate_id)) for candidate_id in candidate_ids]
+
+        lengths = np.fromiter((len(vector[0]) if vector else 0 for vector in vectors), dtype=np.int64, count=len(vectors))
+        indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        present = [vector for vector in vectors if vector]
+        indices = np.concatenate([vector[0] for vector in present]) if present else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate([vector[1] for vector in present]) if present else np.zeros(0, dtype=np.float32)
+        return csr_similarity(viewer[0], viewer[1], indptr, indices, weights)
+
+    def similarity(self, telegram_id1: int, telegram_id2: int) -> Optional[float]:
+        """Тот же расчет, что у similarity_many, поэтому баллы совпадают с пакетными"""
+        similarity = self.similarity_many(telegram_id1, [telegram_id2])[0]
+        return None if math.isnan(similarity) else float(similarity)
+
+    def export(self, telegram_ids: np.ndarray) -> Dict[str, np.ndarray]:
+        """Векторы в порядке telegram_ids в виде CSR - для снимка индекса кандидатов"""
+        with self._lock:
+            vectors = [self._vectors.get(int(telegram_id)) for telegram_id in telegram_ids]
+        indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+        np.cumsum([len(vector[0]) if vector else 0 for vector in vectors], out=indptr[1:])
+        present = [vector for vector in vectors if vector]
+        return {
+            'bio_indptr': indptr,
+            'bio_indices': np.concatenate([vector[0] for vector in present]) if present else np.zeros(0, dtype=np.int32),
+            'bio_weights': np.concatenate([vector[1] for vector in present]) if present else np.zeros(0, dtype=np.float32)
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'documents': self._documents,
+                'terms': len(self.vocabulary),
+                'nonzeros': sum(len(vector[0]) for vector in self._vectors.values())
+            }
@@ -1,5 +1,5 @@
 # bot.py
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time as dt_time
 import logging
 import asyncio
 import os
@@ -9,6 +9,7 @@ from telegram import (
     Update, 
     ReplyKeyboardMarkup, 
     ReplyKeyboardRemove, 
+    KeyboardButton, 
     InlineKeyboardMarkup, 
     InlineKeyboardButton
 )
@@ -26,10 +27,13 @@ import aiohttp
 from io import BytesIO
 from PIL import Image
 
-from database import db
+from database import db, adb
 from config import config
+from profile_codec import INTERESTS_LIST, encode_interests, normalize_interest
 from premium import premium_system
 from modules.notifications import smart_notifications
+from modules.feed import feed_manager
+from modules.recommendations import recommendation_engine
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -42,14 +46,7 @@ TOKEN = config.BOT_TOKEN
 # States для ConversationHandler
 (TERMS_AGREEMENT, NAME, AGE, GENDER, TARGET_GENDER, BIO, INTERESTS, 
  PHOTOS, ZODIAC, RELATIONSHIP_GOAL, LIFESTYLE, HABITS, CONFIRMATION, REPORT_REASON, 
- ADMIN_SEARCH_ID, ADMIN_BAN_USER) = range(16)
-
-INTERESTS_LIST = [
-    "🎵 Музыка", "🎨 Искусство", "🏀 Спорт", "📚 Книги", 
-    "🎮 Игры", "✈️ Путешествия", "🍳 Готовка", "🎬 Кино",
-    "💻 IT", "📸 Фотография", "🐶 Животные", "🏋️ Фитнес",
-    "🧘 Йога", "🎯 Настолки", "🚗 Авто", "🌳 Природа"
-]
+ ADMIN_SEARCH_ID, ADMIN_BAN_USER, LOCATION) = range(17)
 
 ZODIAC_SIGNS = [
     "♈ Овен", "♉ Телец", "♊ Близнецы", "♋ Рак",
@@ -117,8 +114,8 @@ def set_user_session(user_id, session_data):
     except Exception as e:
         logger.error(f"Error setting user session: {e}")
 
-def get_main_keyboard(user_id=None):
-    is_premium = premium_system.check_premium_status(user_id) if user_id else False
+async def get_main_keyboard(user_id=None):
+    is_premium = await premium_system.check_premium_status(user_id) if user_id else False
     premium_label = "🌟 ПРЕМИУМ" if is_premium else "💎 Получить премиум"
     
     keyboard = [
@@ -224,6 +221,13 @@ def get_photos_keyboard(has_photos=False):
         ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
+def get_location_keyboard():
+    keyboard = [
+        [KeyboardButton("📍 Отправить геолокацию", request_location=True)],
+        ["⏭ Пропустить"]
+    ]
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
 def get_confirmation_keyboard():
     keyboard = [
         ["✅ Всё верно, сохранить!", "✏️ Изменить данные"]
@@ -400,17 +404,21 @@ async def send_modern_step(update, context, step_number, total_steps, title, mes
     
     await asyncio.sleep(0.3)
 
-async def send_like_notification(application, from_user_id, to_user_id, is_super_like=False):
+async def send_like_notification(application, like_result):
+    """Уведомление получателю лайка по результату adb.process_like"""
     try:
-        from_user = db.get_user(from_user_id)
-        to_user = db.get_user(to_user_id)
+        from_user = like_result['from_user']
+        to_user = like_result['to_user']
+        notification = like_result['notification']
+        is_super_like = like_result['is_super_like']
         
-        if not from_user or not to_user:
+        if not from_user or not to_user or not notification:
             return
         
-        mutual_like = db.check_mutual_like(from_user_id, to_user_id)
+        from_user_id = from_user['telegram_id']
+        to_user_id = to_user['telegram_id']
         
-        if mutual_like:
+        if like_result['is_mutual']:
             emoji = "💫" if is_super_like else "💞"
             like_type = "суперлайк" if is_super_like else "симпатия"
             
@@ -447,6 +455,7 @@ async def send_like_notification(application, from_user_id, to_user_id, is_super
                             parse_mode=ParseMode.MARKDOWN,
                             reply_markup=keyboard
                         )
+                        await adb.mark_notification_sent(notification['id'])
                         return
                     except Exception as e:
                         logger.error(f"Error sending mutual like photo: {e}")
@@ -477,19 +486,22 @@ async def send_like_notification(application, from_user_id, to_user_id, is_super
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
+        
+        await adb.mark_notification_sent(notification['id'])
             
     except Exception as e:
         logger.error(f"Error sending like notification: {e}")
 
 async def send_profile_view_notification(application, viewer_id, viewed_id):
     try:
-        viewer = db.get_user(viewer_id)
-        viewed_user = db.get_user(viewed_id)
+        users = await adb.get_users_many([viewer_id, viewed_id])
+        viewer = users.get(viewer_id)
+        viewed_user = users.get(viewed_id)
         
         if not viewer or not viewed_user:
             return
         
-        views_today = db.get_profile_views_today(viewed_id)
+        views_today = await adb.get_profile_views_today(viewed_id)
         
         message_text = (
             f"👀 *Кто-то просмотрел твой профиль!*\n\n"
@@ -510,7 +522,12 @@ async def send_profile_view_notification(application, viewer_id, viewed_id):
 
 async def check_pending_notifications(application, user_id):
     try:
-        notifications = db.get_pending_like_notifications(user_id)
+        notifications = await adb.get_pending_like_notifications(user_id)
+        if not notifications:
+            return
+        
+        users = await adb.get_users_many([user_id] + [n['from_user_id'] for n in notifications])
+        to_user = users.get(user_id)
         
         for notification in notifications:
             from_user_id = notification['from_user_id']
@@ -527,8 +544,7 @@ async def check_pending_notifications(application, user_id):
                 emoji = "💫" if is_super_like else "💞"
                 like_type = "суперлайк" if is_super_like else "симпатия"
                 
-                from_user = db.get_user(from_user_id)
-                to_user = db.get_user(user_id)
+                from_user = users.get(from_user_id)
                 common_interests = []
                 if from_user and to_user and from_user.get('interests') and to_user.get('interests'):
                     common_interests = list(set(from_user['interests']) & set(to_user['interests']))
@@ -561,7 +577,7 @@ async def check_pending_notifications(application, user_id):
                                 parse_mode=ParseMode.MARKDOWN,
                                 reply_markup=keyboard
                             )
-                            db.mark_notification_sent(notification['id'])
+                            await adb.mark_notification_sent(notification['id'])
                             continue
                         except Exception as e:
                             logger.error(f"Error sending notification photo: {e}")
@@ -593,7 +609,7 @@ async def check_pending_notifications(application, user_id):
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
             
-            db.mark_notification_sent(notification['id'])
+            await adb.mark_notification_sent(notification['id'])
             
     except Exception as e:
         logger.error(f"Error checking pending notifications: {e}")
@@ -606,8 +622,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Обновляем активность пользователя для умных уведомлений
     smart_notifications.update_user_activity(user_id)
 
-    if db.is_user_blocked(user_id):
-        block_info = db.get_blocked_user_info(user_id)
+    if await adb.is_user_blocked(user_id):
+        block_info = await adb.get_blocked_user_info(user_id)
         if block_info:
             if block_info['ban_type'] == 'permanent':
                 message_text = (
@@ -643,23 +659,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return ConversationHandler.END
     
-    existing_user = db.get_user(user.id)
+    existing_user = await adb.get_user(user.id)
     
     if context.args and context.args[0].startswith('ref'):
         referral_code = context.args[0][3:]
         if existing_user and not existing_user.get('referred_by'):
-            cursor = db.connection.cursor()
-            cursor.execute("SELECT telegram_id FROM users WHERE referral_code = ?", (referral_code,))
-            result = cursor.fetchone()
-            if result:
-                referrer_id = result[0]
-                if referrer_id != user.id:
-                    db.add_referral(referrer_id, user.id)
+            referrer_id = await adb.get_telegram_id_by_referral_code(referral_code)
+            if referrer_id and referrer_id != user.id:
+                await adb.add_referral(referrer_id, user.id)
     
     if existing_user and existing_user.get('name'):
         await check_pending_notifications(context.application, user.id)
         
-        stats = db.get_daily_stats(user.id)
+        stats = await adb.get_daily_stats(user.id)
         likes_given = stats.get('likes_given', 0)
         super_likes_today = stats.get('super_likes_today', 0)
         views_received = stats.get('views_received', 0)
@@ -668,7 +680,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"✨ *С возвращением, {user.first_name}!*\n\n"
             "Рады снова тебя видеть в ТочкаСхода! 🌟",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_main_keyboard(user.id)
+            reply_markup=await get_main_keyboard(user.id)
         )
     else:
         welcome_text = (
@@ -699,16 +711,7 @@ async def handle_terms_agreement(update: Update, context: ContextTypes.DEFAULT_T
     user_id = update.message.from_user.id
     
     if user_choice == "✅ Я согласен с правилами":
-        try:
-            cursor = db.connection.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_agreements 
-                (user_id, accepted_terms, accepted_privacy, accepted_at) 
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            """, (user_id, True, True))
-            db.connection.commit()
-        except Exception as e:
-            logger.error(f"Error saving agreements: {e}")
+        await adb.save_user_agreement(user_id)
         
         await update.message.reply_text(
             "🎉 *Отлично! Согласие получено!*\n\n"
@@ -919,9 +922,14 @@ async def get_interests(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     current_interests = context.user_data['registration']['interests']
     
-    clean_interest = interest
-    for emoji in ["🎵", "🎨", "🏀", "📚", "🎮", "✈️", "🍳", "🎬", "💻", "📸", "🐶", "🏋️", "🧘", "🎯", "🚗", "🌳"]:
-        clean_interest = clean_interest.replace(f"{emoji} ", "")
+    if not encode_interests([interest]):
+        await update.message.reply_text(
+            "❌ Выбери интерес с клавиатуры:",
+            reply_markup=get_interests_keyboard()
+        )
+        return INTERESTS
+    
+    clean_interest = normalize_interest(interest)
     
     if clean_interest in current_interests:
         current_interests.remove(clean_interest)
@@ -1136,7 +1144,51 @@ async def done_photos(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return PHOTOS
     
-    context.user_data['registration']['city'] = config.MAIN_CITY
+    await update.message.reply_text(
+        "📍 *Где ты находишься?*\n\n"
+        "Отправь геолокацию или напиши название своего города - "
+        "будем показывать анкеты людей поблизости.\n\n"
+        "Точные координаты никому не показываются.",
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=get_location_keyboard()
+    )
+    return LOCATION
+
+async def get_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    registration_data = context.user_data['registration']
+    
+    if update.message.location:
+        latitude = update.message.location.latitude
+        longitude = update.message.location.longitude
+        settlement = db.location_system.nearest_city(latitude, longitude)
+        # Для поиска по радиусу хватает точности около километра
+        registration_data.update({
+            'city': settlement['name'] if settlement else config.MAIN_CITY,
+            'latitude': round(latitude, 2),
+            'longitude': round(longitude, 2)
+        })
+    elif update.message.text == "⏭ Пропустить":
+        registration_data.update({'city': config.MAIN_CITY, 'latitude': None, 'longitude': None})
+    else:
+        city = ' '.join((update.message.text or '').split())
+        # Название попадает в Markdown превью и анкеты - только буквы, цифры, пробелы и .-()'
+        if (not city or len(city) > 50 or not any(char.isalpha() for char in city)
+                or not all(char.isalnum() or char in " .-()'" for char in city)):
+            await update.message.reply_text(
+                "❌ Напиши название населенного пункта или отправь геолокацию:",
+                reply_markup=get_location_keyboard()
+            )
+            return LOCATION
+        settlement = db.location_system.resolve_city(city)
+        if settlement:
+            registration_data.update({
+                'city': settlement['name'],
+                'latitude': settlement['latitude'],
+                'longitude': settlement['longitude']
+            })
+        else:
+            # Пункта нет в справочнике: анкета ищет по названию города, без радиуса
+            registration_data.update({'city': city[:1].upper() + city[1:], 'latitude': None, 'longitude': None})
     
     await process_location_complete(update, context)
     return CONFIRMATION
@@ -1172,7 +1224,7 @@ async def process_location_complete(update, context):
         f"📖 *О себе:*\n{registration_data['bio']}\n\n"
         f"🎯 *Интересы:* {interests_text}\n\n"
         f"📸 *Фотография:* {'✅ Добавлена' if registration_data.get('photos') else '❌ Нет фото'}\n"
-        f"📍 *Локация:* {config.MAIN_CITY}\n\n"
+        f"📍 *Локация:* {registration_data.get('city', config.MAIN_CITY)}\n\n"
         f"*Всё выглядит отлично?* ✅"
     )
     
@@ -1215,7 +1267,7 @@ async def confirm_registration(update: Update, context: ContextTypes.DEFAULT_TYP
             'last_name': user.last_name,
         })
         
-        if db.create_user(registration_data):
+        if await adb.create_user(registration_data):
             if 'last_registration_message' in context.user_data:
                 try:
                     await context.bot.delete_message(
@@ -1230,7 +1282,7 @@ async def confirm_registration(update: Update, context: ContextTypes.DEFAULT_TYP
                 "✨ *Ты готов к новым знакомствам!*\n\n"
                 "Используй поиск, чтобы найти интересных людей вокруг.",
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=get_main_keyboard(user_id)
+                reply_markup=await get_main_keyboard(user_id)
             )
             
             if 'registration' in context.user_data:
@@ -1238,7 +1290,7 @@ async def confirm_registration(update: Update, context: ContextTypes.DEFAULT_TYP
         else:
             await update.message.reply_text(
                 "❌ Произошла ошибка при сохранении профиля. Попробуй еще раз.",
-                reply_markup=get_main_keyboard(user_id)
+                reply_markup=await get_main_keyboard(user_id)
             )
         
         return ConversationHandler.END
@@ -1255,7 +1307,7 @@ async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         f"🏠 *Возвращаемся в главное меню*",
         parse_mode=ParseMode.MARKDOWN,
-        reply_markup=get_main_keyboard(user_id)
+        reply_markup=await get_main_keyboard(user_id)
     )
     return ConversationHandler.END
 
@@ -1267,13 +1319,13 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "❌ Регистрация отменена.\n\n"
         "Если передумаешь - нажми /start чтобы начать заново! 🌟",
-        reply_markup=get_main_keyboard(user_id)
+        reply_markup=await get_main_keyboard(user_id)
     )
     return ConversationHandler.END
 
 async def find_people(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     # Обновляем активность пользователя
     smart_notifications.update_user_activity(user_id)
@@ -1281,7 +1333,7 @@ async def find_people(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not user:
         await update.message.reply_text(
             "❌ Сначала заверши регистрацию через /start",
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         return
     
@@ -1290,35 +1342,24 @@ async def find_people(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "⏳ *Твой профиль еще на модерации*\n\n"
             "Мы проверяем твой профиль для безопасности сообщества.",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         return
     
-    is_premium = premium_system.check_premium_status(user_id)
-    radius = config.PREMIUM_SEARCH_RADIUS if is_premium else config.DEFAULT_SEARCH_RADIUS
+    # Поиск идет в фоне, здесь только очередь; пустая заполняется сразу
+    queued = await feed_manager.open_feed(user_id)
     
-    await update.message.reply_text(
-        "💫 *Ищу идеально подходящих людей...*\n\n"
-        "Анализирую ваши интересы, цели и совместимость...",
-        parse_mode=ParseMode.MARKDOWN
-    )
-    
-    users_to_show = db.get_users_for_swipe(user_id, radius_km=radius)
-    
-    if not users_to_show:
+    if not queued:
         await update.message.reply_text(
             "😔 *Пока нет новых пользователей для показа*\n\n"
             "Загляни позже, когда появятся новые анкеты!",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         return
     
-    context.user_data['swipe_index'] = 0
-    context.user_data['swipe_users'] = users_to_show
-    
     await update.message.reply_text(
-        f"🔍 *Найдено {len(users_to_show)} пользователей*\n\n"
+        f"🔍 *В ленте {queued} анкет*\n\n"
         f"✨ *Включая AI-рекомендации по совместимости*",
         parse_mode=ParseMode.MARKDOWN
     )
@@ -1326,25 +1367,23 @@ async def find_people(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_next_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    swipe_index = context.user_data.get('swipe_index', 0)
-    swipe_users = context.user_data.get('swipe_users', [])
+    current_user, queued = await feed_manager.next_profile(user_id)
     
-    if swipe_index >= len(swipe_users):
+    if not current_user:
+        context.user_data.pop('swipe_current', None)
         await update.message.reply_text(
             "🎉 *Ты просмотрел все доступные анкеты!*\n\n"
             "Загляни позже или попробуй другой тип поиска!",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         return
     
-    current_user = swipe_users[swipe_index]
-    
-    db.mark_profile_viewed(user_id, current_user['telegram_id'])
-    db.update_daily_stats(user_id, 'views_given')
-    db.update_daily_stats(current_user['telegram_id'], 'views_received')
-    
-    await send_profile_view_notification(context.application, user_id, current_user['telegram_id'])
+    # Повторный показ той же анкеты (после перезапуска или ошибки) не уведомляет снова
+    previous_user = context.user_data.get('swipe_current')
+    context.user_data['swipe_current'] = current_user
+    if not previous_user or previous_user['telegram_id'] != current_user['telegram_id']:
+        await send_profile_view_notification(context.application, user_id, current_user['telegram_id'])
     
     interests_text = "Не указаны"
     if current_user.get('interests'):
@@ -1357,7 +1396,7 @@ async def show_next_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except:
                 interests_text = current_user['interests']
     
-    compatibility = db.calculate_compatibility(user_id, current_user['telegram_id'])
+    compatibility = await adb.calculate_compatibility(user_id, current_user['telegram_id'])
     
     caption = (
         f"💫 *{current_user['name']}, {current_user['age']}*\n"
@@ -1377,7 +1416,7 @@ async def show_next_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"   • Цель: {current_user.get('relationship_goal', 'Не указана')}\n"
         f"   • Образ жизни: {current_user.get('lifestyle', 'Не указан')}\n\n"
         
-        f"🔍 *Анкета {swipe_index + 1} из {len(swipe_users)}*"
+        f"🔍 *Анкет в ленте: {queued}*"
     )
     
     photos = current_user['photos']
@@ -1428,13 +1467,13 @@ async def handle_inline_swipe(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     await query.answer()
     
-    swipe_index = context.user_data.get('swipe_index', 0)
-    swipe_users = context.user_data.get('swipe_users', [])
-    
-    if swipe_index >= len(swipe_users):
-        return
-    
-    current_user = swipe_users[swipe_index]
+    current_user = context.user_data.get('swipe_current')
+    if not current_user:
+        # После перезапуска показанная анкета - голова очереди
+        current_user, _ = await feed_manager.next_profile(user_id)
+        if not current_user:
+            return
+        context.user_data['swipe_current'] = current_user
     
     try:
         await context.bot.delete_message(
@@ -1454,29 +1493,28 @@ async def handle_inline_swipe(update: Update, context: ContextTypes.DEFAULT_TYPE
         await start_report_callback(query, context)
         return
     
-    context.user_data['swipe_index'] = swipe_index + 1
+    # Лайк и пропуск сами записывают просмотр, advance только снимает анкету с очереди
+    await feed_manager.advance(user_id, current_user['telegram_id'])
     await show_next_profile(update, context)
 
 async def handle_like_callback(user_id, current_user, context):
-    if not premium_system.can_like_today(user_id):
+    daily_limit = await premium_system.get_daily_like_limit(user_id)
+    like_result = await adb.process_like(user_id, current_user['telegram_id'], daily_limit=daily_limit)
+    
+    if like_result['quota_exceeded']:
         await context.bot.send_message(
             chat_id=user_id,
-            text=f"❌ *Лимит лайков исчерпан!*\n\nСегодня ты уже поставил {config.FREE_LIKES_PER_DAY} лайков.",
+            text=f"❌ *Лимит лайков исчерпан!*\n\nСегодня ты уже поставил {daily_limit} лайков.",
             parse_mode=ParseMode.MARKDOWN
         )
-        return
-    
-    if db.add_like(user_id, current_user['telegram_id']):
-        db.update_daily_stats(user_id, 'likes_given')
-        db.update_daily_stats(current_user['telegram_id'], 'likes_received')
-        
+    elif like_result['success']:
         await context.bot.send_message(
             chat_id=user_id,
             text="❤️ *Лайк отправлен!*\n\nЕсли это будет взаимно - ты получишь уведомление! 💫",
             parse_mode=ParseMode.MARKDOWN
         )
         
-        await send_like_notification(context.application, user_id, current_user['telegram_id'])
+        await send_like_notification(context.application, like_result)
     else:
         await context.bot.send_message(
             chat_id=user_id,
@@ -1485,25 +1523,23 @@ async def handle_like_callback(user_id, current_user, context):
         )
 
 async def handle_super_like_callback(user_id, current_user, context):
-    if not premium_system.can_super_like_today(user_id):
+    daily_limit = await premium_system.get_daily_like_limit(user_id, is_super_like=True)
+    like_result = await adb.process_like(user_id, current_user['telegram_id'], is_super_like=True, daily_limit=daily_limit)
+    
+    if like_result['quota_exceeded']:
         await context.bot.send_message(
             chat_id=user_id,
-            text=f"❌ *Лимит суперлайков исчерпан!*\n\nСегодня ты уже поставил {config.SUPER_LIKES_PER_DAY} суперлайков.",
+            text=f"❌ *Лимит суперлайков исчерпан!*\n\nСегодня ты уже поставил {daily_limit} суперлайков.",
             parse_mode=ParseMode.MARKDOWN
         )
-        return
-    
-    if db.add_super_like(user_id, current_user['telegram_id']):
-        db.update_daily_stats(user_id, 'likes_given')
-        db.update_daily_stats(current_user['telegram_id'], 'likes_received')
-        
+    elif like_result['success']:
         await context.bot.send_message(
             chat_id=user_id,
             text="💫 *Суперлайк отправлен!*\n\nТвой профиль будет выделен у этого пользователя! ✨",
             parse_mode=ParseMode.MARKDOWN
         )
         
-        await send_like_notification(context.application, user_id, current_user['telegram_id'], is_super_like=True)
+        await send_like_notification(context.application, like_result)
     else:
         await context.bot.send_message(
             chat_id=user_id,
@@ -1512,7 +1548,7 @@ async def handle_super_like_callback(user_id, current_user, context):
         )
 
 async def handle_skip_callback(user_id, current_user, context):
-    db.skip_profile(user_id, current_user['telegram_id'])
+    await adb.skip_profile(user_id, current_user['telegram_id'])
     await context.bot.send_message(
         chat_id=user_id,
         text="➡️ *Пропущено*\n\nПереходим к следующей анкете...",
@@ -1521,13 +1557,11 @@ async def handle_skip_callback(user_id, current_user, context):
 
 async def start_report_callback(query, context):
     user_id = query.from_user.id
-    swipe_index = context.user_data.get('swipe_index', 0)
-    swipe_users = context.user_data.get('swipe_users', [])
+    reported_user = context.user_data.get('swipe_current')
     
-    if swipe_index >= len(swipe_users):
+    if not reported_user:
         return
     
-    reported_user = swipe_users[swipe_index]
     context.user_data['report_target'] = reported_user['telegram_id']
     context.user_data['report_target_name'] = reported_user['name']
     
@@ -1546,14 +1580,14 @@ async def handle_user_report(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if reason == "◀️ Назад":
         await update.message.reply_text(
             "Возвращаемся к просмотру анкет...",
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         return ConversationHandler.END
     
     if 'report_target' not in context.user_data:
         await update.message.reply_text(
             "❌ Ошибка отправки жалобы",
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         return ConversationHandler.END
     
@@ -1561,13 +1595,15 @@ async def handle_user_report(update: Update, context: ContextTypes.DEFAULT_TYPE)
     reported_user_name = context.user_data.get('report_target_name', 'Неизвестно')
     
     # Сохраняем жалобу в базу
-    if db.add_report(user_id, reported_user_id, reason):
+    if await adb.add_report(user_id, reported_user_id, reason):
+        await adb.record_profile_view(user_id, reported_user_id)
+        await feed_manager.advance(user_id, reported_user_id)
         await update.message.reply_text(
             f"✅ *Жалоба отправлена!*\n\n"
             f"Мы проверим профиль {reported_user_name} и примем меры.\n"
             f"Спасибо за бдительность! 🛡️",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         
         # Уведомляем админов о новой жалобе
@@ -1586,7 +1622,7 @@ async def handle_user_report(update: Update, context: ContextTypes.DEFAULT_TYPE)
     else:
         await update.message.reply_text(
             "❌ Не удалось отправить жалобу. Попробуйте позже.",
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
     
     # Очищаем данные о жалобе
@@ -1599,18 +1635,18 @@ async def handle_user_report(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     if not user:
         await update.message.reply_text(
             "❌ Профиль не найден. Нажми /start чтобы создать профиль!",
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         return
     
     # УЛУЧШЕННЫЙ ДИЗАЙН ПРОФИЛЯ
     status = "✅ Активный" if user['is_active'] else "⏳ На модерации"
-    premium_status = "🌟 ПРЕМИУМ" if premium_system.check_premium_status(user_id) else "💎 Обычный"
+    premium_status = "🌟 ПРЕМИУМ" if await premium_system.check_premium_status(user_id) else "💎 Обычный"
     interests_text = ", ".join(user.get('interests', [])) if user.get('interests') else "Не указаны"
     
     caption = (
@@ -1671,8 +1707,11 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     
-    stats = db.get_daily_stats(user_id)
-    views_today = db.get_profile_views_today(user_id)
+    stats = await adb.get_daily_stats(user_id)
+    views_today = await adb.get_profile_views_today(user_id)
+    matches = await adb.get_matches(user_id)
+    all_users = await adb.get_all_users()
+    user = await adb.get_user(user_id) or {}
     
     stats_text = (
         "📊 СТАТИСТИКА\n"
@@ -1685,9 +1724,9 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"• 🔍  Просмотров отдано: {stats['views_given']}\n\n"
         
         "📈 *ОБЩАЯ СТАТИСТИКА*\n"
-        f"• 🤝  Всего матчей: {len(db.get_matches(user_id))}\n"
-        f"• 👥  Всего пользователей: {len(db.get_all_users())}\n"
-        f"• 🏆  Уровень доверия: {db.get_user(user_id).get('trust_score', 50)}/100\n"
+        f"• 🤝  Всего матчей: {len(matches)}\n"
+        f"• 👥  Всего пользователей: {len(all_users)}\n"
+        f"• 🏆  Уровень доверия: {user.get('trust_score', 50)}/100\n"
     )
     
     await update.message.reply_text(
@@ -1698,7 +1737,7 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_matches(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    matches = db.get_matches(user_id)
+    matches = await adb.get_matches(user_id)
     
     if not matches:
         await update.message.reply_text(
@@ -1706,7 +1745,7 @@ async def show_matches(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Продолжай ставить лайки интересным людям - "
             "когда кто-то ответит взаимностью, ты получишь уведомление! 💫",
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
         return
     
@@ -1716,7 +1755,8 @@ async def show_matches(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode=ParseMode.MARKDOWN
     )
     
-    user_data = db.get_user(user_id)
+    user_data = await adb.get_user(user_id)
+    compatibilities = await adb.calculate_compatibility_many(user_id, [match['telegram_id'] for match in matches])
     
     for match in matches:
         interests_text = "Не указаны"
@@ -1730,7 +1770,7 @@ async def show_matches(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 except:
                     interests_text = match['interests']
         
-        compatibility = db.calculate_compatibility(user_id, match['telegram_id'])
+        compatibility = compatibilities[match['telegram_id']]
         
         common_interests = []
         if user_data and user_data.get('interests') and match.get('interests'):
@@ -1802,7 +1842,7 @@ async def show_matches(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def premium_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    has_premium = premium_system.check_premium_status(user_id)
+    has_premium = await premium_system.check_premium_status(user_id)
     
     text = premium_system.get_premium_info_text(has_premium)
     
@@ -1810,7 +1850,7 @@ async def premium_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_main_keyboard(user_id)
+            reply_markup=await get_main_keyboard(user_id)
         )
     else:
         await update.message.reply_text(
@@ -1828,7 +1868,7 @@ async def check_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE)
     is_subscribed = await premium_system.check_channel_subscription(user_id, context.bot)
     
     if is_subscribed:
-        if premium_system.activate_premium(user_id):
+        if await premium_system.activate_premium(user_id):
             try:
                 await query.edit_message_text(
                     "🎉 *ПОЗДРАВЛЯЕМ! Ты получил ПРЕМИУМ на 7 ДНЕЙ!*\n\n"
@@ -1874,7 +1914,7 @@ async def handle_view_liker(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.answer()
     
-    liker = db.get_user(liker_id)
+    liker = await adb.get_user(liker_id)
     if not liker:
         await query.message.reply_text("❌ Пользователь не найден")
         return
@@ -1890,7 +1930,7 @@ async def handle_view_liker(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except:
                 interests_text = liker['interests']
     
-    compatibility = db.calculate_compatibility(user_id, liker_id)
+    compatibility = await adb.calculate_compatibility(user_id, liker_id)
     
     caption = (
         f"👤 *{liker['name']}, {liker['age']}*\n"
@@ -1990,7 +2030,9 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        stats = db.get_admin_stats()
+        stats = await adb.get_admin_stats()
+        cache_stats = stats.get('profile_cache', {})
+        compat_stats = stats.get('compatibility_cache', {})
         
         stats_text = (
             
@@ -2012,6 +2054,14 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "⚠️ *МОДЕРАЦИЯ:*\n"
             f"• 📋 Жалоб на рассмотрении: {stats.get('pending_reports', 0)}\n\n"
             
+            "⚙️ *КЭШ ПРОФИЛЕЙ:*\n"
+            f"• 🎯 Попаданий: {cache_stats.get('hit_rate', 0)}% ({cache_stats.get('hits', 0)}/{cache_stats.get('hits', 0) + cache_stats.get('misses', 0)})\n"
+            f"• 📦 Записей: {cache_stats.get('size', 0)}\n\n"
+            
+            "⚙️ *КЭШ СОВМЕСТИМОСТИ:*\n"
+            f"• 🎯 Попаданий: {compat_stats.get('hit_rate', 0)}% ({compat_stats.get('hits', 0)}/{compat_stats.get('hits', 0) + compat_stats.get('misses', 0)})\n"
+            f"• 📦 Пар: {compat_stats.get('size', 0)}\n\n"
+            
             f"🕒 *Обновлено:* {datetime.now().strftime('%H:%M:%S')}"
         )
         
@@ -2059,7 +2109,7 @@ async def handle_admin_search(update: Update, context: ContextTypes.DEFAULT_TYPE
         return ConversationHandler.END
     
     try:
-        users = db.search_users(search_query, page=1, page_size=10)
+        users = await adb.search_users(search_query, page=1, page_size=10)
         
         if not users:
             await update.message.reply_text(
@@ -2113,7 +2163,7 @@ async def admin_blocked_users(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     try:
-        blocked_users = db.get_blocked_users(page=1, page_size=15)
+        blocked_users = await adb.get_blocked_users(page=1, page_size=15)
         
         if not blocked_users:
             await update.message.reply_text(
@@ -2195,7 +2245,7 @@ async def admin_pending_reports(update: Update, context: ContextTypes.DEFAULT_TY
         return
     
     try:
-        reports = db.get_pending_reports(page=1, page_size=10)
+        reports = await adb.get_pending_reports(page=1, page_size=10)
         
         if not reports:
             await update.message.reply_text(
@@ -2248,7 +2298,7 @@ async def admin_all_reports(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        reports = db.get_all_reports(page=1, page_size=5)
+        reports = await adb.get_all_reports(page=1, page_size=5)
         
         if not reports:
             await update.message.reply_text(
@@ -2309,7 +2359,7 @@ async def admin_all_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        users = db.get_all_users()
+        users = await adb.get_all_users()
         
         if not users:
             await update.message.reply_text(
@@ -2376,7 +2426,7 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
             ban_type = parts[1]
             target_id = int(parts[2])
             
-            if db.block_user(target_id, ban_type, "Бан через админ-панель"):
+            if await adb.block_user(target_id, ban_type, "Бан через админ-панель"):
                 await query.edit_message_text(
                     f"✅ Пользователь {target_id} заблокирован на {ban_type}"
                 )
@@ -2388,7 +2438,7 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         elif data.startswith('unban_'):
             target_id = int(data.replace('unban_', ''))
             
-            if db.unblock_user(target_id):
+            if await adb.unblock_user(target_id):
                 await query.edit_message_text(
                     f"✅ Пользователь {target_id} разблокирован"
                 )
@@ -2399,7 +2449,7 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
                 
         elif data.startswith('admin_view_'):
             target_id = int(data.replace('admin_view_', ''))
-            user = db.get_user(target_id)
+            user = await adb.get_user(target_id)
             
             if user:
                 interests_text = "Не указаны"
@@ -2465,7 +2515,7 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         elif data.startswith('report_reject_'):
             report_id = int(data.replace('report_reject_', ''))
             
-            if db.update_report_status(report_id, 'rejected', 'Жалоба отклонена', user_id):
+            if await adb.update_report_status(report_id, 'rejected', 'Жалоба отклонена', user_id):
                 await query.edit_message_text(
                     f"✅ Жалоба #{report_id} отклонена"
                 )
@@ -2479,8 +2529,8 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
             report_id = int(parts[2])
             target_id = int(parts[3])
             
-            if db.block_user(target_id, '7days', f"Бан по жалобе #{report_id}"):
-                db.update_report_status(report_id, 'resolved', 'Пользователь заблокирован', user_id)
+            if await adb.block_user(target_id, '7days', f"Бан по жалобе #{report_id}"):
+                await adb.update_report_status(report_id, 'resolved', 'Пользователь заблокирован', user_id)
                 await query.edit_message_text(
                     f"✅ Пользователь {target_id} заблокирован по жалобе #{report_id}"
                 )
@@ -2506,16 +2556,12 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
 async def auto_update_stats(context: ContextTypes.DEFAULT_TYPE):
     """Автоматическое обновление статистики и очистка кэша"""
     try:
-        db.cleanup_old_views()
-        db.reset_daily_likes()
-        logger.info("Auto-update: Old views cleaned and daily likes reset")
-        
         # Бэкап делаем только раз в день (каждые 24 часа)
         if config.BACKUP_ENABLED:
             current_hour = datetime.now().hour
             # Делаем бэкап только в определенное время (например, в 3 ночи)
             if current_hour == 3:  # 3 часа ночи
-                db.create_backup()
+                await adb.create_backup()
                 logger.info("Auto-update: Daily backup created")
             else:
                 logger.info(f"Auto-update: Backup skipped (current hour: {current_hour})")
@@ -2528,6 +2574,31 @@ async def auto_update_stats(context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Auto-update error: {e}")
 
+async def purge_expired_views(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая очистка устаревших просмотров анкет"""
+    try:
+        await adb.purge_expired_views(
+            batch_size=config.VIEWS_PURGE_BATCH_SIZE,
+            time_budget=config.VIEWS_PURGE_TIME_BUDGET
+        )
+    except Exception as e:
+        logger.error(f"Error purging expired views: {e}")
+
+async def rebuild_bio_vectors(context: ContextTypes.DEFAULT_TYPE):
+    """Ночной пересчет TF-IDF описаний анкет"""
+    try:
+        await adb.rebuild_bio_vectors()
+    except Exception as e:
+        logger.error(f"Error rebuilding bio vectors: {e}")
+
+async def rebuild_like_neighbours(context: ContextTypes.DEFAULT_TYPE):
+    """Ночной пересчет похожих анкет по лайкам"""
+    try:
+        if config.LIKE_NEIGHBOURS_ENABLED:
+            await adb.rebuild_like_neighbours()
+    except Exception as e:
+        logger.error(f"Error rebuilding like neighbours: {e}")
+
 async def send_smart_notifications(context: ContextTypes.DEFAULT_TYPE):
     """Отправка умных уведомлений"""
     try:
@@ -2570,6 +2641,7 @@ def main():
                 MessageHandler(filters.Regex("◀️ Назад к привычкам"), back_to_habits),
                 MessageHandler(filters.PHOTO, get_photos)
             ],
+            LOCATION: [MessageHandler(filters.LOCATION | (filters.TEXT & ~filters.COMMAND), get_location)],
             CONFIRMATION: [
                 MessageHandler(filters.Regex("✅ Всё верно, сохранить!"), confirm_registration),
                 MessageHandler(filters.Regex("✏️ Изменить данные"), start_registration)
@@ -2640,6 +2712,11 @@ def main():
     # Планировщик задач - ТЕПЕРЬ ПРАВИЛЬНО
     if application.job_queue:
         application.job_queue.run_repeating(auto_update_stats, interval=300, first=10)
+        application.job_queue.run_repeating(purge_expired_views, interval=config.VIEWS_PURGE_INTERVAL, first=30)
+        application.job_queue.run_repeating(feed_manager.refill_pending, interval=config.FEED_REFILL_INTERVAL, first=20)
+        application.job_queue.run_daily(rebuild_like_neighbours, time=dt_time(hour=config.LIKE_NEIGHBOURS_HOUR))
+        application.job_queue.run_daily(rebuild_bio_vectors, time=dt_time(hour=config.BIO_VECTORS_HOUR))
+        application.job_queue.run_daily(recommendation_engine.run_daily, time=dt_time(hour=config.RECOMMENDATIONS_HOUR))
         application.job_queue.run_repeating(send_smart_notifications, interval=3600, first=60)  # Каждый час
         logger.info("Планировщик задач инициализирован")
     else:
@@ -2647,6 +2724,8 @@ def main():
     
     logger.info("Бот ТочкаСхода запущен!")
     application.run_polling()
+    adb.shutdown()
+    db.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,349 @@
+# candidate_index.py
+"""Индекс кандидатов для ленты в памяти процесса.
+
+Активные анкеты разложены по разделам (place, gender, target_gender), где
+place - ячейка сетки geo_index (users.geo_cell), а у анкет без координат и без
+известного города - название города. Разделы те же, что у поиска
+(swipe_partitions). Раздел хранит столбцы NumPy с
+запасом емкости; удаленная анкета только снимает флаг alive, а раздел
+уплотняется, когда мертвых строк становится больше половины. Поэтому вопрос
+"кого может увидеть пользователь" - срезы и маски по нескольким разделам.
+Внутри разделов анкеты разложены по корзинам LSH (interest_lsh), чтобы в
+больших разделах отбирать похожих по интересам, не перебирая всех.
+
+Город анкеты хранится номером (city_code) в списке городов индекса: по нему
+поиск для анкеты с координатами заходит и в раздел ее города, где лежат
+анкеты без координат.
+
+Память на 100 тыс. анкет (замер tracemalloc): столбцы - 45 байт на анкету
+вместе с alive, с запасом емкости около 6,5 МБ; словарь позиций telegram_id ->
+(раздел, строка) - около 19 МБ. Всего около 25 МБ.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from geo_index import haversine_km
+from interest_lsh import InterestLSH, minhash_signature
+from profile_codec import FEATURE_COLUMNS
+
+COLUMNS = {
+    'telegram_id': np.int64,
+    'age': np.int16,
+    'trust_score': np.int32,
+    'created_at': np.int64,  # секунды Unix
+    'is_premium': np.bool_,
+    'latitude': np.float32,  # координаты анкеты или центра ее города
+    'longitude': np.float32,
+    'interests_mask': np.int32,
+    'city_code': np.int32,  # номер в списке городов индекса, -1 - город не указан
+    **{column: np.int8 for column in FEATURE_COLUMNS}
+}
+
+MISSING = {'latitude': np.nan, 'longitude': np.nan, 'city_code': -1}
+
+# Пол хранится без эмодзи, "кого ищу" - текстом кнопки регистрации
+GENDERS = ('Мужской', 'Женский', 'Другой')
+TARGET_GENDER_TO_GENDERS = {
+    '👨 Парни': ('Мужской',),
+    '👩 Девушки': ('Женский',),
+    '💝 Не важно': GENDERS
+}
+GENDER_TO_TARGET_GENDERS = {
+    'Мужской': ('👨 Парни', '💝 Не важно'),
+    'Женский': ('👩 Девушки', '💝 Не важно'),
+    'Другой': ('💝 Не важно',)
+}
+
+def swipe_partitions(current_user: Dict, places: Iterable) -> List[Tuple]:
+    """Разделы (place, gender, target_gender), где симпатия возможна взаимно"""
+    wanted_genders = TARGET_GENDER_TO_GENDERS.get(current_user.get('target_gender'), GENDERS)
+    accepting_targets = GENDER_TO_TARGET_GENDERS.get(current_user.get('gender'), ('💝 Не важно',))
+    return [(place, gender, target_gender)
+            for place in places
+            for gender in wanted_genders
+            for target_gender in accepting_targets]
+
+# Столбцы users для CandidateIndex.upsert; координаты без geo_cell дополняет Database
+INDEX_SELECT = f"""
+    SELECT telegram_id, age, gender, target_gender, city, trust_score, is_premium, is_active,
+           latitude, longitude, geo_cell, interests_minhash,
+           CAST(strftime('%s', created_at) AS INTEGER) AS created_at,
+           interests_mask, {', '.join(FEATURE_COLUMNS)}
+    FROM users
+"""
+
+PartitionKey = Tuple[Union[int, str], str, str]
+
+class _Partition:
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self.dead = 0
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    def _grow(self):
+        capacity = len(self.alive) * 2
+        self.alive = np.resize(self.alive, capacity)
+        self.alive[self.size:] = False
+        for name, column in self.columns.items():
+            self.columns[name] = np.resize(column, capacity)
+
+    def write(self, slot: int, row: Dict):
+        for name, column in self.columns.items():
+            value = row.get(name)
+            column[slot] = value if value is not None else MISSING.get(name, 0)
+
+    def append(self, row: Dict) -> int:
+        if self.size == len(self.alive):
+            self._grow()
+        slot = self.size
+        self.write(slot, row)
+        self.alive[slot] = True
+        self.size += 1
+        return slot
+
+    def kill(self, slot: int):
+        self.alive[slot] = False
+        self.dead += 1
+
+    def compact(self) -> np.ndarray:
+        """Оставляет только живые строки; возвращает их прежние номера"""
+        kept = np.flatnonzero(self.alive[:self.size])
+        capacity = max(64, len(kept) * 2)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.alive[:len(kept)] = True
+        for name, column in self.columns.items():
+            new_column = np.zeros(capacity, dtype=column.dtype)
+            new_column[:len(kept)] = column[kept]
+            self.columns[name] = new_column
+        self.size = len(kept)
+        self.dead = 0
+        return kept
+
+    def nbytes(self) -> int:
+        return self.alive.nbytes + sum(column.nbytes for column in self.columns.values())
+
+class CandidateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._partitions: Dict[PartitionKey, _Partition] = {}
+        self._positions: Dict[int, Tuple[PartitionKey, int]] = {}  # telegram_id -> (раздел, строка)
+        self._lsh = InterestLSH()
+        self._city_codes: Dict[str, int] = {}
+        self._cities: List[str] = []
+
+    @staticmethod
+    def _with_city_code(row: Dict, city_codes: Dict[str, int], cities: List[str]) -> Dict:
+        city = row.get('city')
+        if city is None:
+            return row
+        code = city_codes.get(city)
+        if code is None:
+            code = city_codes[city] = len(cities)
+            cities.append(city)
+        return dict(row, city_code=code)
+
+    @staticmethod
+    def _key(row: Dict) -> Optional[PartitionKey]:
+        place = row.get('geo_cell')
+        if place is None:
+            # Без координат анкета ищется только по совпадению города
+            place = row.get('city')
+        if not row.get('is_active') or place is None:
+            return None
+        return (place, row.get('gender'), row.get('target_gender'))
+
+    @staticmethod
+    def _signature(row: Dict) -> bytes:
+        return row.get('interests_minhash') or minhash_signature(row.get('interests_mask') or 0)
+
+    def load(self, rows: Iterable[Dict]):
+        """Полная пересборка из строк INDEX_SELECT"""
+        partitions = {}
+        positions = {}
+        lsh = InterestLSH()
+        city_codes = {}
+        cities = []
+        for row in rows:
+            key = self._key(row)
+            if key is None:
+                continue
+            partition = partitions.get(key)
+            if partition is None:
+                partition = partitions[key] = _Partition()
+            positions[row['telegram_id']] = (key, partition.append(self._with_city_code(row, city_codes, cities)))
+            lsh.insert(row['telegram_id'], key, self._signature(row))
+        with self._lock:
+            self._partitions = partitions
+            self._positions = positions
+            self._lsh = lsh
+            self._city_codes = city_codes
+            self._cities = cities
+
+    def __len__(self):
+        with self._lock:
+            return len(self._positions)
+
+    def _remove_locked(self, telegram_id: int):
+        position = self._positions.pop(telegram_id, None)
+        if position is None:
+            return
+        self._lsh.remove(telegram_id)
+        key, slot = position
+        partition = self._partitions[key]
+        partition.kill(slot)
+        if partition.dead > 32 and partition.dead * 2 > partition.size:
+            kept = partition.compact()
+            telegram_ids = partition.columns['telegram_id']
+            for new_slot in range(len(kept)):
+                self._positions[int(telegram_ids[new_slot])] = (key, new_slot)
+
+    def upsert(self, row: Dict):
+        """Добавляет или обновляет анкету; неактивная анкета удаляется из индекса"""
+        telegram_id = row['telegram_id']
+        key = self._key(row)
+        with self._lock:
+            row = self._with_city_code(row, self._city_codes, self._cities)
+            position = self._positions.get(telegram_id)
+            if position is not None and position[0] == key:
+                self._partitions[key].write(position[1], row)
+                self._lsh.insert(telegram_id, key, self._signature(row))
+                return
+            self._remove_locked(telegram_id)
+            if key is None:
+                return
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition()
+            self._positions[telegram_id] = (key, partition.append(row))
+            self._lsh.insert(telegram_id, key, self._signature(row))
+
+    def remove(self, telegram_id: int):
+        with self._lock:
+            self._remove_locked(telegram_id)
+
+    @staticmethod
+    def _mask(key: PartitionKey, columns: Dict[str, np.ndarray], alive: np.ndarray, min_age: int, max_age: int,
+              center: Optional[Tuple[float, float]], radius_km: Optional[float]) -> np.ndarray:
+        ages = columns['age']
+        mask = alive & (ages >= min_age) & (ages <= max_age)
+        if center is not None and isinstance(key[0], int) and mask.any():
+            mask &= haversine_km(center[0], center[1], columns['latitude'], columns['longitude']) <= radius_km
+        return mask
+
+    @staticmethod
+    def _combine(parts: List[Dict[str, np.ndarray]], exclude: Iterable[int]) -> Dict[str, np.ndarray]:
+        if not parts:
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        exclude = np.fromiter(exclude, dtype=np.int64)
+        if len(exclude):
+            keep = ~np.isin(columns['telegram_id'], exclude)
+            columns = {name: column[keep] for name, column in columns.items()}
+        return columns
+
+    @staticmethod
+    def _search_order(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        order = np.lexsort((-columns['created_at'], -columns['trust_score'].astype(np.int64)))
+        return {name: columns[name][order] for name in COLUMNS}
+
+    def candidates(self, keys: Iterable[PartitionKey], min_age: int, max_age: int,
+                   exclude: Iterable[int] = (), center: Optional[Tuple[float, float]] = None,
+                   radius_km: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Столбцы живых анкет из разделов keys в возрастном диапазоне, без exclude.
+
+        С center и radius_km в разделах-ячейках остаются только анкеты не дальше
+        radius_km от точки; разделы городов берутся целиком.
+
+        Порядок - как у прежней выдачи поиска: trust_score, затем created_at по убыванию.
+        """
+        parts: List[Dict[str, np.ndarray]] = []
+        with self._lock:
+            for key in keys:
+                partition = self._partitions.get(key)
+                if partition is None or not partition.size:
+                    continue
+                size = partition.size
+                columns = {name: column[:size] for name, column in partition.columns.items()}
+                mask = self._mask(key, columns, partition.alive[:size], min_age, max_age, center, radius_km)
+                if mask.any():
+                    parts.append({name: column[mask] for name, column in columns.items()})
+        return self._search_order(self._combine(parts, exclude))
+
+    def count(self, keys: Iterable[PartitionKey]) -> int:
+        """Число живых анкет в разделах keys - без фильтров, для выбора способа отбора"""
+        with self._lock:
+            return sum(partition.size - partition.dead
+                       for partition in (self._partitions.get(key) for key in keys) if partition is not None)
+
+    def similar(self, signature: bytes, keys: Iterable[PartitionKey], min_age: int, max_age: int,
+                exclude: Iterable[int] = (), center: Optional[Tuple[float, float]] = None,
+                radius_km: Optional[float] = None, limit: int = 1000) -> Dict[str, np.ndarray]:
+        """Как candidates(), но только анкеты из корзин LSH подписи signature.
+
+        Остаются не больше limit анкет с наибольшим числом совпавших полос.
+        """
+        keys = list(keys)
+        parts: List[Dict[str, np.ndarray]] = []
+        with self._lock:
+            slots_by_key: Dict[PartitionKey, Tuple[List[int], List[int]]] = {}
+            # С запасом: часть отобранных отсеют возраст, радиус и exclude
+            for telegram_id, hits in self._lsh.query(keys, signature, limit=limit * 2):
+                key, slot = self._positions[telegram_id]
+                slots, key_hits = slots_by_key.setdefault(key, ([], []))
+                slots.append(slot)
+                key_hits.append(hits)
+            for key, (slots, key_hits) in slots_by_key.items():
+                partition = self._partitions[key]
+                slots = np.array(slots, dtype=np.int64)
+                columns = {name: column[slots] for name, column in partition.columns.items()}
+                mask = self._mask(key, columns, partition.alive[slots], min_age, max_age, center, radius_km)
+                if mask.any():
+                    columns['hits'] = np.array(key_hits, dtype=np.int16)
+                    parts.append({name: column[mask] for name, column in columns.items()})
+
+        columns = self._combine(parts, exclude)
+        if 'hits' in columns and len(columns['hits']) > limit:
+            top = np.argsort(-columns['hits'], kind='stable')[:limit]
+            columns = {name: column[top] for name, column in columns.items()}
+        return self._search_order(columns)
+
+    def export(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Живые анкеты подряд по разделам, внутри раздела - в порядке выдачи поиска.
+
+        Строки partition_offsets[i]:partition_offsets[i + 1] принадлежат разделу
+        meta['partitions'][i], город строки - meta['cities'][city_code]. Формат для snapshot_store.
+        """
+        parts = []
+        keys = []
+        with self._lock:
+            for key, partition in self._partitions.items():
+                size = partition.size
+                alive = partition.alive[:size]
+                if not alive.any():
+                    continue
+                part = {name: column[:size][alive] for name, column in partition.columns.items()}
+                order = np.lexsort((-part['created_at'], -part['trust_score'].astype(np.int64)))
+                parts.append({name: column[order] for name, column in part.items()})
+                keys.append(list(key))
+            cities = list(self._cities)
+
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(part['telegram_id']) for part in parts], out=offsets[1:])
+        if parts:
+            columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+        else:
+            columns = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        columns['partition_offsets'] = offsets
+        return columns, {'rows': int(offsets[-1]), 'partitions': keys, 'cities': cities}
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'users': len(self._positions),
+                'partitions': len(self._partitions),
+                'array_bytes': sum(partition.nbytes() for partition in self._partitions.values()),
+                'lsh': self._lsh.get_stats()
+            }
@@ -10,6 +10,22 @@ class Config:
     # База данных
     DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///data/tochkasvoda.db')
     USE_POSTGRES = os.getenv('USE_POSTGRES', 'False').lower() == 'true'
+    # Файл SQLite; пусто - data/tochkasvoda.db
+    DATABASE_PATH = os.getenv('DATABASE_PATH', '')
+    # Потоки для асинхронного фасада БД: у каждого свое соединение-читатель
+    DB_EXECUTOR_WORKERS = 4
+    # Максимум операций записи, объединяемых в одну транзакцию писателем
+    DB_WRITE_BATCH_SIZE = 64
+    # Счетчики (статистика, просмотры, доверие) пишутся отложенно:
+    # при аварийной остановке теряется не больше интервала сброса
+    COUNTER_FLUSH_INTERVAL = 5  # секунд
+    COUNTER_MAX_PENDING = 5000  # досрочный сброс при таком числе накопленных ключей
+    # Фоновая очистка просмотров старше суток: пачками, с лимитом времени на запуск
+    VIEWS_PURGE_INTERVAL = 60  # секунд
+    VIEWS_PURGE_BATCH_SIZE = 500
+    VIEWS_PURGE_TIME_BUDGET = 0.5  # секунд
+    # Seen-set'ы (лайкнутые и просмотренные анкеты) в памяти, сохраняются раз в COUNTER_FLUSH_INTERVAL
+    SEEN_SETS_MAX_USERS = 50000
     
     # Redis для кэширования и rate limiting - ВЫКЛЮЧЕН
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -19,6 +35,21 @@ class Config:
     DEFAULT_SEARCH_RADIUS = 50
     PREMIUM_SEARCH_RADIUS = 200
     AGE_RANGE = 5
+    # Больше INTEREST_LSH_MIN_CANDIDATES анкет в разделах поиска - ранжируются только
+    # INTEREST_LSH_SHORTLIST похожих по интересам (MinHash/LSH, interest_lsh.py).
+    # Выключено: при 16 интересах полнота по итоговой совместимости около 0.5
+    # (benchmarks/interest_lsh_benchmark.py)
+    INTEREST_LSH_ENABLED = False
+    INTEREST_LSH_MIN_CANDIDATES = 5000
+    INTEREST_LSH_SHORTLIST = 2000
+    # Справочник населенных пунктов (TSV GeoNames или короткий); пусто - data/gazetteer/cities.tsv
+    GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', '')
+    
+    # Очередь ленты: фоновая задача добирает до FEED_SIZE, когда осталось меньше FEED_LOW_WATER
+    FEED_SIZE = 50
+    FEED_LOW_WATER = 10
+    FEED_REFILL_INTERVAL = 15
+    FEED_REFILL_MAX_USERS = 100
     
     # Лимиты
     FREE_SWIPES_PER_DAY = 50
@@ -54,6 +85,28 @@ class Config:
     AI_MATCHING_ENABLED = True
     MIN_COMPATIBILITY_SCORE = 70
     MAX_DAILY_RECOMMENDATIONS = 10
+    # Ночной пересчет рекомендаций (час по UTC) в пуле процессов
+    RECOMMENDATIONS_HOUR = 4
+    RECOMMENDATIONS_WORKERS = os.cpu_count() or 1
+    RECOMMENDATIONS_CHUNK_SIZE = 500
+    # Снимки индекса кандидатов для процессов (mmap); пусто - data/snapshots рядом с базой
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', '')
+    SNAPSHOT_KEEP_GENERATIONS = 2
+    # Схожесть личностей по TF-IDF описаний (bio_vectors.py) вместо таблицы типов личности.
+    # Выключено: несхожие и короткие описания получают около 40 баллов против 55-90 по
+    # таблице, и при MIN_COMPATIBILITY_SCORE = 70 лента заметно сокращается. Векторы
+    # поддерживаются и пересчитываются раз в сутки и при выключенном флаге
+    BIO_SIMILARITY_ENABLED = False
+    BIO_VECTORS_HOUR = 3
+    # Похожие анкеты по лайкам (like_neighbours.py), пересчет раз в сутки. В ленте соседи
+    # последних LIKE_NEIGHBOURS_RECENT_LIKES лайков поднимаются на 0..LIKE_NEIGHBOURS_BONUS баллов
+    LIKE_NEIGHBOURS_ENABLED = True
+    LIKE_NEIGHBOURS_HOUR = 2
+    LIKE_NEIGHBOURS_TOP_K = 20
+    LIKE_NEIGHBOURS_MIN_CO_LIKES = 2
+    LIKE_NEIGHBOURS_MAX_LIKES_PER_USER = 500
+    LIKE_NEIGHBOURS_RECENT_LIKES = 50
+    LIKE_NEIGHBOURS_BONUS = 10
     
     # Blind Date настройки - УДАЛЕНЫ
     # BLIND_DATE_ENABLED = True
@@ -78,9 +131,11 @@ class Config:
     # MIN_ROULETTE_COMPATIBILITY = 70
     # ROULETTE_NOTIFICATION_ENABLED = True
     
-    # Кэширование - ВЫКЛЮЧЕНО
+    # Кэширование (Redis выключен, кэши в памяти процесса)
     CACHE_TTL = 3600
+    PROFILE_CACHE_SIZE = 10000
     SEARCH_CACHE_TTL = 1800
     COMPATIBILITY_CACHE_TTL = 3600
+    COMPATIBILITY_CACHE_SIZE = 50000
 
 config = Config()
\ No newline at end of file
@@ -0,0 +1,18 @@
+# csr.py
+"""Общие операции над разреженными матрицами в виде CSR (indptr + столбцы).
+
+Используются соседями по лайкам (like_neighbours) и расчетом рекомендаций
+по снимку (recommendation_worker) - для векторов описаний в CSR снимка.
+"""
+from typing import Tuple
+
+import numpy as np
+
+def take_rows(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Строки CSR-матрицы: новый indptr и позиции их элементов в indices/weights"""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_indptr[1:])
+    positions = np.repeat(starts - new_indptr[:-1], lengths) + np.arange(new_indptr[-1])
+    return new_indptr, positions
@@ -2,13 +2,34 @@
 import sqlite3
 import logging
 import json
-from datetime import datetime, timedelta
+import asyncio
+import bisect
+import functools
+import heapq
+import queue
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import os
 import random
 import string
 import math
 from typing import List, Dict, Optional, Tuple
 from config import config
+from profile_codec import (
+    encode_interests, normalize_interest, bit_count, profile_features, user_features, FEATURE_COLUMNS, RARE_INTERESTS_MASK,
+    GOALS_MATRIX, LIFESTYLE_MATRIX, HABITS_MATRIX, PERSONALITY_MATRIX
+)
+from batch_scoring import rank_arrays
+from candidate_index import CandidateIndex, INDEX_SELECT, swipe_partitions
+from geo_index import cell_of, covering_cells
+from gazetteer import Gazetteer, normalize_name, read_gazetteer
+from interest_lsh import minhash_signature
+from bio_vectors import BioVectorStore, bio_score
+from like_neighbours import affinity_boost, item_neighbours, peak_rss_mb, read_likes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,30 +43,27 @@ class AdvancedCompatibilitySystem:
             'personality': 0.15,
             'habits': 0.10
         }
+        # TF-IDF описаний (bio_vectors.py); без него - таблица типов личности
+        self.bio_vectors = None
         
     def calculate_advanced_compatibility(self, user1: Dict, user2: Dict) -> Dict:
-        """Расчет совместимости без кэширования"""
+        """Расчет совместимости по признакам, посчитанным при записи анкеты"""
         try:
+            features1 = user_features(user1)
+            features2 = user_features(user2)
             scores = {}
             
-            interest_score = self._calculate_interest_compatibility(user1, user2)
+            interest_score = self._calculate_interest_compatibility(features1, features2)
             scores['interests'] = interest_score
             
-            goals_score = self._calculate_goals_compatibility(user1, user2)
-            scores['goals'] = goals_score
-            
-            lifestyle_score = self._calculate_lifestyle_compatibility(user1, user2)
-            scores['lifestyle'] = lifestyle_score
-            
-            personality_score = self._calculate_personality_compatibility(user1, user2)
-            scores['personality'] = personality_score
-            
-            habits_score = self._calculate_habits_compatibility(user1, user2)
-            scores['habits'] = habits_score
+            scores['goals'] = GOALS_MATRIX[features1['goal_code']][features2['goal_code']]
+            scores['lifestyle'] = LIFESTYLE_MATRIX[features1['lifestyle_code']][features2['lifestyle_code']]
+            scores['personality'] = self._calculate_personality_compatibility(user1, user2, features1, features2)
+            scores['habits'] = HABITS_MATRIX[features1['habits_code']][features2['habits_code']]
             
             total_score = sum(scores[factor] * weight for factor, weight in self.weights.items())
             
-            bonus = self._calculate_compatibility_bonus(user1, user2)
+            bonus = self._calculate_compatibility_bonus(user1, user2, features1, features2)
             total_score = min(100, total_score + bonus)
             
             result = {
@@ -60,148 +78,34 @@ class AdvancedCompatibilitySystem:
         except Exception as e:
             logger.error(f"Error in advanced compatibility: {e}")
             return self._get_default_compatibility()
-    
-    def _calculate_interest_compatibility(self, user1: Dict, user2: Dict) -> float:
-        interests1 = set(user1.get('interests', []))
-        interests2 = set(user2.get('interests', []))
+
+    def _calculate_interest_compatibility(self, features1: Dict, features2: Dict) -> float:
+        interests1 = features1['interests_mask']
+        interests2 = features2['interests_mask']
         
         if not interests1 or not interests2:
             return 30.0
             
-        common = interests1.intersection(interests2)
-        total = interests1.union(interests2)
+        common = interests1 & interests2
+        total = interests1 | interests2
         
-        base_score = (len(common) / len(total)) * 70
+        base_score = (bit_count(common) / bit_count(total)) * 70
         
-        rare_interests = {'🎯 Настолки', '🧘 Йога', '🎨 Искусство', '💻 IT', '📸 Фотография'}
-        rare_common = common.intersection(rare_interests)
-        bonus = len(rare_common) * 5
+        bonus = bit_count(common & RARE_INTERESTS_MASK) * 5
         
         return min(100, base_score + bonus)
-    
-    def _calculate_goals_compatibility(self, user1: Dict, user2: Dict) -> float:
-        goal1 = user1.get('relationship_goal', '')
-        goal2 = user2.get('relationship_goal', '')
-        
-        if not goal1 or not goal2:
-            return 50.0
-            
-        goals_matrix = {
-            'Серьезные отношения': {
-                'Серьезные отношения': 95, 'Дружба и общение': 40, 'Романтические встречи': 70,
-                'Новые знакомства': 50, 'Еще не определился(ась)': 60
-            },
-            'Дружба и общение': {
-                'Серьезные отношения': 40, 'Дружба и общение': 90, 'Романтические встречи': 60,
-                'Новые знакомства': 75, 'Еще не определился(ась)': 70
-            },
-            'Романтические встречи': {
-                'Серьезные отношения': 70, 'Дружба и общение': 60, 'Романтические встречи': 85,
-                'Новые знакомства': 65, 'Еще не определился(ась)': 70
-            },
-            'Новые знакомства': {
-                'Серьезные отношения': 50, 'Дружба и общение': 75, 'Романтические встречи': 65,
-                'Новые знакомства': 80, 'Еще не определился(ась)': 75
-            },
-            'Еще не определился(ась)': {
-                'Серьезные отношения': 60, 'Дружба и общение': 70, 'Романтические встречи': 70,
-                'Новые знакомства': 75, 'Еще не определился(ась)': 70
-            }
-        }
-        
-        return goals_matrix.get(goal1, {}).get(goal2, 50.0)
-    
-    def _calculate_lifestyle_compatibility(self, user1: Dict, user2: Dict) -> float:
-        lifestyle1 = user1.get('lifestyle', '')
-        lifestyle2 = user2.get('lifestyle', '')
-        
-        if not lifestyle1 or not lifestyle2:
-            return 50.0
-            
-        lifestyle_matrix = {
-            'Активный спортсмен': {
-                'Активный спортсмен': 90, 'Учеба и развитие': 65, 'Работа и карьера': 55,
-                'Творческий поиск': 70, 'Спокойный и размеренный': 45, 'Вечеринки и тусовки': 75
-            },
-            'Учеба и развитие': {
-                'Активный спортсмен': 65, 'Учеба и развитие': 85, 'Работа и карьера': 75,
-                'Творческий поиск': 80, 'Спокойный и размеренный': 70, 'Вечеринки и тусовки': 55
-            },
-            'Работа и карьера': {
-                'Активный спортсмен': 55, 'Учеба и развитие': 75, 'Работа и карьера': 80,
-                'Творческий поиск': 65, 'Спокойный и размеренный': 70, 'Вечеринки и тусовки': 50
-            },
-            'Творческий поиск': {
-                'Активный спортсмен': 70, 'Учеба и развитие': 80, 'Работа и карьера': 65,
-                'Творческий поиск': 90, 'Спокойный и размеренный': 75, 'Вечеринки и тусовки': 80
-            },
-            'Спокойный и размеренный': {
-                'Активный спортсмен': 45, 'Учеба и развитие': 70, 'Работа и карьера': 70,
-                'Творческий поиск': 75, 'Спокойный и размеренный': 85, 'Вечеринки и тусовки': 40
-            },
-            'Вечеринки и тусовки': {
-                'Активный спортсмен': 75, 'Учеба и развитие': 55, 'Работа и карьера': 50,
-                'Творческий поиск': 80, 'Спокойный и размеренный': 40, 'Вечеринки и тусовки': 95
-            }
-        }
-        
-        return lifestyle_matrix.get(lifestyle1, {}).get(lifestyle2, 50.0)
-    
-    def _calculate_personality_compatibility(self, user1: Dict, user2: Dict) -> float:
-        bio1 = user1.get('bio', '').lower()
-        bio2 = user2.get('bio', '').lower()
-        
-        if not bio1 or not bio2:
-            return 40.0
-            
-        personality1 = self._analyze_personality(bio1)
-        personality2 = self._analyze_personality(bio2)
-        
-        personality_matrix = {
-            'active': {'active': 85, 'creative': 75, 'intellectual': 60, 'calm': 55},
-            'creative': {'active': 75, 'creative': 90, 'intellectual': 80, 'calm': 70},
-            'intellectual': {'active': 60, 'creative': 80, 'intellectual': 85, 'calm': 75},
-            'calm': {'active': 55, 'creative': 70, 'intellectual': 75, 'calm': 90}
-        }
-        
-        return personality_matrix.get(personality1, {}).get(personality2, 65.0)
-    
-    def _calculate_habits_compatibility(self, user1: Dict, user2: Dict) -> float:
-        habits1 = user1.get('habits', '')
-        habits2 = user2.get('habits', '')
-        
-        if not habits1 or not habits2:
-            return 50.0
-            
-        habits_matrix = {
-            'Не курю и не пью': {
-                'Не курю и не пью': 95, 'Иногда выпиваю': 60, 'Курю иногда': 35,
-                'Люблю вечеринки': 40, 'Курю регулярно': 25
-            },
-            'Иногда выпиваю': {
-                'Не курю и не пью': 60, 'Иногда выпиваю': 80, 'Курю иногда': 55,
-                'Люблю вечеринки': 70, 'Курю регулярно': 45
-            },
-            'Курю иногда': {
-                'Не курю и не пью': 35, 'Иногда выпиваю': 55, 'Курю иногда': 85,
-                'Люблю вечеринки': 60, 'Курю регулярно': 75
-            },
-            'Люблю вечеринки': {
-                'Не курю и не пью': 40, 'Иногда выпиваю': 70, 'Курю иногда': 60,
-                'Люблю вечеринки': 90, 'Курю регулярно': 65
-            },
-            'Курю регулярно': {
-                'Не курю и не пью': 25, 'Иногда выпиваю': 45, 'Курю иногда': 75,
-                'Люблю вечеринки': 65, 'Курю регулярно': 90
-            }
-        }
-        
-        return habits_matrix.get(habits1, {}).get(habits2, 50.0)
-    
-    def _calculate_compatibility_bonus(self, user1: Dict, user2: Dict) -> float:
+
+    def _calculate_personality_compatibility(self, user1: Dict, user2: Dict, features1: Dict, features2: Dict) -> float:
+        if self.bio_vectors is not None and user1.get('telegram_id') and user2.get('telegram_id'):
+            similarity = self.bio_vectors.similarity(user1['telegram_id'], user2['telegram_id'])
+            if similarity is not None:
+                return bio_score(similarity)
+        return PERSONALITY_MATRIX[features1['personality_code']][features2['personality_code']]
+
+    def _calculate_compatibility_bonus(self, user1: Dict, user2: Dict, features1: Dict, features2: Dict) -> float:
         bonus = 0
         
-        if user1.get('zodiac') and user2.get('zodiac') and user1['zodiac'] == user2['zodiac']:
+        if features1['zodiac_code'] and features1['zodiac_code'] == features2['zodiac_code']:
             bonus += 8
             
         age_diff = abs(user1.get('age', 0) - user2.get('age', 0))
@@ -212,23 +116,6 @@ class AdvancedCompatibilitySystem:
             
         return bonus
     
-    def _analyze_personality(self, bio: str) -> str:
-        active_words = {'спорт', 'фитнес', 'путешествия', 'активный', 'танцы', 'бег', 'тренировки'}
-        creative_words = {'искусство', 'творчество', 'музыка', 'рисование', 'фотография', 'дизайн'}
-        intellectual_words = {'книги', 'наука', 'программирование', 'it', 'образование', 'изучение'}
-        calm_words = {'отдых', 'семья', 'дом', 'уют', 'спокойствие', 'природа'}
-        
-        bio_words = set(bio.split())
-        
-        scores = {
-            'active': len(bio_words.intersection(active_words)),
-            'creative': len(bio_words.intersection(creative_words)),
-            'intellectual': len(bio_words.intersection(intellectual_words)),
-            'calm': len(bio_words.intersection(calm_words))
-        }
-        
-        return max(scores, key=scores.get) if max(scores.values()) > 0 else 'calm'
-    
     def _get_compatibility_description(self, score: float) -> str:
         if score >= 90:
             return "💖 ИДЕАЛЬНАЯ СОВМЕСТИМОСТЬ! Редкая химия!"
@@ -335,14 +222,70 @@ class AdvancedLocationSystem:
             "Томск": (56.4846, 84.9482)
         }
     
+        # Расстояния между городами считаются один раз; соседи - по возрастанию расстояния
+        self.city_distances = {
+            city1: {
+                city2: self._haversine_distance(*coords1, *coords2)
+                for city2, coords2 in self.city_coordinates.items()
+            }
+            for city1, coords1 in self.city_coordinates.items()
+        }
+        self._neighbours = {}
+        for city, distances in self.city_distances.items():
+            neighbours = sorted((distance, other) for other, distance in distances.items() if other != city)
+            self._neighbours[city] = ([distance for distance, other in neighbours], [other for distance, other in neighbours])
+
+        # До загрузки файла справочник состоит из встроенных городов
+        self.gazetteer = Gazetteer(self._builtin_settlements())
+
+    def _builtin_settlements(self):
+        return [(city, latitude, longitude, 0, []) for city, (latitude, longitude) in self.city_coordinates.items()]
+
+    def load_gazetteer(self, path: str) -> bool:
+        """Справочник населенных пунктов из файла; встроенные города остаются в нем"""
+        if not os.path.exists(path):
+            logger.warning(f"Gazetteer file not found: {path}")
+            return False
+        try:
+            started = time.monotonic()
+            settlements = list(read_gazetteer(path))
+            known = {normalize_name(settlement[0]) for settlement in settlements}
+            settlements += [settlement for settlement in self._builtin_settlements()
+                            if normalize_name(settlement[0]) not in known]
+            self.gazetteer = Gazetteer(settlements)
+            stats = self.gazetteer.get_stats()
+            logger.info(f"Gazetteer loaded: {stats['settlements']} settlements, {stats['names']} names, "
+                        f"{stats['array_bytes'] / 1024 / 1024:.1f} MB arrays, {time.monotonic() - started:.2f}s")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading gazetteer: {e}")
+            return False
+
+    def resolve_city(self, name: str, near: Optional[Tuple[float, float]] = None) -> Optional[Dict]:
+        """Населенный пункт по введенному названию"""
+        return self.gazetteer.find(name, near=near)
+
+    def nearest_city(self, latitude: float, longitude: float) -> Optional[Dict]:
+        """Ближайший населенный пункт к присланной геопозиции"""
+        return self.gazetteer.nearest(latitude, longitude)
+    
     def calculate_distance(self, city1: str, city2: str) -> float:
-        if city1 not in self.city_coordinates or city2 not in self.city_coordinates:
-            return float('inf')
-            
-        lat1, lon1 = self.city_coordinates[city1]
-        lat2, lon2 = self.city_coordinates[city2]
-        
-        return self._haversine_distance(lat1, lon1, lat2, lon2)
+        return self.city_distances.get(city1, {}).get(city2, float('inf'))
+
+    def coordinates(self, user: Dict) -> Optional[Tuple[float, float]]:
+        """Координаты анкеты, а без них - центр ее города"""
+        if user.get('latitude') is not None and user.get('longitude') is not None:
+            return (user['latitude'], user['longitude'])
+        coordinates = self.city_coordinates.get(user.get('city'))
+        if coordinates is None and user.get('city'):
+            settlement = self.gazetteer.find(user['city'])
+            if settlement:
+                coordinates = (settlement['latitude'], settlement['longitude'])
+        return coordinates
+
+    def geo_cell(self, user: Dict) -> Optional[int]:
+        coordinates = self.coordinates(user)
+        return cell_of(*coordinates) if coordinates else None
     
     def _haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         R = 6371
@@ -353,20 +296,728 @@ class AdvancedLocationSystem:
         return R * c
     
     def get_nearby_cities(self, city: str, radius_km: float) -> List[str]:
-        if city not in self.city_coordinates:
+        if city not in self._neighbours:
             return []
-            
-        nearby = []
-        for other_city, coords in self.city_coordinates.items():
-            if other_city != city:
-                distance = self.calculate_distance(city, other_city)
-                if distance <= radius_km:
-                    nearby.append(other_city)
-                    
-        return nearby
+        distances, cities = self._neighbours[city]
+        return cities[:bisect.bisect_right(distances, radius_km)]
+
+class ConnectionManager:
+    """Менеджер соединений SQLite в режиме WAL.
+
+    Каждый поток-читатель получает собственное соединение из пула, поэтому
+    чтения не ждут друг друга и не блокируются записью. Все записи проходят
+    через один поток-писатель: накопившиеся в очереди операции выполняются
+    одной транзакцией (group commit), каждая внутри своего SAVEPOINT, чтобы
+    ошибка одной операции не откатывала остальные. Операция может отложить
+    изменение состояния в памяти до фиксации через after_commit.
+    """
+    def __init__(self, db_path: str, max_batch: int = 64):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.stats = {'batches': 0, 'writes': 0, 'failed_writes': 0}
+
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._callbacks = None  # after_commit текущей операции писателя
+
+        # Соединение писателя открываем первым: оно включает WAL для файла базы
+        self._writer_connection = self._open_connection()
+        self._writer_connection.execute("PRAGMA journal_mode=WAL")
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+        self._writer.start()
+
+    def _open_connection(self, read_only=False):
+        connection = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA synchronous=NORMAL")
+        if read_only:
+            connection.execute("PRAGMA query_only=ON")
+        return connection
+
+    def reader(self) -> sqlite3.Connection:
+        """Соединение для чтения, закрепленное за текущим потоком"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._open_connection(read_only=True)
+            self._local.connection = connection
+            with self._readers_lock:
+                self._readers.append(connection)
+        return connection
+
+    def write(self, func):
+        """Выполняет func(connection) в потоке-писателе и ждет фиксации транзакции"""
+        if threading.current_thread() is self._writer:
+            return func(self._writer_connection)
+
+        future = Future()
+        self._queue.put((func, future))
+        return future.result()
+
+    def after_commit(self, callback):
+        """Вызывается из операции записи: callback() выполнится в потоке-писателе
+        после фиксации транзакции и до возврата из write; при откате операции - не выполнится"""
+        if threading.current_thread() is not self._writer or self._callbacks is None:
+            raise RuntimeError("after_commit is only available inside a write operation")
+        self._callbacks.append(callback)
+
+    def execute(self, sql, params=()):
+        """Одиночный оператор записи, возвращает количество затронутых строк"""
+        return self.write(lambda connection: connection.execute(sql, params).rowcount)
+
+    def executemany(self, sql, seq_of_params):
+        return self.write(lambda connection: connection.executemany(sql, seq_of_params).rowcount)
+
+    def _writer_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._commit_batch(batch)
+            if stop:
+                break
+
+    def _commit_batch(self, batch):
+        connection = self._writer_connection
+        results = []
+        callbacks = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for func, future in batch:
+                connection.execute("SAVEPOINT write_job")
+                self._callbacks = []
+                try:
+                    results.append((future, func(connection), None))
+                    connection.execute("RELEASE write_job")
+                    callbacks.extend(self._callbacks)
+                except Exception as e:
+                    connection.execute("ROLLBACK TO write_job")
+                    connection.execute("RELEASE write_job")
+                    results.append((future, None, e))
+                finally:
+                    self._callbacks = None
+            connection.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"Group commit failed: {e}")
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"After-commit callback failed: {e}")
+
+        self.stats['batches'] += 1
+        self.stats['writes'] += len(batch)
+        for future, result, error in results:
+            if error is not None:
+                self.stats['failed_writes'] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        self._writer_connection.close()
+        with self._readers_lock:
+            for connection in self._readers:
+                connection.close()
+            self._readers = []
+
+class CounterBuffer:
+    """Отложенная запись счетчиков (write-behind).
+
+    Приращения daily_stats, profile_views и trust_score складываются в памяти
+    и сбрасываются в SQLite пакетными upsert'ами по таймеру, при переполнении
+    и при остановке. Чтения добавляют к данным из базы еще не сброшенные дельты.
+    """
+    DAILY_STATS = ('likes_given', 'likes_received', 'views_given', 'views_received')
+
+    def __init__(self, pool: ConnectionManager, flush_interval: float = 5, max_pending: int = 5000,
+                 on_trust_flushed=None):
+        self.pool = pool
+        # Вызывается с telegram_id, чей trust_score записан в базу
+        self.on_trust_flushed = on_trust_flushed
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.stats = {'flushes': 0, 'flushed_keys': 0, 'failed_flushes': 0}
+
+        self._lock = threading.Lock()
+        self._daily = {}  # (user_id, date) -> {stat: delta}
+        self._views = {}  # (viewer_id, viewed_id) -> [count, last_viewed]
+        self._trust = {}  # user_id -> delta
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='db-counters', daemon=True)
+        self._flusher.start()
+
+    def _pending_keys(self):
+        return len(self._daily) + len(self._views) + len(self._trust)
+
+    def _after_add(self):
+        if self._pending_keys() >= self.max_pending:
+            self._wakeup.set()
+
+    @staticmethod
+    def today() -> str:
+        """Ключ дня daily_stats - по UTC, как date('now') в SQLite"""
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    def add_daily_stat(self, user_id, stat_type, amount=1):
+        if stat_type not in self.DAILY_STATS:
+            raise ValueError(f"Unknown daily stat: {stat_type}")
+
+        key = (user_id, self.today())
+        with self._lock:
+            deltas = self._daily.setdefault(key, {})
+            deltas[stat_type] = deltas.get(stat_type, 0) + amount
+            self._after_add()
+
+    def add_profile_view(self, viewer_id, viewed_id):
+        # Формат как у CURRENT_TIMESTAMP в SQLite (UTC)
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            entry = self._views.setdefault((viewer_id, viewed_id), [0, now])
+            entry[0] += 1
+            entry[1] = now
+            self._after_add()
+
+    def add_trust(self, user_id, delta):
+        with self._lock:
+            self._trust[user_id] = self._trust.get(user_id, 0) + delta
+            self._after_add()
+
+    def pending_daily(self, user_id, date):
+        with self._lock:
+            return dict(self._daily.get((user_id, date), {}))
+
+    def pending_trust(self, user_id):
+        with self._lock:
+            return self._trust.get(user_id, 0)
+
+    def pending_viewers(self, viewed_id):
+        with self._lock:
+            return {viewer for viewer, viewed in self._views if viewed == viewed_id}
+
+    def flush(self):
+        """Сбрасывает накопленное одной транзакцией, возвращает число ключей"""
+        with self._lock:
+            daily, self._daily = self._daily, {}
+            views, self._views = self._views, {}
+            trust, self._trust = self._trust, {}
+
+        if not (daily or views or trust):
+            return 0
 
-class Database:
+        def _write(connection):
+            for stat_type in self.DAILY_STATS:
+                rows = [(user_id, date, deltas[stat_type])
+                        for (user_id, date), deltas in daily.items() if deltas.get(stat_type)]
+                if rows:
+                    connection.executemany(f"""
+                        INSERT INTO daily_stats (user_id, date, {stat_type}) 
+                        VALUES (?, ?, ?)
+                        ON CONFLICT(user_id, date) DO UPDATE SET {stat_type} = {stat_type} + excluded.{stat_type}
+                    """, rows)
+
+            if views:
+                connection.executemany("""
+                    INSERT INTO profile_views (viewer_id, viewed_id, view_count, last_viewed)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(viewer_id, viewed_id) DO UPDATE SET 
+                        view_count = view_count + excluded.view_count,
+                        last_viewed = excluded.last_viewed
+                """, [(viewer_id, viewed_id, count, last_viewed)
+                      for (viewer_id, viewed_id), (count, last_viewed) in views.items()])
+
+            if trust:
+                connection.executemany("""
+                    UPDATE users SET trust_score = trust_score + ? WHERE telegram_id = ?
+                """, [(delta, user_id) for user_id, delta in trust.items() if delta])
+
+        keys = len(daily) + len(views) + len(trust)
+        try:
+            self.pool.write(_write)
+        except Exception as e:
+            logger.error(f"Counter flush failed, {keys} keys returned to buffer: {e}")
+            self.stats['failed_flushes'] += 1
+            self._restore(daily, views, trust)
+            return 0
+
+        self.stats['flushes'] += 1
+        self.stats['flushed_keys'] += keys
+        if trust and self.on_trust_flushed:
+            self.on_trust_flushed(*trust.keys())
+        return keys
+
+    def _restore(self, daily, views, trust):
+        with self._lock:
+            for key, deltas in daily.items():
+                current = self._daily.setdefault(key, {})
+                for stat_type, delta in deltas.items():
+                    current[stat_type] = current.get(stat_type, 0) + delta
+            for key, (count, last_viewed) in views.items():
+                entry = self._views.setdefault(key, [0, last_viewed])
+                entry[0] += count
+                entry[1] = max(entry[1], last_viewed)
+            for user_id, delta in trust.items():
+                self._trust[user_id] = self._trust.get(user_id, 0) + delta
+
+    def _flush_loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+
+class BlocklistIndex:
+    """Блок-лист в памяти: словарь telegram_id -> blocked_until и min-heap сроков.
+
+    Проверка блокировки - поиск в словаре без обращения к базе. Истекшие
+    временные баны снимаются с вершины кучи; записи кучи, не совпадающие со
+    словарем (после разбана или повторного бана), отбрасываются лениво.
+    """
     def __init__(self):
+        self._lock = threading.Lock()
+        self._blocked = {}
+        self._expiry = []
+
+    @staticmethod
+    def _parse_until(blocked_until):
+        if isinstance(blocked_until, str):
+            return datetime.fromisoformat(blocked_until)
+        return blocked_until
+
+    def load(self, rows):
+        blocked = {}
+        for telegram_id, blocked_until in rows:
+            try:
+                blocked[telegram_id] = self._parse_until(blocked_until)
+            except ValueError:
+                logger.error(f"Invalid blocked_until for {telegram_id}: {blocked_until}")
+
+        expiry = [(until, telegram_id) for telegram_id, until in blocked.items() if until is not None]
+        heapq.heapify(expiry)
+        with self._lock:
+            self._blocked = blocked
+            self._expiry = expiry
+
+    def add(self, telegram_id, blocked_until=None):
+        """blocked_until=None - бессрочный бан"""
+        blocked_until = self._parse_until(blocked_until)
+        with self._lock:
+            self._blocked[telegram_id] = blocked_until
+            if blocked_until is not None:
+                heapq.heappush(self._expiry, (blocked_until, telegram_id))
+
+    def remove(self, telegram_id):
+        with self._lock:
+            self._blocked.pop(telegram_id, None)
+
+    def pop_expired(self, now=None):
+        """Снимает с кучи истекшие баны и возвращает их telegram_id"""
+        now = now or datetime.now()
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                blocked_until, telegram_id = heapq.heappop(self._expiry)
+                if telegram_id in self._blocked and self._blocked[telegram_id] == blocked_until:
+                    del self._blocked[telegram_id]
+                    expired.append(telegram_id)
+        return expired
+
+    def is_blocked(self, telegram_id):
+        return telegram_id in self._blocked
+
+    def __len__(self):
+        return len(self._blocked)
+
+class ProfileCache:
+    """LRU-кэш профилей с TTL и версиями профилей.
+
+    Запись в кэш принимается только если версия профиля не менялась с начала
+    чтения из базы, поэтому параллельная инвалидация не даст закэшировать
+    устаревшую строку. Наружу отдаются копии, чтобы вызывающий код не портил кэш.
+
+    Версия - отметка общего счетчика при последней инвалидации. Хранятся только
+    последние max_versions отметок; у остальных пользователей версия - наибольшая
+    вытесненная отметка (_floor). Она только растет, поэтому вытеснение может
+    лишь зря отклонить запись, но не пропустить устаревшую.
+    """
+    def __init__(self, max_size: int = 10000, ttl: float = 3600, max_versions: Optional[int] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_versions = max_versions or max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # telegram_id -> (expires_at, profile)
+        self._versions = OrderedDict()  # telegram_id -> отметка последней инвалидации, по возрастанию
+        self._clock = 0
+        self._floor = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+    @staticmethod
+    def _copy(profile):
+        profile = dict(profile)
+        for key in ('photos', 'interests'):
+            if isinstance(profile.get(key), list):
+                profile[key] = list(profile[key])
+        return profile
+
+    def version(self, telegram_id):
+        with self._lock:
+            return self._versions.get(telegram_id, self._floor)
+
+    def get(self, telegram_id):
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            # Версию проверять не нужно: invalidate сразу удаляет запись
+            expires_at, profile = entry
+            if expires_at < time.monotonic():
+                del self._entries[telegram_id]
+                self.stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(telegram_id)
+            self.stats['hits'] += 1
+        return self._copy(profile)
+
+    def put(self, telegram_id, profile, version):
+        profile = self._copy(profile)
+        with self._lock:
+            if version != self._versions.get(telegram_id, self._floor):
+                return False
+            self._entries[telegram_id] = (time.monotonic() + self.ttl, profile)
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return True
+
+    def invalidate(self, *telegram_ids):
+        with self._lock:
+            for telegram_id in telegram_ids:
+                self._clock += 1
+                self._versions[telegram_id] = self._clock
+                self._versions.move_to_end(telegram_id)
+                self._entries.pop(telegram_id, None)
+                self.stats['invalidations'] += 1
+
+            # Вытеснение пачкой: _floor растет редко, и записи CompatibilityCache
+            # с версией _floor реже устаревают без правки анкет
+            if len(self._versions) > 2 * self.max_versions:
+                while len(self._versions) > self.max_versions:
+                    _, self._floor = self._versions.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        return stats
+
+class CompatibilityCache:
+    """LRU-кэш совместимости пар с TTL.
+
+    Оценка симметрична, поэтому ключ - неупорядоченная пара. Вместе с результатом
+    хранятся версии обоих профилей из ProfileCache: после правки анкеты версия
+    растет и старые записи с ней больше не совпадают.
+    """
+    def __init__(self, profile_cache: ProfileCache, max_size: int = 50000, ttl: float = 3600):
+        self.profile_cache = profile_cache
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (min_id, max_id) -> (versions, expires_at, result)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def _key(user1_id, user2_id):
+        return (user1_id, user2_id) if user1_id <= user2_id else (user2_id, user1_id)
+
+    @staticmethod
+    def _copy(result):
+        result = dict(result)
+        result['breakdown'] = dict(result.get('breakdown', {}))
+        return result
+
+    def versions(self, user1_id, user2_id):
+        """Версии профилей пары; берутся до чтения профилей из базы"""
+        key = self._key(user1_id, user2_id)
+        return (self.profile_cache.version(key[0]), self.profile_cache.version(key[1]))
+
+    def get(self, user1_id, user2_id):
+        key = self._key(user1_id, user2_id)
+        versions = self.versions(*key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            entry_versions, expires_at, result = entry
+            if expires_at < time.monotonic() or entry_versions != versions:
+                del self._entries[key]
+                self.stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+        return self._copy(result)
+
+    def put(self, user1_id, user2_id, result, versions):
+        """versions - результат versions() до чтения профилей"""
+        key = self._key(user1_id, user2_id)
+        result = self._copy(result)
+        with self._lock:
+            self._entries[key] = (versions, time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        """Сброс всех записей - после пересчета, меняющего баллы без правки анкет"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        return stats
+
+class SeenSet:
+    """Кого пользователь уже лайкнул и кого смотрел за последние сутки.
+
+    Лайки - множество id, просмотры - корзины по часам {час: {id}}; проверка
+    кандидата - не больше 26 поисков в множествах, старые корзины отбрасываются
+    целиком. Сериализуется в компактные массивы int64 для хранения в BLOB.
+    """
+    VIEW_WINDOW_HOURS = 24
+
+    def __init__(self, liked=(), view_buckets=None):
+        self.liked = set(liked)
+        self.view_buckets = view_buckets or {}
+
+    @staticmethod
+    def current_hour():
+        return int(time.time() // 3600)
+
+    def add_like(self, telegram_id):
+        self.liked.add(telegram_id)
+
+    def add_view(self, telegram_id, hour=None):
+        hour = self.current_hour() if hour is None else hour
+        self.view_buckets.setdefault(hour, set()).add(telegram_id)
+
+    def prune(self, hour=None):
+        oldest = (self.current_hour() if hour is None else hour) - self.VIEW_WINDOW_HOURS
+        for bucket in [bucket for bucket in self.view_buckets if bucket < oldest]:
+            del self.view_buckets[bucket]
+
+    def ids(self, hour=None):
+        """Все лайкнутые и просмотренные за окно id одним множеством"""
+        oldest = (self.current_hour() if hour is None else hour) - self.VIEW_WINDOW_HOURS
+        ids = set(self.liked)
+        for bucket, bucket_ids in self.view_buckets.items():
+            if bucket >= oldest:
+                ids |= bucket_ids
+        return ids
+
+    def contains(self, telegram_id, hour=None):
+        if telegram_id in self.liked:
+            return True
+        oldest = (self.current_hour() if hour is None else hour) - self.VIEW_WINDOW_HOURS
+        return any(telegram_id in ids for bucket, ids in self.view_buckets.items() if bucket >= oldest)
+
+    def to_blobs(self):
+        self.prune()
+        liked = array('q', sorted(self.liked))
+        views = array('q')
+        for bucket in sorted(self.view_buckets):
+            ids = self.view_buckets[bucket]
+            views.extend((bucket, len(ids)))
+            views.extend(sorted(ids))
+        return liked.tobytes(), views.tobytes()
+
+    @classmethod
+    def from_blobs(cls, liked_blob, views_blob):
+        liked = array('q')
+        liked.frombytes(liked_blob or b'')
+        views = array('q')
+        views.frombytes(views_blob or b'')
+
+        view_buckets = {}
+        position = 0
+        while position < len(views):
+            bucket, count = views[position], views[position + 1]
+            view_buckets[bucket] = set(views[position + 2:position + 2 + count])
+            position += 2 + count
+        return cls(liked, view_buckets)
+
+class SeenSetStore:
+    """Seen-set'ы пользователей в памяти с отложенным сохранением в seen_sets.
+
+    Набор загружается при первом обращении: из BLOB плюс лайки и просмотры,
+    записанные после его сохранения (на случай аварийной остановки), либо
+    целиком из likes/viewed_profiles. Измененные наборы сохраняются пачкой
+    по таймеру и при закрытии; лишние чистые наборы вытесняются по LRU.
+    """
+    def __init__(self, pool: ConnectionManager, flush_interval: float = 5, max_users: int = 50000):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_users = max_users
+
+        self._lock = threading.Lock()
+        self._sets = OrderedDict()
+        self._dirty = set()
+
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='db-seen-sets', daemon=True)
+        self._flusher.start()
+
+    def _load(self, user_id):
+        cursor = self.pool.reader().cursor()
+        cursor.execute("SELECT liked, views, updated_at FROM seen_sets WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+
+        if row:
+            seen = SeenSet.from_blobs(row['liked'], row['views'])
+            since = row['updated_at']
+        else:
+            seen = SeenSet()
+            since = '0000-00-00 00:00:00'
+
+        cursor.execute("""
+            SELECT to_user_id FROM likes WHERE from_user_id = ? AND created_at >= ?
+        """, (user_id, since))
+        for (telegram_id,) in cursor.fetchall():
+            seen.add_like(telegram_id)
+
+        cursor.execute("""
+            SELECT viewed_id, CAST(strftime('%s', created_at) AS INTEGER) / 3600 FROM viewed_profiles 
+            WHERE viewer_id = ? AND created_at >= ? AND created_at > datetime('now', '-24 hours')
+        """, (user_id, since))
+        for telegram_id, hour in cursor.fetchall():
+            seen.add_view(telegram_id, hour)
+        return seen
+
+    def get(self, user_id):
+        with self._lock:
+            seen = self._sets.get(user_id)
+            if seen is not None:
+                self._sets.move_to_end(user_id)
+                return seen
+
+        seen = self._load(user_id)
+        with self._lock:
+            # Пока грузили, набор мог появиться из параллельного запроса
+            seen = self._sets.setdefault(user_id, seen)
+            self._sets.move_to_end(user_id)
+            self._evict()
+        return seen
+
+    def _evict(self):
+        for user_id in list(self._sets):
+            if len(self._sets) <= self.max_users:
+                break
+            if user_id not in self._dirty:
+                del self._sets[user_id]
+
+    def filter_unseen(self, user_id, rows):
+        """Пропускает строки кандидатов, которых пользователь уже видел или лайкнул"""
+        seen = self.get(user_id)
+        hour = SeenSet.current_hour()
+        for row in rows:
+            with self._lock:
+                is_seen = seen.contains(row['telegram_id'], hour)
+            if not is_seen:
+                yield row
+
+    def seen_ids(self, user_id):
+        """Копия множества уже показанных пользователю анкет"""
+        seen = self.get(user_id)
+        with self._lock:
+            return seen.ids()
+
+    def add_like(self, user_id, telegram_id):
+        seen = self.get(user_id)
+        with self._lock:
+            seen.add_like(telegram_id)
+            self._dirty.add(user_id)
+
+    def add_view(self, user_id, telegram_id):
+        seen = self.get(user_id)
+        with self._lock:
+            seen.add_view(telegram_id)
+            self._dirty.add(user_id)
+
+    def flush(self):
+        """Сохраняет измененные наборы одной транзакцией"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [(user_id,) + self._sets[user_id].to_blobs() for user_id in dirty if user_id in self._sets]
+
+        if not rows:
+            return 0
+
+        try:
+            self.pool.executemany("""
+                INSERT INTO seen_sets (user_id, liked, views, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id) DO UPDATE SET 
+                    liked = excluded.liked, views = excluded.views, updated_at = excluded.updated_at
+            """, rows)
+        except Exception as e:
+            logger.error(f"Seen sets flush failed: {e}")
+            with self._lock:
+                self._dirty |= dirty
+            return 0
+        return len(rows)
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        self._flusher.join()
+        self.flush()
+
+class Database:
+    def __init__(self, db_path=None):
         self.base_dir = os.path.dirname(os.path.abspath(__file__))
         self.data_dir = os.path.join(self.base_dir, 'data')
         os.makedirs(self.data_dir, exist_ok=True)
@@ -375,192 +1026,279 @@ class Database:
         self.ai_moderator = AIContentModerator()
         self.location_system = AdvancedLocationSystem()
         
-        self.db_path = os.path.join(self.data_dir, 'tochkasvoda.db')
-        self.connection = None
+        self.db_path = db_path or config.DATABASE_PATH or os.path.join(self.data_dir, 'tochkasvoda.db')
+        self.pool = None
+        self.counters = None
+        self.seen_sets = None
+        self.blocklist = BlocklistIndex()
+        self.profile_cache = ProfileCache(max_size=config.PROFILE_CACHE_SIZE, ttl=config.CACHE_TTL)
+        self.candidate_index = CandidateIndex()
+        self.compatibility_cache = CompatibilityCache(self.profile_cache,
+                                                      max_size=config.COMPATIBILITY_CACHE_SIZE,
+                                                      ttl=config.COMPATIBILITY_CACHE_TTL)
+        self.bio_vectors = BioVectorStore()
+        self._bio_edits_lock = threading.Lock()
+        self._bio_edits = None  # анкеты, чьи описания менялись во время пересборки векторов
+        if config.BIO_SIMILARITY_ENABLED:
+            self.compatibility_system.bio_vectors = self.bio_vectors
         self.connect()
 
     def connect(self):
         try:
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.connection.row_factory = sqlite3.Row
+            self.pool = ConnectionManager(self.db_path, max_batch=config.DB_WRITE_BATCH_SIZE)
+            self.counters = CounterBuffer(self.pool, flush_interval=config.COUNTER_FLUSH_INTERVAL,
+                                          max_pending=config.COUNTER_MAX_PENDING,
+                                          on_trust_flushed=self._on_trust_flushed)
+            self.seen_sets = SeenSetStore(self.pool, flush_interval=config.COUNTER_FLUSH_INTERVAL,
+                                          max_users=config.SEEN_SETS_MAX_USERS)
+            self.location_system.load_gazetteer(
+                config.GAZETTEER_PATH or os.path.join(self.data_dir, 'gazetteer', 'cities.tsv')
+            )
             self.create_tables()
+            self.run_migrations()
             self.create_indexes()
-            logger.info(f"Connected to SQLite database: {self.db_path}")
+            self.fill_geo_cells()
+            self.load_blocklist()
+            self.load_candidate_index()
+            self.load_bio_vectors()
+            logger.info(f"Connected to SQLite database (WAL): {self.db_path}")
         except Exception as e:
             logger.error(f"Database connection error: {e}")
-            self.connection = None
+            self.pool = None
+
+    def close(self):
+        if self.counters:
+            self.counters.close()
+            self.counters = None
+        if self.seen_sets:
+            self.seen_sets.close()
+            self.seen_sets = None
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+            logger.info("Database connections closed")
 
     def create_tables(self):
         try:
-            cursor = self.connection.cursor()
+            def _write(connection):
+                cursor = connection.cursor()
             
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS blocked_users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER UNIQUE NOT NULL,
-                    user_id TEXT NOT NULL,
-                    blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    blocked_until TEXT,
-                    ban_type TEXT DEFAULT '7days',
-                    reason TEXT
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS blocked_users (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        telegram_id INTEGER UNIQUE NOT NULL,
+                        user_id TEXT NOT NULL,
+                        blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        blocked_until TEXT,
+                        ban_type TEXT DEFAULT '7days',
+                        reason TEXT
+                    )
+                """)
             
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_agreements (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER UNIQUE NOT NULL,
-                    accepted_terms BOOLEAN DEFAULT FALSE,
-                    accepted_privacy BOOLEAN DEFAULT FALSE,
-                    accepted_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_agreements (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER UNIQUE NOT NULL,
+                        accepted_terms BOOLEAN DEFAULT FALSE,
+                        accepted_privacy BOOLEAN DEFAULT FALSE,
+                        accepted_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
             
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER UNIQUE NOT NULL,
-                    user_id TEXT UNIQUE NOT NULL,
-                    username TEXT,
-                    first_name TEXT,
-                    last_name TEXT,
-                    name TEXT NOT NULL,
-                    age INTEGER NOT NULL,
-                    gender TEXT NOT NULL,
-                    target_gender TEXT NOT NULL,
-                    bio TEXT NOT NULL,
-                    interests TEXT DEFAULT '[]',
-                    zodiac TEXT,
-                    relationship_goal TEXT,
-                    lifestyle TEXT,
-                    habits TEXT,
-                    photos TEXT NOT NULL DEFAULT '[]',
-                    latitude REAL,
-                    longitude REAL,
-                    city TEXT,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    is_premium BOOLEAN DEFAULT FALSE,
-                    premium_until TEXT,
-                    subscription_channel TEXT,
-                    referral_code TEXT UNIQUE,
-                    referred_by INTEGER,
-                    likes_today INTEGER DEFAULT 0,
-                    super_likes_today INTEGER DEFAULT 0,
-                    last_like_reset TEXT DEFAULT CURRENT_TIMESTAMP,
-                    trust_score INTEGER DEFAULT 50,
-                    language TEXT DEFAULT 'ru',
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS users (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        telegram_id INTEGER UNIQUE NOT NULL,
+                        user_id TEXT UNIQUE NOT NULL,
+                        username TEXT,
+                        first_name TEXT,
+                        last_name TEXT,
+                        name TEXT NOT NULL,
+                        age INTEGER NOT NULL,
+                        gender TEXT NOT NULL,
+                        target_gender TEXT NOT NULL,
+                        bio TEXT NOT NULL,
+                        interests TEXT DEFAULT '[]',
+                        interests_mask INTEGER DEFAULT 0,
+                        interests_minhash BLOB,
+                        goal_code INTEGER DEFAULT 0,
+                        lifestyle_code INTEGER DEFAULT 0,
+                        habits_code INTEGER DEFAULT 0,
+                        zodiac_code INTEGER DEFAULT 0,
+                        personality_code INTEGER DEFAULT 0,
+                        zodiac TEXT,
+                        relationship_goal TEXT,
+                        lifestyle TEXT,
+                        habits TEXT,
+                        photos TEXT NOT NULL DEFAULT '[]',
+                        latitude REAL,
+                        longitude REAL,
+                        geo_cell INTEGER,
+                        city TEXT,
+                        is_active BOOLEAN DEFAULT TRUE,
+                        is_premium BOOLEAN DEFAULT FALSE,
+                        premium_until TEXT,
+                        subscription_channel TEXT,
+                        referral_code TEXT UNIQUE,
+                        referred_by INTEGER,
+                        likes_today INTEGER DEFAULT 0,
+                        super_likes_today INTEGER DEFAULT 0,
+                        last_like_reset TEXT DEFAULT CURRENT_TIMESTAMP,
+                        trust_score INTEGER DEFAULT 50,
+                        language TEXT DEFAULT 'ru',
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS viewed_profiles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    viewer_id INTEGER NOT NULL,
-                    viewed_id INTEGER NOT NULL,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(viewer_id, viewed_id)
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS viewed_profiles (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        viewer_id INTEGER NOT NULL,
+                        viewed_id INTEGER NOT NULL,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(viewer_id, viewed_id)
+                    )
+                """)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS likes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    from_user_id INTEGER NOT NULL,
-                    to_user_id INTEGER NOT NULL,
-                    is_super_like BOOLEAN DEFAULT FALSE,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(from_user_id, to_user_id)
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS likes (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        from_user_id INTEGER NOT NULL,
+                        to_user_id INTEGER NOT NULL,
+                        is_super_like BOOLEAN DEFAULT FALSE,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(from_user_id, to_user_id)
+                    )
+                """)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS matches (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user1_id INTEGER NOT NULL,
-                    user2_id INTEGER NOT NULL,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user1_id, user2_id)
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS matches (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user1_id INTEGER NOT NULL,
+                        user2_id INTEGER NOT NULL,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(user1_id, user2_id)
+                    )
+                """)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS like_notifications (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    from_user_id INTEGER NOT NULL,
-                    to_user_id INTEGER NOT NULL,
-                    is_mutual BOOLEAN DEFAULT FALSE,
-                    is_super_like BOOLEAN DEFAULT FALSE,
-                    is_sent BOOLEAN DEFAULT FALSE,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS like_notifications (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        from_user_id INTEGER NOT NULL,
+                        to_user_id INTEGER NOT NULL,
+                        is_mutual BOOLEAN DEFAULT FALSE,
+                        is_super_like BOOLEAN DEFAULT FALSE,
+                        is_sent BOOLEAN DEFAULT FALSE,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    from_user_id INTEGER NOT NULL,
-                    to_user_id INTEGER NOT NULL,
-                    message_text TEXT NOT NULL,
-                    is_read BOOLEAN DEFAULT FALSE,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS messages (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        from_user_id INTEGER NOT NULL,
+                        to_user_id INTEGER NOT NULL,
+                        message_text TEXT NOT NULL,
+                        is_read BOOLEAN DEFAULT FALSE,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS reports (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    from_user_id INTEGER NOT NULL,
-                    reported_user_id INTEGER NOT NULL,
-                    reported_user_user_id TEXT NOT NULL,
-                    reason TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    admin_action TEXT,
-                    admin_id INTEGER,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS reports (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        from_user_id INTEGER NOT NULL,
+                        reported_user_id INTEGER NOT NULL,
+                        reported_user_user_id TEXT NOT NULL,
+                        reason TEXT NOT NULL,
+                        status TEXT DEFAULT 'pending',
+                        admin_action TEXT,
+                        admin_id INTEGER,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS referrals (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    referrer_id INTEGER NOT NULL,
-                    referred_id INTEGER NOT NULL,
-                    bonus_applied BOOLEAN DEFAULT FALSE,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(referred_id)
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS referrals (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        referrer_id INTEGER NOT NULL,
+                        referred_id INTEGER NOT NULL,
+                        bonus_applied BOOLEAN DEFAULT FALSE,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(referred_id)
+                    )
+                """)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS profile_views (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    viewer_id INTEGER NOT NULL,
-                    viewed_id INTEGER NOT NULL,
-                    view_count INTEGER DEFAULT 1,
-                    last_viewed TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(viewer_id, viewed_id)
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS profile_views (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        viewer_id INTEGER NOT NULL,
+                        viewed_id INTEGER NOT NULL,
+                        view_count INTEGER DEFAULT 1,
+                        last_viewed TEXT DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(viewer_id, viewed_id)
+                    )
+                """)
+
+                # TF-IDF описаний: словарь и разреженный вектор анкеты (bio_vectors.py)
+                cursor.execute(self.BIO_VOCABULARY_SCHEMA.format(table='bio_vocabulary'))
+                cursor.execute(self.BIO_VECTORS_SCHEMA.format(table='bio_vectors'))
+
+                # Похожие анкеты по лайкам, пересчитываются ночью (like_neighbours.py)
+                cursor.execute(self.LIKE_NEIGHBOURS_SCHEMA.format(table='like_neighbours'))
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS daily_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    date TEXT NOT NULL,
-                    likes_given INTEGER DEFAULT 0,
-                    likes_received INTEGER DEFAULT 0,
-                    views_given INTEGER DEFAULT 0,
-                    views_received INTEGER DEFAULT 0,
-                    UNIQUE(user_id, date)
-                )
-            """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS seen_sets (
+                        user_id INTEGER PRIMARY KEY,
+                        liked BLOB,
+                        views BLOB,
+                        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+
+                # Очередь ленты: ранжированные кандидаты, голова - текущая анкета;
+                # source - откуда кандидат: search или recommendation
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS feed_queue (
+                        user_id INTEGER NOT NULL,
+                        candidate_id INTEGER NOT NULL,
+                        position INTEGER NOT NULL,
+                        source TEXT NOT NULL DEFAULT 'search',
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, candidate_id)
+                    )
+                """)
+
+                # Ежедневные рекомендации, считаются ночной пакетной задачей
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS recommendations (
+                        user_id INTEGER NOT NULL,
+                        candidate_id INTEGER NOT NULL,
+                        score INTEGER NOT NULL,
+                        rank INTEGER NOT NULL,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, candidate_id)
+                    )
+                """)
 
-            # Таблицы для рулетки и свиданий вслепую УДАЛЕНЫ
-            
-            self.connection.commit()
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS daily_stats (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER NOT NULL,
+                        date TEXT NOT NULL,
+                        likes_given INTEGER DEFAULT 0,
+                        likes_received INTEGER DEFAULT 0,
+                        views_given INTEGER DEFAULT 0,
+                        views_received INTEGER DEFAULT 0,
+                        UNIQUE(user_id, date)
+                    )
+                """)
+
+                # Таблицы для рулетки и свиданий вслепую УДАЛЕНЫ
+
+            self.pool.write(_write)
             logger.info("All tables created/verified successfully")
         except Exception as e:
             logger.error(f"Error creating tables: {e}")
@@ -568,36 +1306,170 @@ class Database:
     def create_indexes(self):
         """Создание индексов для оптимизации запросов"""
         try:
-            cursor = self.connection.cursor()
-            
-            indexes = [
-                "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
-                "CREATE INDEX IF NOT EXISTS idx_users_city ON users(city)",
-                "CREATE INDEX IF NOT EXISTS idx_users_is_active ON users(is_active)",
-                "CREATE INDEX IF NOT EXISTS idx_users_gender ON users(gender)",
-                "CREATE INDEX IF NOT EXISTS idx_users_target_gender ON users(target_gender)",
-                "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)",
-                "CREATE INDEX IF NOT EXISTS idx_likes_from_user ON likes(from_user_id)",
-                "CREATE INDEX IF NOT EXISTS idx_likes_to_user ON likes(to_user_id)",
-                "CREATE INDEX IF NOT EXISTS idx_viewed_profiles_viewer ON viewed_profiles(viewer_id)",
-                "CREATE INDEX IF NOT EXISTS idx_viewed_profiles_viewed ON viewed_profiles(viewed_id)",
-                "CREATE INDEX IF NOT EXISTS idx_matches_user1 ON matches(user1_id)",
-                "CREATE INDEX IF NOT EXISTS idx_matches_user2 ON matches(user2_id)",
-                "CREATE INDEX IF NOT EXISTS idx_users_premium ON users(is_premium)",
-                "CREATE INDEX IF NOT EXISTS idx_users_trust_score ON users(trust_score)"
-            ]
-            
-            for index_sql in indexes:
-                cursor.execute(index_sql)
-            
-            self.connection.commit()
+            def _write(connection):
+                cursor = connection.cursor()
+            
+                indexes = [
+                    "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_users_city ON users(city)",
+                    "CREATE INDEX IF NOT EXISTS idx_users_geo_cell ON users(geo_cell)",
+                    "CREATE INDEX IF NOT EXISTS idx_users_is_active ON users(is_active)",
+                    "CREATE INDEX IF NOT EXISTS idx_users_gender ON users(gender)",
+                    "CREATE INDEX IF NOT EXISTS idx_users_target_gender ON users(target_gender)",
+                    "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)",
+                    "CREATE INDEX IF NOT EXISTS idx_likes_from_user ON likes(from_user_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_likes_to_user ON likes(to_user_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_viewed_profiles_viewer ON viewed_profiles(viewer_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_viewed_profiles_viewed ON viewed_profiles(viewed_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_matches_user1 ON matches(user1_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_matches_user2 ON matches(user2_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_users_premium ON users(is_premium)",
+                    "CREATE INDEX IF NOT EXISTS idx_users_trust_score ON users(trust_score)",
+                    # Диапазоны по времени (timestamp хранится как 'YYYY-MM-DD HH:MM:SS' UTC)
+                    "CREATE INDEX IF NOT EXISTS idx_viewed_profiles_viewer_time ON viewed_profiles(viewer_id, created_at)",
+                    "CREATE INDEX IF NOT EXISTS idx_viewed_profiles_created_at ON viewed_profiles(created_at)",
+                    "CREATE INDEX IF NOT EXISTS idx_profile_views_viewed_time ON profile_views(viewed_id, last_viewed)",
+                    "CREATE INDEX IF NOT EXISTS idx_likes_created_at ON likes(created_at)",
+                    "CREATE INDEX IF NOT EXISTS idx_matches_created_at ON matches(created_at)",
+                    "CREATE INDEX IF NOT EXISTS idx_feed_queue_position ON feed_queue(user_id, position)",
+                    "CREATE INDEX IF NOT EXISTS idx_recommendations_created_at ON recommendations(created_at)"
+                ]
+            
+                for index_sql in indexes:
+                    cursor.execute(index_sql)
+
+            self.pool.write(_write)
             logger.info("Database indexes created successfully")
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
 
+    # Столбцы, которые заполняются CURRENT_TIMESTAMP и участвуют в сравнениях строк
+    TIMESTAMP_COLUMNS = [
+        ('users', 'created_at'), ('users', 'updated_at'), ('users', 'last_like_reset'),
+        ('viewed_profiles', 'created_at'), ('likes', 'created_at'), ('matches', 'created_at'),
+        ('like_notifications', 'created_at'), ('messages', 'created_at'), ('reports', 'created_at'),
+        ('referrals', 'created_at'), ('profile_views', 'last_viewed'), ('blocked_users', 'blocked_at'),
+        ('user_agreements', 'accepted_at'), ('user_agreements', 'created_at')
+    ]
+
+    def _migrate_normalize_timestamps(self, connection):
+        """Приводит время к виду CURRENT_TIMESTAMP, чтобы сравнение строк совпадало с хронологией"""
+        for table, column in self.TIMESTAMP_COLUMNS:
+            cursor = connection.execute(f"""
+                UPDATE {table} SET {column} = datetime({column})
+                WHERE {column} IS NOT NULL AND datetime({column}) IS NOT NULL AND {column} != datetime({column})
+            """)
+            if cursor.rowcount:
+                logger.info(f"Normalized {cursor.rowcount} timestamps in {table}.{column}")
+
+    def _ensure_column(self, connection, table, column, definition):
+        columns = [row['name'] for row in connection.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _migrate_interests_mask(self, connection):
+        """Маска интересов для существующих анкет, интересы в JSON - без эмодзи"""
+        self._ensure_column(connection, 'users', 'interests_mask', 'INTEGER DEFAULT 0')
+
+        rows = []
+        for row in connection.execute("SELECT telegram_id, interests FROM users"):
+            try:
+                interests = [normalize_interest(interest) for interest in json.loads(row['interests'] or '[]')]
+            except (ValueError, TypeError):
+                interests = []
+            rows.append((json.dumps(interests), encode_interests(interests), row['telegram_id']))
+
+        connection.executemany("UPDATE users SET interests = ?, interests_mask = ? WHERE telegram_id = ?", rows)
+        logger.info(f"Interests mask filled for {len(rows)} users")
+
+    def _migrate_feature_codes(self, connection):
+        """Коды признаков совместимости для существующих анкет"""
+        for column in FEATURE_COLUMNS:
+            self._ensure_column(connection, 'users', column, 'INTEGER DEFAULT 0')
+
+        rows = []
+        for row in connection.execute("SELECT * FROM users"):
+            user = self._process_user_row(row)
+            features = profile_features(user)
+            rows.append(tuple(features[column] for column in FEATURE_COLUMNS) + (row['telegram_id'],))
+
+        assignments = ', '.join(f"{column} = ?" for column in FEATURE_COLUMNS)
+        connection.executemany(f"UPDATE users SET {assignments} WHERE telegram_id = ?", rows)
+        logger.info(f"Feature codes filled for {len(rows)} users")
+
+    def _migrate_geo_cells(self, connection):
+        """Ячейка сетки geo_index по координатам анкеты или центру ее города"""
+        self._ensure_column(connection, 'users', 'geo_cell', 'INTEGER')
+
+        rows = [
+            (self.location_system.geo_cell(dict(row)), row['telegram_id'])
+            for row in connection.execute("SELECT telegram_id, latitude, longitude, city FROM users")
+        ]
+        connection.executemany("UPDATE users SET geo_cell = ? WHERE telegram_id = ?", rows)
+        logger.info(f"Geo cells filled for {len(rows)} users")
+
+    def _migrate_interests_minhash(self, connection):
+        """Подписи MinHash интересов для существующих анкет"""
+        self._ensure_column(connection, 'users', 'interests_minhash', 'BLOB')
+
+        rows = [
+            (minhash_signature(row['interests_mask'] or 0), row['telegram_id'])
+            for row in connection.execute("SELECT telegram_id, interests_mask FROM users")
+        ]
+        connection.executemany("UPDATE users SET interests_minhash = ? WHERE telegram_id = ?", rows)
+        logger.info(f"Interests MinHash filled for {len(rows)} users")
+
+    def _migrate_feed_queue_source(self, connection):
+        """Источник кандидата в очереди ленты: ночные рекомендации заменяются отдельно от поиска"""
+        self._ensure_column(connection, 'feed_queue', 'source', "TEXT NOT NULL DEFAULT 'search'")
+
+    def fill_geo_cells(self):
+        """Ячейки для анкет, чей город появился в справочнике после их сохранения"""
+        try:
+            def _write(connection):
+                rows = []
+                for row in connection.execute("SELECT telegram_id, latitude, longitude, city FROM users WHERE geo_cell IS NULL"):
+                    geo_cell = self.location_system.geo_cell(dict(row))
+                    if geo_cell is not None:
+                        rows.append((geo_cell, row['telegram_id']))
+                connection.executemany("UPDATE users SET geo_cell = ? WHERE telegram_id = ?", rows)
+                return len(rows)
+
+            filled = self.pool.write(_write)
+            if filled:
+                logger.info(f"Geo cells filled for {filled} users")
+        except Exception as e:
+            logger.error(f"Error filling geo cells: {e}")
+
+    def migrations(self):
+        """Миграции по порядку; новые добавляются только в конец"""
+        return [
+            self._migrate_normalize_timestamps,
+            self._migrate_interests_mask,
+            self._migrate_feature_codes,
+            self._migrate_geo_cells,
+            self._migrate_interests_minhash,
+            self._migrate_feed_queue_source
+        ]
+
+    def run_migrations(self):
+        """Одноразовые миграции данных, номер последней примененной - в PRAGMA user_version"""
+        migrations = self.migrations()
+        try:
+            def _write(connection):
+                version = connection.execute("PRAGMA user_version").fetchone()[0]
+                for number, migration in enumerate(migrations[version:], start=version + 1):
+                    migration(connection)
+                    connection.execute(f"PRAGMA user_version = {number}")
+                    logger.info(f"Migration {number} applied: {migration.__name__}")
+
+            self.pool.write(_write)
+        except Exception as e:
+            logger.error(f"Error running migrations: {e}")
+
     def generate_user_id(self):
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             while True:
                 user_id = ''.join(random.choices(string.digits, k=8))
                 cursor.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
@@ -609,7 +1481,7 @@ class Database:
 
     def get_user_by_user_id(self, user_id):
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
             row = cursor.fetchone()
             if row:
@@ -637,133 +1509,491 @@ class Database:
                 user_dict['interests'] = []
         else:
             user_dict['interests'] = []
+
+        if self.counters and 'trust_score' in user_dict and user_dict.get('telegram_id') is not None:
+            user_dict['trust_score'] = (user_dict['trust_score'] or 0) + self.counters.pending_trust(user_dict['telegram_id'])
             
         return user_dict
 
+    def load_blocklist(self):
+        try:
+            cursor = self.pool.reader().cursor()
+            cursor.execute("SELECT telegram_id, blocked_until FROM blocked_users")
+            self.blocklist.load(cursor.fetchall())
+            logger.info(f"Blocklist loaded: {len(self.blocklist)} users")
+        except Exception as e:
+            logger.error(f"Error loading blocklist: {e}")
+
     def is_user_blocked(self, telegram_id):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT blocked_until, ban_type FROM blocked_users WHERE telegram_id = ?", (telegram_id,))
-            result = cursor.fetchone()
-            
-            if result:
-                blocked_until = result['blocked_until']
-                if blocked_until:
-                    if datetime.fromisoformat(blocked_until) > datetime.now():
-                        return True
-                    else:
-                        self.unblock_user(telegram_id)
-                        return False
-                else:
-                    return True
-            return False
+            for expired_id in self.blocklist.pop_expired():
+                self.unblock_user(expired_id)
+            return self.blocklist.is_blocked(telegram_id)
         except Exception as e:
             logger.error(f"Error checking if user is blocked: {e}")
             return False
 
     def calculate_compatibility(self, user1_id, user2_id):
         try:
-            user1 = self.get_user(user1_id)
-            user2 = self.get_user(user2_id)
+            cached = self.compatibility_cache.get(user1_id, user2_id)
+            if cached is not None:
+                return cached
+
+            versions = self.compatibility_cache.versions(user1_id, user2_id)
+            users = self.get_users_many([user1_id, user2_id])
+            user1 = users.get(user1_id)
+            user2 = users.get(user2_id)
             
             if not user1 or not user2:
                 return self.compatibility_system._get_default_compatibility()
                 
-            return self.compatibility_system.calculate_advanced_compatibility(user1, user2)
+            result = self.compatibility_system.calculate_advanced_compatibility(user1, user2)
+            self.compatibility_cache.put(user1_id, user2_id, result, versions)
+            return result
             
         except Exception as e:
             logger.error(f"Error calculating compatibility: {e}")
             return self.compatibility_system._get_default_compatibility()
 
+    def calculate_compatibility_many(self, user_id, other_ids):
+        """Совместимость пользователя со списком анкет за один запрос профилей"""
+        try:
+            results = {}
+            missing = []
+            for other_id in other_ids:
+                cached = self.compatibility_cache.get(user_id, other_id)
+                if cached is not None:
+                    results[other_id] = cached
+                else:
+                    missing.append(other_id)
+            if not missing:
+                return results
+
+            versions = {other_id: self.compatibility_cache.versions(user_id, other_id) for other_id in missing}
+            users = self.get_users_many([user_id] + missing)
+            user = users.get(user_id)
+
+            for other_id in missing:
+                other = users.get(other_id)
+                if not user or not other:
+                    results[other_id] = self.compatibility_system._get_default_compatibility()
+                else:
+                    result = self.compatibility_system.calculate_advanced_compatibility(user, other)
+                    self.compatibility_cache.put(user_id, other_id, result, versions[other_id])
+                    results[other_id] = result
+            return results
+
+        except Exception as e:
+            logger.error(f"Error calculating compatibility batch: {e}")
+            return {other_id: self.compatibility_system._get_default_compatibility() for other_id in other_ids}
+
     def get_users_for_swipe(self, user_id, limit=50, radius_km=50):
-        """Упрощенный поиск пользователей БЕЗ кэширования"""
+        """Лента анкет: кандидаты из индекса, ранжированные по совместимости"""
+        telegram_ids = self.get_swipe_candidate_ids(user_id, limit=limit, radius_km=radius_km)
+        users = self.get_users_many(telegram_ids)
+        return [users[telegram_id] for telegram_id in telegram_ids if telegram_id in users]
+
+    def get_swipe_candidate_ids(self, user_id, limit=50, radius_km=50):
+        """telegram_id анкет ленты в порядке выдачи, без загрузки профилей"""
         try:
-            if not self.connection:
+            if not self.pool:
                 self.connect()
-                
-            self.cleanup_old_views()
             
             current_user = self.get_user(user_id)
             if not current_user:
                 return []
-            
-            # Получаем пользователей через традиционный поиск
-            users_to_show = self._get_traditional_search_results(user_id, current_user, radius_km, limit)
-            
-            return users_to_show[:limit]
+
+            if config.AI_MATCHING_ENABLED:
+                candidates = self._search_candidates(user_id, current_user, radius_km, shortlist=limit)
+                if config.BIO_SIMILARITY_ENABLED:
+                    candidates['bio_similarity'] = self.bio_vectors.similarity_many(user_id, candidates['telegram_id'])
+                boost = self.like_boost(user_id, candidates['telegram_id']) if config.LIKE_NEIGHBOURS_ENABLED else None
+                order, scores = rank_arrays(
+                    current_user, candidates, self.compatibility_system.weights,
+                    top_k=limit, min_score=config.MIN_COMPATIBILITY_SCORE, boost=boost
+                )
+                telegram_ids = candidates['telegram_id'][order].tolist()
+            else:
+                candidates = self._search_candidates(user_id, current_user, radius_km)
+                telegram_ids = candidates['telegram_id'][:limit].tolist()
+            return telegram_ids
             
         except Exception as e:
-            logger.error(f"Error getting users for swipe: {e}")
+            logger.error(f"Error getting swipe candidates: {e}")
             return []
 
-    def _get_traditional_search_results(self, user_id, current_user, radius_km, limit):
-        """Традиционный поиск по местоположению"""
+    def _search_candidates(self, user_id, current_user, radius_km, shortlist=None):
+        """Столбцы подходящих анкет из индекса: радиус, пол, возраст; без просмотренных и лайкнутых.
+
+        shortlist - сколько анкет останется после ранжирования; с ним в больших
+        разделах берутся только похожие по интересам (MinHash/LSH), а не все подряд.
+        """
+        user_city = current_user.get('city', 'Томск')
+        center = self.location_system.coordinates({
+            'latitude': current_user.get('latitude'), 'longitude': current_user.get('longitude'), 'city': user_city
+        })
+        # Ячейки сетки вокруг точки и точное расстояние, плюс раздел своего города -
+        # там анкеты без координат
+        places = (covering_cells(center[0], center[1], radius_km) if center else []) + [user_city]
+
+        age = current_user.get('age')
+        min_age, max_age = (age - config.AGE_RANGE, age + config.AGE_RANGE) if age else (0, 200)
+
+        exclude = self.seen_sets.seen_ids(user_id)
+        exclude.add(user_id)
+        keys = swipe_partitions(current_user, places)
+
+        interests_mask = current_user.get('interests_mask')
+        if (shortlist and config.INTEREST_LSH_ENABLED and interests_mask
+                and self.candidate_index.count(keys) > config.INTEREST_LSH_MIN_CANDIDATES):
+            candidates = self.candidate_index.similar(
+                minhash_signature(interests_mask), keys, min_age, max_age, exclude,
+                center=center, radius_km=radius_km, limit=config.INTEREST_LSH_SHORTLIST
+            )
+            # Похожих не хватило на выдачу - полный перебор
+            if len(candidates['telegram_id']) >= shortlist:
+                return candidates
+
+        return self.candidate_index.candidates(keys, min_age, max_age, exclude, center=center, radius_km=radius_km)
+
+    def _index_row(self, row):
+        """Строка INDEX_SELECT с координатами центра города для анкет без своих"""
+        row = dict(row)
+        coordinates = self.location_system.coordinates(row)
+        if coordinates:
+            row['latitude'], row['longitude'] = coordinates
+        return row
+
+    def load_candidate_index(self):
         try:
-            user_city = current_user.get('city', 'Томск')
-            nearby_cities = self.location_system.get_nearby_cities(user_city, radius_km)
-            search_cities = [user_city] + nearby_cities
-            
-            cursor = self.connection.cursor()
-            
-            placeholders = ','.join('?' * len(search_cities))
-            query = f"""
-                SELECT u.* FROM users u
-                WHERE u.telegram_id != ? 
-                AND u.is_active = 1
-                AND u.city IN ({placeholders})
-                AND u.telegram_id NOT IN (
-                    SELECT viewed_id FROM viewed_profiles 
-                    WHERE viewer_id = ? 
-                    AND datetime(created_at) > datetime('now', '-24 hours')
-                )
-                AND u.telegram_id NOT IN (
-                    SELECT to_user_id FROM likes 
-                    WHERE from_user_id = ? 
+            cursor = self.pool.reader().cursor()
+            cursor.execute(INDEX_SELECT + " WHERE is_active = 1")
+            started = time.monotonic()
+            self.candidate_index.load(self._index_row(row) for row in cursor)
+            stats = self.candidate_index.get_stats()
+            logger.info(f"Candidate index loaded: {stats['users']} users in {stats['partitions']} partitions, "
+                        f"{stats['array_bytes'] / 1024 / 1024:.1f} MB arrays, {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"Error loading candidate index: {e}")
+
+    def _refresh_candidates(self, *telegram_ids):
+        """Перечитывает анкеты в индекс кандидатов после изменения строк users"""
+        try:
+            for start in range(0, len(telegram_ids), self.IN_CHUNK_SIZE):
+                chunk = telegram_ids[start:start + self.IN_CHUNK_SIZE]
+                cursor = self.pool.reader().execute(
+                    INDEX_SELECT + f" WHERE telegram_id IN ({','.join('?' * len(chunk))})", chunk
                 )
-                ORDER BY u.trust_score DESC, u.created_at DESC
-                LIMIT ?
-            """
-            
-            params = [user_id] + search_cities + [user_id, user_id, limit]
-            cursor.execute(query, params)
-            
-            rows = cursor.fetchall()
-            users = []
-            for row in rows:
-                users.append(self._process_user_row(row))
-            
-            return users
+                found = set()
+                for row in cursor:
+                    found.add(row['telegram_id'])
+                    self.candidate_index.upsert(self._index_row(row))
+                for telegram_id in set(chunk) - found:
+                    self.candidate_index.remove(telegram_id)
         except Exception as e:
-            logger.error(f"Error in traditional search: {e}")
-            return []
+            logger.error(f"Error refreshing candidate index: {e}")
+
+    LIKE_NEIGHBOURS_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id INTEGER NOT NULL,
+            neighbour_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            co_likes INTEGER NOT NULL,
+            PRIMARY KEY (user_id, neighbour_id)
+        ) WITHOUT ROWID
+    """
+    LIKE_NEIGHBOURS_WRITE_BATCH = 50000
+
+    BIO_VOCABULARY_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            term_id INTEGER PRIMARY KEY,
+            term TEXT NOT NULL UNIQUE
+        )
+    """
+    BIO_VECTORS_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id INTEGER PRIMARY KEY,
+            terms BLOB NOT NULL,
+            weights BLOB NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+    BIO_VECTORS_WRITE_BATCH = 5000
+
+    def rebuild_like_neighbours(self):
+        """Пересчет похожих анкет по всем лайкам (ночная задача).
+
+        Новая таблица заполняется порциями и одной записью подменяет старую:
+        лента не видит ее наполовину заполненной, а поток записи не занят надолго.
+        """
+        try:
+            started = time.monotonic()
+            cursor = self.pool.reader().cursor()
+            cursor.row_factory = None
+            cursor.execute("SELECT from_user_id, to_user_id FROM likes ORDER BY id")
+            likes = read_likes(cursor)
+            loaded = time.monotonic()
+
+            neighbours = item_neighbours(
+                likes[:, 0], likes[:, 1], top_k=config.LIKE_NEIGHBOURS_TOP_K,
+                min_co_likes=config.LIKE_NEIGHBOURS_MIN_CO_LIKES,
+                max_likes_per_user=config.LIKE_NEIGHBOURS_MAX_LIKES_PER_USER
+            )
+            computed = time.monotonic()
+
+            def _create(connection):
+                connection.execute("DROP TABLE IF EXISTS like_neighbours_next")
+                connection.execute(self.LIKE_NEIGHBOURS_SCHEMA.format(table='like_neighbours_next'))
+
+            def _swap(connection):
+                connection.execute("DROP TABLE IF EXISTS like_neighbours")
+                connection.execute("ALTER TABLE like_neighbours_next RENAME TO like_neighbours")
+
+            self.pool.write(_create)
+            total = len(neighbours['user_id'])
+            for start in range(0, total, self.LIKE_NEIGHBOURS_WRITE_BATCH):
+                chunk = slice(start, start + self.LIKE_NEIGHBOURS_WRITE_BATCH)
+                rows = list(zip(neighbours['user_id'][chunk].tolist(), neighbours['neighbour_id'][chunk].tolist(),
+                                neighbours['score'][chunk].tolist(), neighbours['co_likes'][chunk].tolist()))
+                self.pool.write(lambda connection, rows=rows: connection.executemany(
+                    "INSERT INTO like_neighbours_next (user_id, neighbour_id, score, co_likes) VALUES (?, ?, ?, ?)", rows
+                ))
+            self.pool.write(_swap)
+
+            stats = {
+                'likes': len(likes),
+                'users': len(set(neighbours['user_id'].tolist())),
+                'rows': total,
+                'load_seconds': round(loaded - started, 2),
+                'compute_seconds': round(computed - loaded, 2),
+                'seconds': round(time.monotonic() - started, 2),
+                'peak_rss_mb': peak_rss_mb()
+            }
+            logger.info(f"Like neighbours rebuilt: {stats['likes']} likes -> {stats['rows']} rows for {stats['users']} users "
+                        f"in {stats['seconds']}s (load {stats['load_seconds']}s, compute {stats['compute_seconds']}s), "
+                        f"peak RSS {stats['peak_rss_mb']} MB")
+            return stats
+        except Exception as e:
+            logger.error(f"Error rebuilding like neighbours: {e}")
+            return None
+
+    def like_boost(self, user_id, telegram_ids):
+        """Добавка к порядку ленты за сходство анкет с недавно лайкнутыми; None - сходства нет"""
+        try:
+            rows = self.pool.reader().execute("""
+                SELECT n.neighbour_id, SUM(n.score)
+                FROM (SELECT to_user_id FROM likes WHERE from_user_id = ? ORDER BY id DESC LIMIT ?) AS l
+                JOIN like_neighbours n ON n.user_id = l.to_user_id
+                GROUP BY n.neighbour_id
+            """, (user_id, config.LIKE_NEIGHBOURS_RECENT_LIKES)).fetchall()
+            if not rows:
+                return None
+            return affinity_boost([row[0] for row in rows], [row[1] for row in rows],
+                                  telegram_ids, config.LIKE_NEIGHBOURS_BONUS)
+        except Exception as e:
+            logger.error(f"Error getting like boost: {e}")
+            return None
+
+    def load_bio_vectors(self):
+        try:
+            connection = self.pool.reader()
+            vocabulary = connection.execute("SELECT term_id, term FROM bio_vocabulary").fetchall()
+            vectors = connection.execute("SELECT user_id, terms, weights FROM bio_vectors").fetchall()
+            if not vectors:
+                # Первый запуск: векторов еще нет
+                self.rebuild_bio_vectors()
+                return
+            self.bio_vectors.load(vocabulary, vectors)
+            stats = self.bio_vectors.get_stats()
+            logger.info(f"Bio vectors loaded: {stats['documents']} users, {stats['terms']} terms")
+        except Exception as e:
+            logger.error(f"Error loading bio vectors: {e}")
+
+    def rebuild_bio_vectors(self):
+        """Пересчет словаря, idf и векторов всех описаний (ночная задача).
+
+        Расчет идет вне потока записи в отдельном хранилище, результат пишется
+        порциями в таблицы *_next и одной записью подменяет старые; хранилище в
+        памяти подменяется только после этого. Описания, измененные за время
+        пересборки, затем пересчитываются заново с новыми idf.
+        """
+        try:
+            started = time.monotonic()
+            with self._bio_edits_lock:
+                if self._bio_edits is not None:
+                    logger.warning("Bio vectors rebuild already running")
+                    return None
+                self._bio_edits = set()
+
+            try:
+                cursor = self.pool.reader().cursor()
+                cursor.row_factory = None
+                cursor.execute("SELECT telegram_id, bio FROM users WHERE bio IS NOT NULL AND bio != ''")
+                rebuilt = BioVectorStore()
+                vocabulary = rebuilt.rebuild(cursor)
+                vectors = rebuilt.items()
+
+                def _create(connection):
+                    for table, schema in (('bio_vocabulary_next', self.BIO_VOCABULARY_SCHEMA),
+                                          ('bio_vectors_next', self.BIO_VECTORS_SCHEMA)):
+                        connection.execute(f"DROP TABLE IF EXISTS {table}")
+                        connection.execute(schema.format(table=table))
+
+                def _swap(connection):
+                    for table in ('bio_vocabulary', 'bio_vectors'):
+                        connection.execute(f"DROP TABLE IF EXISTS {table}")
+                        connection.execute(f"ALTER TABLE {table}_next RENAME TO {table}")
+
+                self.pool.write(_create)
+                for start in range(0, len(vocabulary), self.BIO_VECTORS_WRITE_BATCH):
+                    rows = vocabulary[start:start + self.BIO_VECTORS_WRITE_BATCH]
+                    self.pool.write(lambda connection, rows=rows: connection.executemany(
+                        "INSERT INTO bio_vocabulary_next (term_id, term) VALUES (?, ?)", rows
+                    ))
+                for start in range(0, len(vectors), self.BIO_VECTORS_WRITE_BATCH):
+                    rows = vectors[start:start + self.BIO_VECTORS_WRITE_BATCH]
+                    self.pool.write(lambda connection, rows=rows: self._store_bio_vectors(
+                        connection.cursor(), rows, table='bio_vectors_next'
+                    ))
+                self.pool.write(_swap)
+                self.bio_vectors.replace(rebuilt)
+            finally:
+                with self._bio_edits_lock:
+                    edited, self._bio_edits = self._bio_edits, None
+
+            def _rewrite(connection, telegram_ids):
+                cursor = connection.cursor()
+                for telegram_id in telegram_ids:
+                    row = cursor.execute("SELECT bio FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+                    self._write_bio_vector(cursor, telegram_id, row[0] if row else '')
+
+            edited = list(edited)
+            for start in range(0, len(edited), self.BIO_VECTORS_WRITE_BATCH):
+                chunk = edited[start:start + self.BIO_VECTORS_WRITE_BATCH]
+                self.pool.write(lambda connection, chunk=chunk: _rewrite(connection, chunk))
+
+            # Баллы личности изменились у всех пар
+            self.compatibility_cache.clear()
+            stats = self.bio_vectors.get_stats()
+            stats['edited'] = len(edited)
+            logger.info(f"Bio vectors rebuilt: {stats['documents']} users, {stats['terms']} terms, "
+                        f"{stats['nonzeros']} nonzeros, {stats['edited']} edited meanwhile "
+                        f"in {time.monotonic() - started:.2f}s")
+            return stats
+        except Exception as e:
+            logger.error(f"Error rebuilding bio vectors: {e}")
+            return None
+
+    def _store_bio_vectors(self, cursor, vectors, table='bio_vectors'):
+        """Сохранение векторов [(telegram_id, (номера слов, веса) или None)]; None - вектора нет"""
+        cursor.executemany(f"DELETE FROM {table} WHERE user_id = ?",
+                           [(telegram_id,) for telegram_id, vector in vectors if vector is None])
+        cursor.executemany(f"""
+            INSERT OR REPLACE INTO {table} (user_id, terms, weights, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, [(telegram_id, vector[0].tobytes(), vector[1].tobytes())
+              for telegram_id, vector in vectors if vector is not None])
+
+    def _write_bio_vector(self, cursor, telegram_id, bio):
+        """Вектор одного описания с текущими idf; вызывается внутри транзакции записи анкеты.
+
+        Хранилище в памяти меняется только после фиксации: откат записи его не затрагивает.
+        """
+        with self._bio_edits_lock:
+            # Во время пересборки вектор считается по старому словарю - пересчитается после нее
+            if self._bio_edits is not None:
+                self._bio_edits.add(telegram_id)
+
+        new_terms = {}
+        for term in self.bio_vectors.missing_terms(bio):
+            # Таблица видит слова других еще не зафиксированных записей этой транзакции
+            row = cursor.execute("SELECT term_id FROM bio_vocabulary WHERE term = ?", (term,)).fetchone()
+            if row is None:
+                row = cursor.execute("SELECT COALESCE(MAX(term_id), -1) + 1 FROM bio_vocabulary").fetchone()
+                cursor.execute("INSERT INTO bio_vocabulary (term_id, term) VALUES (?, ?)", (row[0], term))
+            new_terms[term] = row[0]
+
+        vector = self.bio_vectors.compute(telegram_id, bio, new_terms)
+        self._store_bio_vectors(cursor, [(telegram_id, vector)])
+        self.pool.after_commit(lambda: self.bio_vectors.apply(telegram_id, new_terms, vector))
+
+    def _on_trust_flushed(self, *telegram_ids):
+        self.profile_cache.invalidate(*telegram_ids)
+        self._refresh_candidates(*telegram_ids)
 
     def get_user(self, telegram_id):
         try:
             if self.is_user_blocked(telegram_id):
                 return None
+
+            cached = self.profile_cache.get(telegram_id)
+            if cached is not None:
+                return cached
                 
-            if not self.connection:
+            if not self.pool:
                 self.connect()
-                
-            cursor = self.connection.cursor()
+
+            version = self.profile_cache.version(telegram_id)
+            cursor = self.pool.reader().cursor()
             cursor.execute(
                 "SELECT * FROM users WHERE telegram_id = ?",
                 (telegram_id,)
             )
             row = cursor.fetchone()
             if row:
-                return self._process_user_row(row)
+                user = self._process_user_row(row)
+                self.profile_cache.put(telegram_id, user, version)
+                return user
             return None
         except Exception as e:
             logger.error(f"Error getting user: {e}")
             return None
 
+    # Запас до лимита параметров SQLite (999 в старых сборках)
+    IN_CHUNK_SIZE = 500
+
+    def get_users_many(self, telegram_ids):
+        """Профили пачкой: {telegram_id: user}, заблокированные и несуществующие пропускаются"""
+        try:
+            users = {}
+            missing = []
+            for telegram_id in dict.fromkeys(telegram_ids):
+                if self.is_user_blocked(telegram_id):
+                    continue
+                cached = self.profile_cache.get(telegram_id)
+                if cached is not None:
+                    users[telegram_id] = cached
+                else:
+                    missing.append(telegram_id)
+
+            if not missing:
+                return users
+
+            if not self.pool:
+                self.connect()
+
+            versions = {telegram_id: self.profile_cache.version(telegram_id) for telegram_id in missing}
+            cursor = self.pool.reader().cursor()
+            for start in range(0, len(missing), self.IN_CHUNK_SIZE):
+                chunk = missing[start:start + self.IN_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f"SELECT * FROM users WHERE telegram_id IN ({placeholders})", chunk)
+                for row in cursor.fetchall():
+                    user = self._process_user_row(row)
+                    users[user['telegram_id']] = user
+                    self.profile_cache.put(user['telegram_id'], user, versions[user['telegram_id']])
+
+            return users
+        except Exception as e:
+            logger.error(f"Error getting users batch: {e}")
+            return {}
+
     def create_user(self, user_data):
         try:
             if self.is_user_blocked(user_data['telegram_id']):
                 return False
                 
-            if not self.connection:
+            if not self.pool:
                 self.connect()
                 
             bio_valid, bio_message = self.ai_moderator.moderate_bio(user_data.get('bio', ''))
@@ -778,8 +2008,6 @@ class Database:
                 logger.error(f"Interests moderation failed: {interests_message}")
                 return False
                 
-            cursor = self.connection.cursor()
-            
             required_fields = ['telegram_id', 'name', 'age', 'gender', 'target_gender', 'bio']
             for field in required_fields:
                 if field not in user_data:
@@ -794,254 +2022,337 @@ class Database:
             referral_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
             
             photos_json = json.dumps(user_data['photos'])
-            interests_json = json.dumps(user_data.get('interests', []))
+            interests = [normalize_interest(interest) for interest in user_data.get('interests', [])]
+            interests_json = json.dumps(interests)
+            features = profile_features({**user_data, 'interests': interests})
+            feature_assignments = ', '.join(f"{column} = ?" for column in FEATURE_COLUMNS)
+            feature_values = tuple(features[column] for column in FEATURE_COLUMNS)
+            interests_minhash = minhash_signature(features['interests_mask'])
             city = user_data.get('city', 'Томск')
-            
-            cursor.execute("SELECT telegram_id FROM users WHERE telegram_id = ?", (user_data['telegram_id'],))
-            existing_user = cursor.fetchone()
-            
-            if existing_user:
-                cursor.execute("""
-                    UPDATE users 
-                    SET username = ?, first_name = ?, last_name = ?, name = ?, age = ?, 
-                        gender = ?, target_gender = ?, bio = ?, interests = ?, photos = ?, 
-                        zodiac = ?, relationship_goal = ?, lifestyle = ?, habits = ?,
-                        latitude = ?, longitude = ?, city = ?, is_active = 1, updated_at = CURRENT_TIMESTAMP
-                    WHERE telegram_id = ?
-                """, (
-                    user_data.get('username'),
-                    user_data.get('first_name'),
-                    user_data.get('last_name'),
-                    user_data['name'],
-                    user_data['age'],
-                    user_data['gender'],
-                    user_data['target_gender'],
-                    user_data['bio'],
-                    interests_json,
-                    photos_json,
-                    user_data.get('zodiac'),
-                    user_data.get('relationship_goal'),
-                    user_data.get('lifestyle'),
-                    user_data.get('habits'),
-                    user_data.get('latitude'),
-                    user_data.get('longitude'),
-                    city,
-                    user_data['telegram_id']
-                ))
-            else:
-                cursor.execute("""
-                    INSERT INTO users 
-                    (telegram_id, user_id, username, first_name, last_name, name, age, gender, target_gender, 
-                     bio, interests, zodiac, relationship_goal, lifestyle, habits, photos, latitude, longitude, city, referral_code, trust_score)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    user_data['telegram_id'],
-                    user_id,
-                    user_data.get('username'),
-                    user_data.get('first_name'),
-                    user_data.get('last_name'),
-                    user_data['name'],
-                    user_data['age'],
-                    user_data['gender'],
-                    user_data['target_gender'],
-                    user_data['bio'],
-                    interests_json,
-                    user_data.get('zodiac'),
-                    user_data.get('relationship_goal'),
-                    user_data.get('lifestyle'),
-                    user_data.get('habits'),
-                    photos_json,
-                    user_data.get('latitude'),
-                    user_data.get('longitude'),
-                    city,
-                    referral_code,
-                    50
-                ))
-            
-            self.connection.commit()
+            geo_cell = self.location_system.geo_cell({
+                'latitude': user_data.get('latitude'), 'longitude': user_data.get('longitude'), 'city': city
+            })
+            
+            def _write(connection):
+                cursor = connection.cursor()
+                cursor.execute("SELECT telegram_id FROM users WHERE telegram_id = ?", (user_data['telegram_id'],))
+                existing_user = cursor.fetchone()
+            
+                if existing_user:
+                    # Очередь ленты собрана по старым настройкам поиска
+                    cursor.execute("DELETE FROM feed_queue WHERE user_id = ?", (user_data['telegram_id'],))
+                    cursor.execute(f"""
+                        UPDATE users 
+                        SET username = ?, first_name = ?, last_name = ?, name = ?, age = ?, 
+                            gender = ?, target_gender = ?, bio = ?, interests = ?, interests_mask = ?, interests_minhash = ?, photos = ?, {feature_assignments},
+                            zodiac = ?, relationship_goal = ?, lifestyle = ?, habits = ?,
+                            latitude = ?, longitude = ?, geo_cell = ?, city = ?, is_active = 1, updated_at = CURRENT_TIMESTAMP
+                        WHERE telegram_id = ?
+                    """, (
+                        user_data.get('username'),
+                        user_data.get('first_name'),
+                        user_data.get('last_name'),
+                        user_data['name'],
+                        user_data['age'],
+                        user_data['gender'],
+                        user_data['target_gender'],
+                        user_data['bio'],
+                        interests_json,
+                        features['interests_mask'],
+                        interests_minhash,
+                        photos_json,
+                        *feature_values,
+                        user_data.get('zodiac'),
+                        user_data.get('relationship_goal'),
+                        user_data.get('lifestyle'),
+                        user_data.get('habits'),
+                        user_data.get('latitude'),
+                        user_data.get('longitude'),
+                        geo_cell,
+                        city,
+                        user_data['telegram_id']
+                    ))
+                else:
+                    cursor.execute(f"""
+                        INSERT INTO users 
+                        (telegram_id, user_id, username, first_name, last_name, name, age, gender, target_gender, 
+                         bio, interests, interests_mask, interests_minhash, {', '.join(FEATURE_COLUMNS)}, zodiac, relationship_goal, lifestyle, habits, photos, latitude, longitude, geo_cell, city, referral_code, trust_score)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {', '.join('?' * len(FEATURE_COLUMNS))}, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        user_data['telegram_id'],
+                        user_id,
+                        user_data.get('username'),
+                        user_data.get('first_name'),
+                        user_data.get('last_name'),
+                        user_data['name'],
+                        user_data['age'],
+                        user_data['gender'],
+                        user_data['target_gender'],
+                        user_data['bio'],
+                        interests_json,
+                        features['interests_mask'],
+                        interests_minhash,
+                        *feature_values,
+                        user_data.get('zodiac'),
+                        user_data.get('relationship_goal'),
+                        user_data.get('lifestyle'),
+                        user_data.get('habits'),
+                        photos_json,
+                        user_data.get('latitude'),
+                        user_data.get('longitude'),
+                        geo_cell,
+                        city,
+                        referral_code,
+                        50
+                    ))
+                self._write_bio_vector(cursor, user_data['telegram_id'], user_data['bio'])
+
+            self.pool.write(_write)
+            self.profile_cache.invalidate(user_data['telegram_id'])
+            self._refresh_candidates(user_data['telegram_id'])
             logger.info(f"User {user_data['telegram_id']} created/updated successfully with user_id: {user_id}")
             return True
         except Exception as e:
             logger.error(f"Error creating/updating user: {e}")
             return False
 
-    def add_like(self, from_user_id, to_user_id):
+    def process_like(self, from_user_id, to_user_id, is_super_like=False, daily_limit=None):
+        """Лайк или суперлайк одной транзакцией (unit of work).
+
+        Если задан daily_limit, квота проверяется и списывается атомарно
+        вместе с лайком; при исчерпании лайк не ставится (quota_exceeded).
+        Возвращает всё, что нужно обработчику: создан ли матч, счетчики
+        лайков, строку уведомления и профили обоих пользователей.
+        """
+        result = {
+            'success': False,
+            'already_liked': False,
+            'quota_exceeded': False,
+            'is_super_like': is_super_like,
+            'is_mutual': False,
+            'match_created': False,
+            'likes_today': 0,
+            'super_likes_today': 0,
+            'notification': None,
+            'from_user': None,
+            'to_user': None
+        }
         try:
-            cursor = self.connection.cursor()
-            
-            cursor.execute("""
-                SELECT 1 FROM likes 
-                WHERE from_user_id = ? AND to_user_id = ?
-            """, (from_user_id, to_user_id))
-
-            existing_like = cursor.fetchone()
-            if existing_like:
-                return True
-
-            cursor.execute("""
-                INSERT INTO likes (from_user_id, to_user_id)
-                VALUES (?, ?)
-            """, (from_user_id, to_user_id))
-
-            self.increment_likes_today(from_user_id)
-            self.mark_profile_viewed(from_user_id, to_user_id)
-            self.update_daily_stats(from_user_id, 'likes_given')
-            self.update_daily_stats(to_user_id, 'likes_received')
-
-            cursor.execute("""
-                SELECT 1 FROM likes 
-                WHERE from_user_id = ? AND to_user_id = ?
-            """, (to_user_id, from_user_id))
-
-            mutual_like = cursor.fetchone() is not None
+            def _write(connection):
+                cursor = connection.cursor()
 
-            if mutual_like:
-                user1_id = min(from_user_id, to_user_id)
-                user2_id = max(from_user_id, to_user_id)
                 cursor.execute("""
-                    INSERT OR IGNORE INTO matches (user1_id, user2_id)
-                    VALUES (?, ?)
-                """, (user1_id, user2_id))
-
-                self.update_trust_score(from_user_id, 5)
-                self.update_trust_score(to_user_id, 5)
-
-            cursor.execute("""
-                INSERT INTO like_notifications (from_user_id, to_user_id, is_mutual)
-                VALUES (?, ?, ?)
-            """, (from_user_id, to_user_id, mutual_like))
-
-            self.update_trust_score(from_user_id, 1)
-
-            self.connection.commit()
-            logger.info(f"Лайк добавлен: {from_user_id} -> {to_user_id}, взаимный: {mutual_like}")
-            return True
+                    SELECT is_super_like FROM likes 
+                    WHERE from_user_id = ? AND to_user_id = ?
+                """, (from_user_id, to_user_id))
+                existing_like = cursor.fetchone()
+
+                if existing_like and (not is_super_like or existing_like['is_super_like']):
+                    result['already_liked'] = True
+                elif not self._consume_like_quota(connection, from_user_id, is_super_like, daily_limit):
+                    result['quota_exceeded'] = True
+                    return
+                elif existing_like:
+                    # Обычный лайк превращается в суперлайк
+                    cursor.execute("""
+                        UPDATE likes SET is_super_like = TRUE
+                        WHERE from_user_id = ? AND to_user_id = ?
+                    """, (from_user_id, to_user_id))
+                else:
+                    cursor.execute("""
+                        INSERT INTO likes (from_user_id, to_user_id, is_super_like)
+                        VALUES (?, ?, ?)
+                    """, (from_user_id, to_user_id, is_super_like))
+
+                if not result['already_liked']:
+                    self._mark_viewed(connection, from_user_id, to_user_id)
+
+                    cursor.execute("""
+                        SELECT 1 FROM likes 
+                        WHERE from_user_id = ? AND to_user_id = ?
+                    """, (to_user_id, from_user_id))
+                    result['is_mutual'] = cursor.fetchone() is not None
+
+                    if result['is_mutual']:
+                        cursor.execute("""
+                            INSERT OR IGNORE INTO matches (user1_id, user2_id)
+                            VALUES (?, ?)
+                        """, (min(from_user_id, to_user_id), max(from_user_id, to_user_id)))
+                        result['match_created'] = cursor.rowcount > 0
+
+                    cursor.execute("""
+                        INSERT INTO like_notifications (from_user_id, to_user_id, is_mutual, is_super_like)
+                        VALUES (?, ?, ?, ?)
+                    """, (from_user_id, to_user_id, result['is_mutual'], is_super_like))
+                    cursor.execute("SELECT * FROM like_notifications WHERE id = ?", (cursor.lastrowid,))
+                    result['notification'] = dict(cursor.fetchone())
+
+                cursor.execute("SELECT * FROM users WHERE telegram_id IN (?, ?)", (from_user_id, to_user_id))
+                for row in cursor.fetchall():
+                    user = self._process_user_row(row)
+                    if user['telegram_id'] == from_user_id:
+                        result['from_user'] = user
+                        result['likes_today'] = user.get('likes_today') or 0
+                        result['super_likes_today'] = user.get('super_likes_today') or 0
+                    else:
+                        result['to_user'] = user
+
+            self.pool.write(_write)
+            # Изменились счетчики лайков отправителя
+            self.profile_cache.invalidate(from_user_id)
+            if result['quota_exceeded']:
+                logger.info(f"Дневной лимит лайков исчерпан: {from_user_id}")
+                return result
+            result['success'] = True
+
+            # Счетчики уходят в буфер только после фиксации транзакции
+            if not result['already_liked']:
+                self.seen_sets.add_like(from_user_id, to_user_id)
+                self.counters.add_profile_view(from_user_id, to_user_id)
+                self.counters.add_daily_stat(from_user_id, 'views_given')
+                self.counters.add_daily_stat(to_user_id, 'views_received')
+                self.counters.add_daily_stat(from_user_id, 'likes_given')
+                self.counters.add_daily_stat(to_user_id, 'likes_received')
+                if result['match_created']:
+                    self._add_trust(from_user_id, 5)
+                    self._add_trust(to_user_id, 5)
+                if not is_super_like:
+                    self._add_trust(from_user_id, 1)
+
+            like_type = "Суперлайк" if is_super_like else "Лайк"
+            if result['already_liked']:
+                logger.info(f"{like_type} уже был поставлен: {from_user_id} -> {to_user_id}")
+            else:
+                logger.info(f"{like_type} добавлен: {from_user_id} -> {to_user_id}, взаимный: {result['is_mutual']}")
+            return result
         except Exception as e:
             logger.error(f"Ошибка добавления лайка: {e}")
-            return False
+            return result
 
-    def add_super_like(self, from_user_id, to_user_id):
-        try:
-            cursor = self.connection.cursor()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO likes (from_user_id, to_user_id, is_super_like)
-                VALUES (?, ?, TRUE)
-            """, (from_user_id, to_user_id))
-            
-            cursor.execute("""
-                UPDATE users 
-                SET super_likes_today = COALESCE(super_likes_today, 0) + 1 
-                WHERE telegram_id = ?
-            """, (from_user_id,))
-            
-            self.mark_profile_viewed(from_user_id, to_user_id)
-            self.update_daily_stats(from_user_id, 'likes_given')
-            self.update_daily_stats(to_user_id, 'likes_received')
+    def add_like(self, from_user_id, to_user_id):
+        return self.process_like(from_user_id, to_user_id)['success']
 
-            cursor.execute("""
-                INSERT INTO like_notifications (from_user_id, to_user_id, is_mutual, is_super_like)
-                VALUES (?, ?, ?, TRUE)
-            """, (from_user_id, to_user_id, False))
-            
-            self.connection.commit()
-            logger.info(f"Суперлайк добавлен: {from_user_id} -> {to_user_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка добавления суперлайка: {e}")
-            return False
+    def add_super_like(self, from_user_id, to_user_id):
+        return self.process_like(from_user_id, to_user_id, is_super_like=True)['success']
+
+    def _add_trust(self, user_id, score_change):
+        self.counters.add_trust(user_id, score_change)
+        self.profile_cache.invalidate(user_id)
+
+    @staticmethod
+    def _today_counter_sql(column):
+        """Счетчик квоты с ленивым сбросом: значение действует только в день last_like_reset"""
+        return f"(CASE WHEN last_like_reset >= date('now') THEN COALESCE({column}, 0) ELSE 0 END)"
+
+    # ОПЕРАЦИИ ВНУТРИ ТРАНЗАКЦИИ ПИСАТЕЛЯ
+    def _consume_like_quota(self, connection, user_id, is_super_like=False, limit=None):
+        """Атомарно проверяет и списывает дневную квоту, трогая одну строку users"""
+        likes = self._today_counter_sql('likes_today')
+        super_likes = self._today_counter_sql('super_likes_today')
+        consumed = super_likes if is_super_like else likes
+
+        cursor = connection.execute(f"""
+            UPDATE users 
+            SET likes_today = {likes} + ?,
+                super_likes_today = {super_likes} + ?,
+                last_like_reset = CURRENT_TIMESTAMP
+            WHERE telegram_id = ? AND (? IS NULL OR {consumed} < ?)
+        """, (0 if is_super_like else 1, 1 if is_super_like else 0, user_id, limit, limit))
+        return cursor.rowcount > 0
+
+    def _mark_viewed(self, connection, viewer_id, viewed_id):
+        # Повторный просмотр продлевает отметку: просроченная, но еще не
+        # удаленная строка не должна сразу вернуть анкету в выдачу
+        connection.execute("""
+            INSERT INTO viewed_profiles (viewer_id, viewed_id)
+            VALUES (?, ?)
+            ON CONFLICT(viewer_id, viewed_id) DO UPDATE SET created_at = CURRENT_TIMESTAMP
+        """, (viewer_id, viewed_id))
 
     def mark_profile_viewed(self, viewer_id, viewed_id):
         try:
-            if not self.connection:
+            if not self.pool:
                 self.connect()
                 
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                INSERT OR IGNORE INTO viewed_profiles (viewer_id, viewed_id)
-                VALUES (?, ?)
-            """, (viewer_id, viewed_id))
-
-            cursor.execute("""
-                INSERT OR REPLACE INTO profile_views (viewer_id, viewed_id, view_count, last_viewed)
-                VALUES (?, ?, COALESCE((SELECT view_count FROM profile_views WHERE viewer_id = ? AND viewed_id = ?), 0) + 1, CURRENT_TIMESTAMP)
-            """, (viewer_id, viewed_id, viewer_id, viewed_id))
-            
-            self.connection.commit()
+            self.pool.write(lambda connection: self._mark_viewed(connection, viewer_id, viewed_id))
+            self.seen_sets.add_view(viewer_id, viewed_id)
+            self.counters.add_profile_view(viewer_id, viewed_id)
             return True
         except Exception as e:
             logger.error(f"Error marking profile as viewed: {e}")
             return False
 
-    def cleanup_old_views(self):
+    def record_profile_view(self, viewer_id, viewed_id):
+        """Просмотр анкеты вместе со статистикой обеих сторон"""
+        try:
+            if not self.mark_profile_viewed(viewer_id, viewed_id):
+                return False
+            self.counters.add_daily_stat(viewer_id, 'views_given')
+            self.counters.add_daily_stat(viewed_id, 'views_received')
+            return True
+        except Exception as e:
+            logger.error(f"Error recording profile view: {e}")
+            return False
+
+    def purge_expired_views(self, batch_size=500, time_budget=0.5):
+        """Удаляет просмотры старше суток пачками по индексу created_at.
+
+        Каждая пачка - отдельная короткая запись, между ними успевают пройти
+        остальные операции писателя. Остаток дочищается при следующем запуске.
+        """
+        deleted = 0
         try:
-            if not self.connection:
+            if not self.pool:
                 self.connect()
-                
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                DELETE FROM viewed_profiles 
-                WHERE datetime(created_at) < datetime('now', '-24 hours')
-            """)
-            self.connection.commit()
-            logger.info("Old views cleaned up")
+
+            deadline = time.monotonic() + time_budget
+            while True:
+                batch_deleted = self.pool.execute("""
+                    DELETE FROM viewed_profiles 
+                    WHERE id IN (
+                        SELECT id FROM viewed_profiles 
+                        WHERE created_at < datetime('now', '-24 hours')
+                        LIMIT ?
+                    )
+                """, (batch_size,))
+                deleted += batch_deleted
+                if batch_deleted < batch_size or time.monotonic() >= deadline:
+                    break
+
+            if deleted:
+                logger.info(f"Expired views purged: {deleted}")
+            return deleted
         except Exception as e:
-            logger.error(f"Error cleaning up old views: {e}")
+            logger.error(f"Error purging expired views: {e}")
+            return deleted
 
     def increment_likes_today(self, user_id):
         try:
-            if not self.connection:
+            if not self.pool:
                 self.connect()
                 
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                UPDATE users 
-                SET likes_today = COALESCE(likes_today, 0) + 1 
-                WHERE telegram_id = ?
-            """, (user_id,))
-            self.connection.commit()
-            return True
+            consumed = self.pool.write(lambda connection: self._consume_like_quota(connection, user_id))
+            self.profile_cache.invalidate(user_id)
+            return consumed
         except Exception as e:
             logger.error(f"Error incrementing likes: {e}")
             return False
 
     def update_trust_score(self, user_id, score_change):
         try:
-            if not self.connection:
+            if not self.pool:
                 self.connect()
                 
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                UPDATE users 
-                SET trust_score = trust_score + ? 
-                WHERE telegram_id = ?
-            """, (score_change, user_id))
-            self.connection.commit()
+            self._add_trust(user_id, score_change)
             return True
         except Exception as e:
             logger.error(f"Error updating trust score: {e}")
             return False
 
-    def reset_daily_likes(self):
-        try:
-            if not self.connection:
-                self.connect()
-                
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                UPDATE users 
-                SET likes_today = 0, super_likes_today = 0, last_like_reset = CURRENT_TIMESTAMP
-                WHERE date(last_like_reset) < date('now')
-            """)
-            self.connection.commit()
-            logger.info("Daily likes reset")
-        except Exception as e:
-            logger.error(f"Error resetting daily likes: {e}")
-
     def get_daily_stats(self, user_id):
         try:
-            cursor = self.connection.cursor()
-            today = datetime.now().strftime('%Y-%m-%d')
+            cursor = self.pool.reader().cursor()
+            today = CounterBuffer.today()
 
             base_stats = {
                 'likes_given': 0,
@@ -1061,8 +2372,11 @@ class Database:
             if result:
                 base_stats.update(dict(result))
 
-            cursor.execute("""
-                SELECT super_likes_today FROM users WHERE telegram_id = ?
+            for stat_type, delta in self.counters.pending_daily(user_id, today).items():
+                base_stats[stat_type] = (base_stats[stat_type] or 0) + delta
+
+            cursor.execute(f"""
+                SELECT {self._today_counter_sql('super_likes_today')} FROM users WHERE telegram_id = ?
             """, (user_id,))
             user_result = cursor.fetchone()
             if user_result:
@@ -1082,22 +2396,24 @@ class Database:
 
     def get_profile_views_today(self, user_id):
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             cursor.execute("""
-                SELECT COUNT(*) FROM profile_views 
-                WHERE viewed_id = ? AND date(last_viewed) = date('now')
+                SELECT viewer_id FROM profile_views 
+                WHERE viewed_id = ? AND last_viewed >= date('now')
             """, (user_id,))
-            return cursor.fetchone()[0] or 0
+            viewers = {row[0] for row in cursor.fetchall()}
+            # Не сброшенные просмотры всегда сегодняшние
+            return len(viewers | self.counters.pending_viewers(user_id))
         except Exception as e:
             logger.error(f"Error getting profile views: {e}")
             return 0
 
     def get_matches(self, user_id):
         try:
-            if not self.connection:
+            if not self.pool:
                 self.connect()
                 
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             cursor.execute("""
                 SELECT u.* FROM users u
                 INNER JOIN matches m ON (u.telegram_id = m.user1_id OR u.telegram_id = m.user2_id)
@@ -1116,10 +2432,10 @@ class Database:
 
     def check_mutual_like(self, user1_id, user2_id):
         try:
-            if not self.connection:
+            if not self.pool:
                 self.connect()
                 
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             cursor.execute("""
                 SELECT 1 FROM likes 
                 WHERE from_user_id = ? AND to_user_id = ?
@@ -1131,23 +2447,170 @@ class Database:
             return False
 
     def skip_profile(self, user_id, skipped_id):
+        """Пропуск записывается как обычный просмотр со статистикой"""
+        return self.record_profile_view(user_id, skipped_id)
+
+    def get_feed(self, user_id, limit=1):
+        """Первые limit кандидатов из очереди ленты"""
         try:
-            cursor = self.connection.cursor()
+            if not self.pool:
+                self.connect()
+
+            cursor = self.pool.reader().cursor()
             cursor.execute("""
-                INSERT OR IGNORE INTO viewed_profiles (viewer_id, viewed_id)
-                VALUES (?, ?)
-            """, (user_id, skipped_id))
-            self.connection.commit()
+                SELECT candidate_id FROM feed_queue
+                WHERE user_id = ? ORDER BY position LIMIT ?
+            """, (user_id, limit))
+            return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting feed: {e}")
+            return []
+
+    def get_feed_size(self, user_id):
+        try:
+            cursor = self.pool.reader().cursor()
+            cursor.execute("SELECT COUNT(*) FROM feed_queue WHERE user_id = ?", (user_id,))
+            return cursor.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error getting feed size: {e}")
+            return 0
+
+    def push_feed(self, user_id, candidate_ids, source='search'):
+        """Добавляет кандидатов в конец очереди, уже стоящие в ней пропускаются"""
+        try:
+            if not candidate_ids:
+                return 0
+
+            def _write(connection):
+                cursor = connection.cursor()
+                cursor.execute("SELECT COALESCE(MAX(position), 0) FROM feed_queue WHERE user_id = ?", (user_id,))
+                start = cursor.fetchone()[0] + 1
+                cursor.executemany("""
+                    INSERT OR IGNORE INTO feed_queue (user_id, candidate_id, position, source)
+                    VALUES (?, ?, ?, ?)
+                """, [(user_id, candidate_id, start + offset, source)
+                      for offset, candidate_id in enumerate(candidate_ids)])
+                return cursor.rowcount
+
+            return self.pool.write(_write)
+        except Exception as e:
+            logger.error(f"Error pushing feed: {e}")
+            return 0
+
+    def pop_feed(self, user_id, candidate_id):
+        """Убирает кандидата из очереди; возвращает остаток очереди"""
+        try:
+            def _write(connection):
+                connection.execute("DELETE FROM feed_queue WHERE user_id = ? AND candidate_id = ?",
+                                   (user_id, candidate_id))
+                return connection.execute("SELECT COUNT(*) FROM feed_queue WHERE user_id = ?",
+                                          (user_id,)).fetchone()[0]
+
+            return self.pool.write(_write)
+        except Exception as e:
+            logger.error(f"Error popping feed: {e}")
+            return 0
+
+    def save_recommendations(self, user_ids, rows):
+        """Заменяет рекомендации пользователей user_ids; rows - (user_id, candidate_id, score, rank)"""
+        try:
+            counts = {}
+            for user_id, candidate_id, score, rank in rows:
+                counts[user_id] = max(counts.get(user_id, 0), rank)
+
+            def _write(connection):
+                for start in range(0, len(user_ids), self.IN_CHUNK_SIZE):
+                    chunk = user_ids[start:start + self.IN_CHUNK_SIZE]
+                    connection.execute(
+                        f"DELETE FROM recommendations WHERE user_id IN ({','.join('?' * len(chunk))})", chunk
+                    )
+                connection.executemany("""
+                    INSERT INTO recommendations (user_id, candidate_id, score, rank)
+                    VALUES (?, ?, ?, ?)
+                """, rows)
+                for user_id in user_ids:
+                    self._queue_recommendations(connection, user_id, counts.get(user_id, 0))
+
+            self.pool.write(_write)
             return True
         except Exception as e:
-            logger.error(f"Error skipping profile: {e}")
+            logger.error(f"Error saving recommendations: {e}")
             return False
 
+    def _queue_recommendations(self, connection, user_id, count):
+        """Ставит свежие рекомендации в очередь ленты сразу за ее головой.
+
+        Голова (анкета, которая может быть на экране) и результаты поиска
+        остаются на месте, заменяются только вчерашние рекомендации; уже
+        лайкнутые и просмотренные за сутки анкеты пропускаются, как в
+        SeenSetStore.
+        """
+        head = connection.execute("""
+            SELECT candidate_id, position FROM feed_queue
+            WHERE user_id = ? ORDER BY position LIMIT 1
+        """, (user_id,)).fetchone()
+        connection.execute("""
+            DELETE FROM feed_queue
+            WHERE user_id = ? AND source = 'recommendation' AND candidate_id IS NOT ?
+        """, (user_id, head[0] if head else None))
+        if not count:
+            return
+
+        # Рекомендации встают на позиции base + rank, голова переносится на base перед ними
+        base = 0
+        if head:
+            base = head[1] - count - 1
+            connection.execute("UPDATE feed_queue SET position = ? WHERE user_id = ? AND candidate_id = ?",
+                               (base, user_id, head[0]))
+        connection.execute("""
+            INSERT OR IGNORE INTO feed_queue (user_id, candidate_id, position, source)
+            SELECT r.user_id, r.candidate_id, ? + r.rank, 'recommendation'
+            FROM recommendations r
+            WHERE r.user_id = ?
+              AND NOT EXISTS (SELECT 1 FROM likes l WHERE l.from_user_id = r.user_id AND l.to_user_id = r.candidate_id)
+              AND NOT EXISTS (
+                  SELECT 1 FROM viewed_profiles v
+                  WHERE v.viewer_id = r.user_id AND v.viewed_id = r.candidate_id
+                    AND v.created_at > datetime('now', '-24 hours')
+              )
+        """, (base, user_id))
+
+    def purge_recommendations(self, before):
+        """Удаляет рекомендации, посчитанные раньше before (пользователи выпали из расчета)"""
+        try:
+            return self.pool.execute("DELETE FROM recommendations WHERE created_at < ?", (before,))
+        except Exception as e:
+            logger.error(f"Error purging recommendations: {e}")
+            return 0
+
+    def get_recommendation_ids(self, user_id, limit=10):
+        """telegram_id непросмотренных рекомендаций пользователя по порядку рейтинга"""
+        try:
+            if not self.pool:
+                self.connect()
+
+            cursor = self.pool.reader().execute("""
+                SELECT u.telegram_id FROM recommendations r
+                JOIN users u ON u.telegram_id = r.candidate_id
+                WHERE r.user_id = ? AND u.is_active = 1
+                ORDER BY r.rank
+            """, (user_id,))
+            telegram_ids = []
+            for row in self.seen_sets.filter_unseen(user_id, cursor):
+                telegram_ids.append(row['telegram_id'])
+                if len(telegram_ids) >= limit:
+                    break
+            cursor.close()
+            return telegram_ids
+        except Exception as e:
+            logger.error(f"Error getting recommendations: {e}")
+            return []
+
     def unblock_user(self, telegram_id):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("DELETE FROM blocked_users WHERE telegram_id = ?", (telegram_id,))
-            self.connection.commit()
+            self.pool.execute("DELETE FROM blocked_users WHERE telegram_id = ?", (telegram_id,))
+            self.blocklist.remove(telegram_id)
+            self.profile_cache.invalidate(telegram_id)
             return True
         except Exception as e:
             logger.error(f"Error unblocking user: {e}")
@@ -1155,7 +2618,7 @@ class Database:
 
     def get_blocked_user_info(self, telegram_id):
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             cursor.execute("SELECT * FROM blocked_users WHERE telegram_id = ?", (telegram_id,))
             return cursor.fetchone()
         except Exception as e:
@@ -1164,21 +2627,7 @@ class Database:
 
     def update_daily_stats(self, user_id, stat_type):
         try:
-            cursor = self.connection.cursor()
-            today = datetime.now().strftime('%Y-%m-%d')
-            
-            cursor.execute("""
-                INSERT OR IGNORE INTO daily_stats (user_id, date) 
-                VALUES (?, ?)
-            """, (user_id, today))
-            
-            cursor.execute(f"""
-                UPDATE daily_stats 
-                SET {stat_type} = {stat_type} + 1 
-                WHERE user_id = ? AND date = ?
-            """, (user_id, today))
-            
-            self.connection.commit()
+            self.counters.add_daily_stat(user_id, stat_type)
             return True
         except Exception as e:
             logger.error(f"Error updating daily stats: {e}")
@@ -1186,7 +2635,7 @@ class Database:
 
     def get_pending_like_notifications(self, user_id):
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             cursor.execute("""
                 SELECT ln.*, u.name as from_user_name, u.age as from_user_age, 
                        u.city as from_user_city, u.bio as from_user_bio, 
@@ -1204,13 +2653,11 @@ class Database:
 
     def mark_notification_sent(self, notification_id):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
+            self.pool.execute("""
                 UPDATE like_notifications 
                 SET is_sent = TRUE 
                 WHERE id = ?
             """, (notification_id,))
-            self.connection.commit()
             return True
         except Exception as e:
             logger.error(f"Error marking notification as sent: {e}")
@@ -1218,12 +2665,10 @@ class Database:
 
     def add_referral(self, referrer_id, referred_id):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
+            self.pool.execute("""
                 INSERT OR IGNORE INTO referrals (referrer_id, referred_id)
                 VALUES (?, ?)
             """, (referrer_id, referred_id))
-            self.connection.commit()
             return True
         except Exception as e:
             logger.error(f"Error adding referral: {e}")
@@ -1258,14 +2703,14 @@ class Database:
                     pass
             
             # Создаем новый бэкап
-            if not self.connection:
+            if not self.pool:
                 self.connect()
                 
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             backup_path = os.path.join(backup_dir, f'tochkasvoda_backup_{timestamp}.db')
             
             backup_conn = sqlite3.connect(backup_path)
-            self.connection.backup(backup_conn)
+            self.pool.reader().backup(backup_conn)
             backup_conn.close()
             
             # Очищаем старые бэкапы (оставляем только 3 последних)
@@ -1303,7 +2748,7 @@ class Database:
     def get_admin_stats(self):
         """Получение статистики для админ-панели"""
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             
             # Общее количество пользователей
             cursor.execute("SELECT COUNT(*) as count FROM users")
@@ -1314,7 +2759,7 @@ class Database:
             active_users = cursor.fetchone()[0]
             
             # Новые сегодня
-            cursor.execute("SELECT COUNT(*) as count FROM users WHERE DATE(created_at) = DATE('now')")
+            cursor.execute("SELECT COUNT(*) as count FROM users WHERE created_at >= date('now')")
             new_today = cursor.fetchone()[0]
             
             # Премиум пользователи
@@ -1326,11 +2771,11 @@ class Database:
             blocked_users = cursor.fetchone()[0]
             
             # Лайки за сегодня
-            cursor.execute("SELECT COUNT(*) as count FROM likes WHERE DATE(created_at) = DATE('now')")
+            cursor.execute("SELECT COUNT(*) as count FROM likes WHERE created_at >= date('now')")
             likes_today = cursor.fetchone()[0]
             
             # Матчи за сегодня
-            cursor.execute("SELECT COUNT(*) as count FROM matches WHERE DATE(created_at) = DATE('now')")
+            cursor.execute("SELECT COUNT(*) as count FROM matches WHERE created_at >= date('now')")
             matches_today = cursor.fetchone()[0]
             
             # Жалобы на модерации
@@ -1345,7 +2790,9 @@ class Database:
                 'blocked_users': blocked_users,
                 'likes_today': likes_today,
                 'matches_today': matches_today,
-                'pending_reports': pending_reports
+                'pending_reports': pending_reports,
+                'profile_cache': self.profile_cache.get_stats(),
+                'compatibility_cache': self.compatibility_cache.get_stats()
             }
         except Exception as e:
             logger.error(f"Error getting admin stats: {e}")
@@ -1354,7 +2801,7 @@ class Database:
     def search_users(self, search_term, page=1, page_size=20):
         """Поиск пользователей для админ-панели с пагинацией"""
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             offset = (page - 1) * page_size
             
             query = """
@@ -1382,7 +2829,7 @@ class Database:
     def get_blocked_users(self, page=1, page_size=20):
         """Получение списка заблокированных пользователей с пагинацией"""
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             offset = (page - 1) * page_size
             
             cursor.execute("""
@@ -1404,23 +2851,27 @@ class Database:
             if not user:
                 return False
             
-            cursor = self.connection.cursor()
-            
             blocked_until = None
             if ban_type != 'permanent':
                 days = 7 if ban_type == '7days' else 30
                 blocked_until = (datetime.now() + timedelta(days=days)).isoformat()
+
+            def _write(connection):
+                cursor = connection.cursor()
             
-            cursor.execute("""
-                INSERT OR REPLACE INTO blocked_users 
-                (telegram_id, user_id, blocked_until, ban_type, reason)
-                VALUES (?, ?, ?, ?, ?)
-            """, (telegram_id, user['user_id'], blocked_until, ban_type, reason))
-            
-            # Деактивируем пользователя
-            cursor.execute("UPDATE users SET is_active = 0 WHERE telegram_id = ?", (telegram_id,))
-            
-            self.connection.commit()
+                cursor.execute("""
+                    INSERT OR REPLACE INTO blocked_users 
+                    (telegram_id, user_id, blocked_until, ban_type, reason)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (telegram_id, user['user_id'], blocked_until, ban_type, reason))
+            
+                # Деактивируем пользователя
+                cursor.execute("UPDATE users SET is_active = 0 WHERE telegram_id = ?", (telegram_id,))
+
+            self.pool.write(_write)
+            self.blocklist.add(telegram_id, blocked_until)
+            self.profile_cache.invalidate(telegram_id)
+            self.candidate_index.remove(telegram_id)
             logger.info(f"User {telegram_id} blocked with type {ban_type}")
             return True
         except Exception as e:
@@ -1430,7 +2881,7 @@ class Database:
     def get_pending_reports(self, page=1, page_size=20):
         """Получение жалоб на модерации с пагинацией"""
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             offset = (page - 1) * page_size
             
             cursor.execute("""
@@ -1453,7 +2904,7 @@ class Database:
     def get_all_reports(self, page=1, page_size=50):
         """Получение всех жалоб с пагинацией"""
         try:
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             offset = (page - 1) * page_size
             
             cursor.execute("""
@@ -1475,13 +2926,11 @@ class Database:
     def update_report_status(self, report_id, status, admin_action=None, admin_id=None):
         """Обновление статуса жалобы"""
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
+            self.pool.execute("""
                 UPDATE reports 
                 SET status = ?, admin_action = ?, admin_id = ?
                 WHERE id = ?
             """, (status, admin_action, admin_id, report_id))
-            self.connection.commit()
             return True
         except Exception as e:
             logger.error(f"Error updating report status: {e}")
@@ -1494,24 +2943,109 @@ class Database:
             if not reported_user:
                 return False
                 
-            cursor = self.connection.cursor()
-            cursor.execute("""
+            self.pool.execute("""
                 INSERT INTO reports (from_user_id, reported_user_id, reported_user_user_id, reason)
                 VALUES (?, ?, ?, ?)
             """, (from_user_id, reported_user_id, reported_user['user_id'], reason))
-            self.connection.commit()
             return True
         except Exception as e:
             logger.error(f"Error adding report: {e}")
             return False
 
+    # ПРЕМИУМ И ЛИМИТЫ
+    def activate_premium(self, telegram_id, premium_until, subscription_channel):
+        try:
+            self.pool.execute("""
+                UPDATE users 
+                SET is_premium = 1, premium_until = ?, subscription_channel = ?
+                WHERE telegram_id = ?
+            """, (premium_until, subscription_channel, telegram_id))
+            self.profile_cache.invalidate(telegram_id)
+            self._refresh_candidates(telegram_id)
+            
+            cursor = self.pool.reader().cursor()
+            cursor.execute("SELECT user_id FROM users WHERE telegram_id = ?", (telegram_id,))
+            result = cursor.fetchone()
+            user_id = result[0] if result else "неизвестен"
+            
+            logger.info(f"🎉 Премиум активирован для пользователя {telegram_id} (user_id: {user_id}) до {premium_until}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка активации премиума: {e}")
+            return False
+
+    def get_premium_status(self, telegram_id):
+        try:
+            cursor = self.pool.reader().cursor()
+            cursor.execute("""
+                SELECT is_premium, premium_until FROM users 
+                WHERE telegram_id = ?
+            """, (telegram_id,))
+            return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting premium status: {e}")
+            return None
+
+    def deactivate_premium(self, telegram_id):
+        try:
+            self.pool.execute("""
+                UPDATE users 
+                SET is_premium = 0, premium_until = NULL
+                WHERE telegram_id = ?
+            """, (telegram_id,))
+            self.profile_cache.invalidate(telegram_id)
+            self._refresh_candidates(telegram_id)
+            
+            logger.info(f"Premium deactivated for user {telegram_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error deactivating premium: {e}")
+            return False
+
+    def get_like_counters(self, telegram_id):
+        try:
+            cursor = self.pool.reader().cursor()
+            cursor.execute(f"""
+                SELECT {self._today_counter_sql('likes_today')} AS likes_today,
+                       {self._today_counter_sql('super_likes_today')} AS super_likes_today,
+                       is_premium
+                FROM users 
+                WHERE telegram_id = ?
+            """, (telegram_id,))
+            return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting like counters: {e}")
+            return None
+
+    def get_telegram_id_by_referral_code(self, referral_code):
+        try:
+            cursor = self.pool.reader().cursor()
+            cursor.execute("SELECT telegram_id FROM users WHERE referral_code = ?", (referral_code,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+        except Exception as e:
+            logger.error(f"Error getting user by referral code: {e}")
+            return None
+
+    def save_user_agreement(self, user_id):
+        try:
+            self.pool.execute("""
+                INSERT OR REPLACE INTO user_agreements 
+                (user_id, accepted_terms, accepted_privacy, accepted_at) 
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """, (user_id, True, True))
+            return True
+        except Exception as e:
+            logger.error(f"Error saving agreements: {e}")
+            return False
+
     def get_all_users(self):
         """Получение всех пользователей для админ-панели"""
         try:
-            if not self.connection:
+            if not self.pool:
                 self.connect()
 
-            cursor = self.connection.cursor()
+            cursor = self.pool.reader().cursor()
             cursor.execute("SELECT * FROM users WHERE is_active = 1 ORDER BY created_at DESC")
             rows = cursor.fetchall()
             users = []
@@ -1522,5 +3056,36 @@ class Database:
             logger.error(f"Error getting all users: {e}")
             return []
 
+class AsyncDatabase:
+    """Асинхронный фасад над Database.
+
+    Каждый вызов выполняется в выделенном пуле потоков, поэтому медленный
+    запрос sqlite3 не блокирует event loop и остальных пользователей.
+    """
+    def __init__(self, database: Database, max_workers: int = 1):
+        self._db = database
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет синхронную функцию в пуле базы данных"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        method.__name__ = name
+        return method
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
 # Глобальный экземпляр базы данных
-db = Database()
\ No newline at end of file
+db = Database()
+# Асинхронный фасад для вызовов из обработчиков бота
+adb = AsyncDatabase(db, max_workers=config.DB_EXECUTOR_WORKERS)
\ No newline at end of file
@@ -0,0 +1,166 @@
+# gazetteer.py
+"""Справочник населенных пунктов: ближайший пункт к точке и поиск по названию.
+
+Файл - TSV в одном из форматов:
+- выгрузка GeoNames (RU.txt, cities1000.txt и т.п.): 19 столбцов, берутся
+  только строки класса 'P' (населенные пункты);
+- короткий: название, широта, долгота, [население], [другие названия через запятую].
+Строки, начинающиеся с '#', пропускаются.
+
+Ближайший пункт ищется по KD-дереву из единичных векторов (x, y, z): расстояние
+между ними растет вместе с расстоянием по поверхности, поэтому 180-й меридиан и
+полюса не требуют особых случаев. Запрос - O(log n), названия - словарь.
+"""
+import logging
+import math
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from geo_index import EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+LEAF_SIZE = 16
+CYRILLIC = re.compile('[а-яё]', re.IGNORECASE)
+
+Settlement = Tuple[str, float, float, int, List[str]]  # название, широта, долгота, население, другие названия
+
+def normalize_name(name: str) -> str:
+    return ' '.join(name.lower().replace('ё', 'е').replace('-', ' ').split())
+
+def _display_name(name: str, alternates: List[str]) -> str:
+    """В GeoNames основное название латиницей - показываем русское, если оно есть"""
+    if CYRILLIC.search(name):
+        return name
+    return next((alternate for alternate in alternates if CYRILLIC.search(alternate)), name)
+
+def read_gazetteer(path: str) -> Iterator[Settlement]:
+    with open(path, encoding='utf-8') as gazetteer_file:
+        for line in gazetteer_file:
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            try:
+                if len(fields) >= 19:
+                    if fields[6] != 'P':
+                        continue
+                    alternates = [fields[2]] + [name for name in fields[3].split(',') if name]
+                    yield (_display_name(fields[1], alternates), float(fields[4]), float(fields[5]),
+                           int(fields[14] or 0), alternates + [fields[1]])
+                elif len(fields) >= 3:
+                    population = int(fields[3]) if len(fields) > 3 and fields[3] else 0
+                    alternates = [name.strip() for name in fields[4].split(',') if name.strip()] if len(fields) > 4 else []
+                    yield (fields[0], float(fields[1]), float(fields[2]), population, alternates)
+            except ValueError:
+                logger.debug(f"Skipping malformed gazetteer line: {line[:80]!r}")
+
+def _unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+def _chord_to_km(squared_chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(squared_chord) / 2))
+
+class Gazetteer:
+    def __init__(self, settlements: Iterable[Settlement] = ()):
+        names, latitudes, longitudes, populations = [], [], [], []
+        by_name: Dict[str, List[int]] = {}
+        for name, latitude, longitude, population, alternates in settlements:
+            number = len(names)
+            names.append(name)
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+            populations.append(population)
+            for key in {normalize_name(alias) for alias in {name, *alternates}}:
+                by_name.setdefault(key, []).append(number)
+
+        self.names = names
+        self.latitudes = np.array(latitudes, dtype=np.float32)
+        self.longitudes = np.array(longitudes, dtype=np.float32)
+        self.populations = np.array(populations, dtype=np.int64)
+        self._by_name = by_name
+
+        # Узлы дерева: (lo, hi, ось, порог, левый, правый); у листа ось -1
+        self._points = _unit_vectors(self.latitudes, self.longitudes)
+        self._order = np.arange(len(names), dtype=np.int32)
+        self._nodes: List[Tuple[int, int, int, float, int, int]] = []
+        if names:
+            self._build_node(0, len(names))
+
+    def _build_node(self, lo: int, hi: int) -> int:
+        node = len(self._nodes)
+        self._nodes.append((lo, hi, -1, 0.0, -1, -1))
+        if hi - lo <= LEAF_SIZE:
+            return node
+        segment = self._points[lo:hi]
+        axis = int(np.argmax(segment.max(axis=0) - segment.min(axis=0)))
+        mid = (lo + hi) // 2
+        part = np.argpartition(segment[:, axis], mid - lo)
+        self._points[lo:hi] = segment[part]
+        self._order[lo:hi] = self._order[lo:hi][part]
+        split = float(self._points[mid, axis])
+        left = self._build_node(lo, mid)
+        right = self._build_node(mid, hi)
+        self._nodes[node] = (lo, hi, axis, split, left, right)
+        return node
+
+    def __len__(self):
+        return len(self.names)
+
+    def _settlement(self, number: int, distance_km: Optional[float] = None) -> Dict:
+        result = {
+            'name': self.names[number],
+            'latitude': round(float(self.latitudes[number]), 5),
+            'longitude': round(float(self.longitudes[number]), 5),
+            'population': int(self.populations[number])
+        }
+        if distance_km is not None:
+            result['distance_km'] = round(distance_km, 1)
+        return result
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[Dict]:
+        """Ближайший к точке населенный пункт"""
+        if not self._nodes:
+            return None
+        target = _unit_vectors([latitude], [longitude])[0]
+        best_distance, best = math.inf, -1
+        stack = [(0, 0.0)]  # узел и нижняя граница квадрата расстояния до него
+        while stack:
+            node, bound = stack.pop()
+            if bound >= best_distance:
+                continue
+            lo, hi, axis, split, left, right = self._nodes[node]
+            if axis < 0:
+                diff = self._points[lo:hi] - target
+                distances = np.einsum('ij,ij->i', diff, diff)
+                position = int(distances.argmin())
+                if distances[position] < best_distance:
+                    best_distance, best = float(distances[position]), lo + position
+                continue
+            delta = target[axis] - split
+            near, far = (left, right) if delta < 0 else (right, left)
+            stack.append((far, max(bound, delta * delta)))
+            stack.append((near, bound))
+        return self._settlement(int(self._order[best]), _chord_to_km(best_distance))
+
+    def find(self, name: str, near: Optional[Tuple[float, float]] = None) -> Optional[Dict]:
+        """Пункт по названию; из одноименных - ближайший к near, иначе самый крупный"""
+        numbers = self._by_name.get(normalize_name(name))
+        if not numbers:
+            return None
+        if near is not None and len(numbers) > 1:
+            target = _unit_vectors([near[0]], [near[1]])[0]
+            diff = _unit_vectors(self.latitudes[numbers], self.longitudes[numbers]) - target
+            return self._settlement(numbers[int(np.einsum('ij,ij->i', diff, diff).argmin())])
+        return self._settlement(max(numbers, key=lambda number: self.populations[number]))
+
+    def get_stats(self):
+        return {
+            'settlements': len(self.names),
+            'names': len(self._by_name),
+            'array_bytes': (self._points.nbytes + self._order.nbytes + self.latitudes.nbytes
+                            + self.longitudes.nbytes + self.populations.nbytes)
+        }
@@ -0,0 +1,54 @@
+# geo_index.py
+"""Сетка для поиска по радиусу.
+
+Поверхность разбита на ячейки GRID_CELL_DEG x GRID_CELL_DEG градусов; номер
+ячейки хранится в users.geo_cell. Поиск по радиусу берет ячейки, покрывающие
+круг, и проверяет точное расстояние только у анкет из этих ячеек, поэтому
+цена запроса зависит от радиуса, а не от числа городов в базе.
+
+При изменении GRID_CELL_DEG нужно пересчитать users.geo_cell.
+"""
+import math
+from typing import List, Optional
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GRID_CELL_DEG = 0.5
+GRID_ROWS = int(180 / GRID_CELL_DEG)
+GRID_COLS = int(360 / GRID_CELL_DEG)
+
+def cell_of(latitude: Optional[float], longitude: Optional[float]) -> Optional[int]:
+    if latitude is None or longitude is None:
+        return None
+    row = min(int((latitude + 90) // GRID_CELL_DEG), GRID_ROWS - 1)
+    col = int((longitude + 180) // GRID_CELL_DEG) % GRID_COLS
+    return row * GRID_COLS + col
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> List[int]:
+    """Ячейки, которые пересекает круг радиуса radius_km (с запасом по краям)"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    row_min = max(0, int((latitude - lat_delta + 90) // GRID_CELL_DEG))
+    row_max = min(GRID_ROWS - 1, int((latitude + lat_delta + 90) // GRID_CELL_DEG))
+
+    # Наибольший разброс долготы у сферического круга: asin(sin(r / R) / cos(lat))
+    angular = radius_km / EARTH_RADIUS_KM
+    if abs(latitude) + lat_delta >= 90 or angular >= math.pi / 2:
+        cols = range(GRID_COLS)
+    else:
+        ratio = math.sin(angular) / math.cos(math.radians(latitude))
+        lon_delta = 180 if ratio >= 1 else math.degrees(math.asin(ratio))
+        col_min = int((longitude - lon_delta + 180) // GRID_CELL_DEG)
+        col_max = int((longitude + lon_delta + 180) // GRID_CELL_DEG)
+        cols = sorted({col % GRID_COLS for col in range(col_min, col_max + 1)})
+    return [row * GRID_COLS + col for row in range(row_min, row_max + 1) for col in cols]
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Расстояния от точки до массива точек, км"""
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(latitudes.astype(np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(longitudes.astype(np.float64) - longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
@@ -0,0 +1,102 @@
+# interest_lsh.py
+"""MinHash и LSH по интересам для отбора кандидатов до полного расчета.
+
+Подпись MinHash - SIGNATURE_SIZE минимумов рангов интересов при фиксированных
+случайных перестановках словаря; значения подписей двух анкет совпадают с
+вероятностью, равной коэффициенту Жаккара их интересов. Подпись считается при
+записи анкеты и хранится в users.interests_minhash.
+
+Подпись режется на LSH_BANDS полос по LSH_ROWS значений; анкеты с одинаковой
+полосой попадают в одну корзину. Кандидат, совпавший хотя бы в одной полосе,
+с большой вероятностью имеет Жаккар выше (1 / LSH_BANDS) ** (1 / LSH_ROWS),
+около 0.35. Запрос читает только корзины своих полос, а не весь раздел.
+
+При изменении MINHASH_SEED или SIGNATURE_SIZE подписи в базе нужно пересчитать.
+"""
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from profile_codec import INTEREST_NAMES
+
+MINHASH_SEED = 20240601
+LSH_BANDS = 8
+LSH_ROWS = 2
+SIGNATURE_SIZE = LSH_BANDS * LSH_ROWS
+EMPTY_VALUE = 255  # подпись анкеты без интересов
+
+# Ранг каждого интереса в каждой из перестановок
+_RANKS = np.array([
+    np.random.default_rng(MINHASH_SEED + number).permutation(len(INTEREST_NAMES))
+    for number in range(SIGNATURE_SIZE)
+], dtype=np.uint8)
+
+def minhash_signature(interests_mask: int) -> bytes:
+    bits = [bit for bit in range(len(INTEREST_NAMES)) if interests_mask >> bit & 1]
+    if not bits:
+        return bytes([EMPTY_VALUE]) * SIGNATURE_SIZE
+    return _RANKS[:, bits].min(axis=1).tobytes()
+
+def _bands(signature: bytes) -> List[bytes]:
+    return [signature[band * LSH_ROWS:(band + 1) * LSH_ROWS] for band in range(LSH_BANDS)]
+
+class InterestLSH:
+    """Корзины LSH внутри групп (разделов индекса кандидатов).
+
+    Потокобезопасность обеспечивает владелец (CandidateIndex держит свою блокировку).
+    """
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[Hashable, int, bytes], set] = {}
+        self._members: Dict[int, Tuple[Hashable, bytes]] = {}  # telegram_id -> (группа, подпись)
+
+    def __len__(self):
+        return len(self._members)
+
+    def insert(self, telegram_id: int, group: Hashable, signature: bytes):
+        """Добавляет или переносит анкету; анкеты без интересов в корзины не попадают"""
+        self.remove(telegram_id)
+        if signature[0] == EMPTY_VALUE:
+            return
+        self._members[telegram_id] = (group, signature)
+        for band, values in enumerate(_bands(signature)):
+            self._buckets.setdefault((group, band, values), set()).add(telegram_id)
+
+    def remove(self, telegram_id: int):
+        member = self._members.pop(telegram_id, None)
+        if member is None:
+            return
+        group, signature = member
+        for band, values in enumerate(_bands(signature)):
+            key = (group, band, values)
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(telegram_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def query(self, groups: Iterable[Hashable], signature: bytes,
+              limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Анкеты из групп groups, совпавшие с подписью хотя бы в одной полосе.
+
+        Пары (telegram_id, число совпавших полос) - грубая оценка Жаккара;
+        с limit - столько пар с наибольшим числом совпадений.
+        """
+        if signature[0] == EMPTY_VALUE:
+            return []
+        bands = list(enumerate(_bands(signature)))
+        hits = Counter()
+        for group in groups:
+            for band, values in bands:
+                bucket = self._buckets.get((group, band, values))
+                if bucket:
+                    hits.update(bucket)
+        return hits.most_common(limit) if limit else list(hits.items())
+
+    def get_stats(self):
+        return {
+            'users': len(self._members),
+            'buckets': len(self._buckets),
+            'largest_bucket': max((len(bucket) for bucket in self._buckets.values()), default=0)
+        }
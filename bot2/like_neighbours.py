@@ -0,0 +1,109 @@
+# like_neighbours.py
+"""Похожие анкеты по лайкам: "кто лайкнул X, лайкал и Y".
+
+Лайки - разреженная матрица L (лайкнувший x анкета) в виде CSR и CSC
+(indptr + номера). Совместные лайки пары анкет - элемент L^T L: для блока
+анкет берутся их лайкнувшие (CSC), у каждого - строка его лайков (CSR), пары
+(анкета, соседняя анкета) сворачиваются np.bincount по ключу
+номер_в_блоке * число_анкет + сосед. Блок ограничен BLOCK_SIZE ячейками,
+поэтому память не зависит от числа анкет квадратично.
+
+Оценка пары - косинус столбцов L: совместные / sqrt(лайков X * лайков Y),
+так популярные анкеты не становятся соседями всех. Хранятся только top_k
+соседей каждой анкеты с не менее min_co_likes совместных лайков.
+"""
+import itertools
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from csr import take_rows
+
+BLOCK_SIZE = 4000000  # ячеек счетчика на блок анкет (int64, 32 МБ)
+
+def read_likes(rows: Iterable[Tuple[int, int]]) -> np.ndarray:
+    """Пары (from_user_id, to_user_id) из курсора без промежуточного списка строк"""
+    return np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковая память процесса (Linux: ru_maxrss в КБ); None, где модуля resource нет"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def _csr(rows: np.ndarray, columns: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """indptr и столбцы по строкам; внутри строки сохраняется исходный порядок"""
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr, columns[order].astype(np.int32)
+
+def item_neighbours(likers: np.ndarray, liked: np.ndarray, top_k: int = 20, min_co_likes: int = 2,
+                    max_likes_per_user: int = 500) -> Dict[str, np.ndarray]:
+    """Соседи каждой лайкнутой анкеты по совместным лайкам.
+
+    likers, liked - пары лайков в порядке их появления; у очень активных
+    пользователей учитываются только последние max_likes_per_user лайков:
+    вклад пользователя в L^T L растет как квадрат числа его лайков.
+    Возвращает столбцы user_id, neighbour_id, score, co_likes, отсортированные
+    по user_id и убыванию score.
+    """
+    items, liked_index = np.unique(liked, return_inverse=True)
+    users, liker_index = np.unique(likers, return_inverse=True)
+    item_count = len(items)
+
+    # CSR по лайкнувшим, затем отсечение старых лайков сверх лимита
+    user_indptr, user_items = _csr(liker_index, liked_index, len(users))
+    lengths = np.diff(user_indptr)
+    position = np.arange(len(user_items)) - np.repeat(user_indptr[:-1], lengths)
+    keep = position >= np.repeat(lengths - max_likes_per_user, lengths)
+    row_of = np.repeat(np.arange(len(users)), lengths)[keep]
+    user_items = user_items[keep]
+    user_indptr = np.zeros(len(users) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_of, minlength=len(users)), out=user_indptr[1:])
+
+    item_indptr, item_users = _csr(user_items, row_of, item_count)
+    like_counts = np.diff(item_indptr)
+
+    block = max(1, BLOCK_SIZE // max(item_count, 1))
+    result = {'user_id': [], 'neighbour_id': [], 'score': [], 'co_likes': []}
+    for start in range(0, item_count, block):
+        stop = min(start + block, item_count)
+        likers_in_block = item_users[item_indptr[start]:item_indptr[stop]]
+        owner = np.repeat(np.arange(stop - start), np.diff(item_indptr[start:stop + 1]))
+        indptr, positions = take_rows(user_indptr, likers_in_block)
+        owner = np.repeat(owner, np.diff(indptr))
+        neighbour = user_items[positions]
+
+        co_likes = np.bincount(owner * item_count + neighbour)
+        cells = np.flatnonzero(co_likes >= min_co_likes)
+        rows, columns = np.divmod(cells, item_count)
+        distinct = rows + start != columns
+        rows, columns, counts = rows[distinct], columns[distinct], co_likes[cells[distinct]]
+        scores = counts / np.sqrt(like_counts[rows + start] * like_counts[columns])
+
+        # Лучшие top_k в каждой строке: сортировка по (строка, -оценка) и номер внутри строки
+        order = np.lexsort((columns, -scores, rows))
+        rows, columns, counts, scores = rows[order], columns[order], counts[order], scores[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        top = rank < top_k
+        result['user_id'].append(items[rows[top] + start])
+        result['neighbour_id'].append(items[columns[top]])
+        result['score'].append(scores[top].astype(np.float32))
+        result['co_likes'].append(counts[top])
+
+    empty = {'user_id': np.int64, 'neighbour_id': np.int64, 'score': np.float32, 'co_likes': np.int64}
+    return {name: np.concatenate(parts) if parts else np.zeros(0, dtype=empty[name]) for name, parts in result.items()}
+
+def affinity_boost(neighbour_ids: Sequence[int], affinity: Sequence[float],
+                   telegram_ids: np.ndarray, bonus: float) -> np.ndarray:
+    """Добавка каждой анкете telegram_ids: 0..bonus пропорционально ее сходству с лайками зрителя"""
+    neighbour_ids = np.asarray(neighbour_ids, dtype=np.int64)
+    affinity = np.asarray(affinity, dtype=np.float64)
+    order = np.argsort(neighbour_ids)
+    neighbour_ids, affinity = neighbour_ids[order], affinity[order]
+    positions = np.minimum(np.searchsorted(neighbour_ids, telegram_ids), len(neighbour_ids) - 1)
+    found = neighbour_ids[positions] == telegram_ids
+    return np.where(found, affinity[positions] / affinity.max(), 0.0) * bonus
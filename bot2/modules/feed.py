@@ -0,0 +1,111 @@
+# feed.py
+"""Очередь анкет для ленты.
+
+Кандидаты для каждого пользователя заранее ранжируются и хранятся в таблице
+feed_queue, поэтому открытие ленты и свайпы только читают голову очереди.
+Поиск выполняет фоновая задача, когда в очереди остается меньше
+FEED_LOW_WATER анкет. Синхронно очередь заполняется только при холодном
+старте, когда она пуста. Рекомендации дня (modules/recommendations.py)
+ставятся в очередь сразу за текущей анкетой, раньше результатов поиска.
+"""
+import logging
+from telegram.ext import ContextTypes
+from database import adb
+from config import config
+from premium import premium_system
+
+logger = logging.getLogger(__name__)
+
+class FeedManager:
+    def __init__(self):
+        self.pending_refill = set()  # пользователи, которым нужно добрать очередь
+
+    async def _search_radius(self, user_id):
+        is_premium = await premium_system.check_premium_status(user_id)
+        return config.PREMIUM_SEARCH_RADIUS if is_premium else config.DEFAULT_SEARCH_RADIUS
+
+    async def refill(self, user_id):
+        """Добирает очередь до FEED_SIZE анкет; возвращает число добавленных"""
+        try:
+            queued = await adb.get_feed_size(user_id)
+            if queued >= config.FEED_SIZE:
+                return 0
+
+            # Сначала непросмотренные рекомендации дня, затем результаты поиска; в очередь
+            # идут только telegram_id, профили загружаются при показе
+            added = 0
+            if config.AI_MATCHING_ENABLED:
+                recommended = await adb.get_recommendation_ids(user_id, limit=config.MAX_DAILY_RECOMMENDATIONS)
+                added = await adb.push_feed(user_id, recommended, source='recommendation')
+
+            radius = await self._search_radius(user_id)
+            # Анкеты из очереди еще не просмотрены и снова придут из поиска - их пропустит push_feed
+            found = await adb.get_swipe_candidate_ids(user_id, limit=config.FEED_SIZE, radius_km=radius)
+            added += await adb.push_feed(user_id, found)
+            logger.debug(f"Feed refilled for user {user_id}: +{added} (was {queued})")
+            return added
+        except Exception as e:
+            logger.error(f"Error refilling feed for {user_id}: {e}")
+            return 0
+
+    async def open_feed(self, user_id):
+        """Размер очереди при открытии ленты; пустая очередь заполняется сразу"""
+        queued = await adb.get_feed_size(user_id)
+        if queued == 0:
+            await self.refill(user_id)
+            queued = await adb.get_feed_size(user_id)
+        elif queued < config.FEED_LOW_WATER:
+            self.pending_refill.add(user_id)
+        return queued
+
+    async def next_profile(self, user_id):
+        """Текущая анкета (голова очереди) и размер очереди; (None, 0) если анкет нет.
+
+        Кандидаты, которые успели стать неактивными или попали в бан, убираются
+        из очереди по дороге. Просмотр не записывается: голова показывается
+        снова, пока advance не снимет ее с очереди.
+        """
+        refilled = False
+        while True:
+            candidate_ids = await adb.get_feed(user_id)
+            if not candidate_ids:
+                if refilled or not await self.refill(user_id):
+                    return None, 0
+                refilled = True
+                continue
+
+            candidate_id = candidate_ids[0]
+            # get_users_many пропускает заблокированных
+            candidate = (await adb.get_users_many(candidate_ids)).get(candidate_id)
+            if candidate and candidate.get('is_active'):
+                queued = await adb.get_feed_size(user_id)
+                if queued < config.FEED_LOW_WATER:
+                    self.pending_refill.add(user_id)
+                return candidate, queued
+
+            await adb.pop_feed(user_id, candidate_id)
+
+    async def advance(self, user_id, candidate_id):
+        """Снимает показанную анкету с головы очереди.
+
+        Просмотр сюда не входит: его уже записали лайк, пропуск или жалоба.
+        """
+        remaining = await adb.pop_feed(user_id, candidate_id)
+        if remaining < config.FEED_LOW_WATER:
+            self.pending_refill.add(user_id)
+        return remaining
+
+    async def refill_pending(self, context: ContextTypes.DEFAULT_TYPE):
+        """Фоновая задача: добирает очереди, опустившиеся ниже FEED_LOW_WATER"""
+        try:
+            users = list(self.pending_refill)[:config.FEED_REFILL_MAX_USERS]
+            for user_id in users:
+                self.pending_refill.discard(user_id)
+                await self.refill(user_id)
+            if users:
+                logger.info(f"Feed refill: {len(users)} users, {len(self.pending_refill)} waiting")
+        except Exception as e:
+            logger.error(f"Error in feed refill job: {e}")
+
+# Глобальный экземпляр
+feed_manager = FeedManager()
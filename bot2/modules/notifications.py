@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
-from database import db
+from database import adb
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +35,7 @@ class SmartNotifications:
     async def send_engagement_notification(self, context: ContextTypes.DEFAULT_TYPE, user_id):
         """Отправляет уведомление-напоминание"""
         try:
-            user = db.get_user(user_id)
+            user = await adb.get_user(user_id)
             if not user or not user.get('is_active'):
                 return
             
@@ -75,7 +75,7 @@ class SmartNotifications:
     async def check_and_send_notifications(self, context: ContextTypes.DEFAULT_TYPE):
         """Проверяет и отправляет уведомления всем подходящим пользователям"""
         try:
-            all_users = db.get_all_users()
+            all_users = await adb.get_all_users()
             active_users = [user for user in all_users if user.get('is_active')]
             
             logger.info(f"Checking notifications for {len(active_users)} active users")
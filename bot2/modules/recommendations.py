@@ -0,0 +1,69 @@
+# recommendations.py
+"""Ежедневные рекомендации.
+
+Раз в сутки для каждого активного пользователя считаются
+MAX_DAILY_RECOMMENDATIONS самых совместимых анкет. Индекс кандидатов
+публикуется новым поколением снимка (snapshot_store) и считается в пуле
+процессов (recommendation_worker), которые видят только файлы снимка.
+Лента (modules/feed.py) показывает рекомендации раньше результатов поиска.
+"""
+import asyncio
+import logging
+import os
+
+from telegram.ext import ContextTypes
+
+from database import db
+from recommendation_worker import compute_recommendations
+from snapshot_store import SnapshotWriter
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class RecommendationEngine:
+    def __init__(self):
+        self._running = False
+        self.snapshot_root = config.SNAPSHOT_DIR or os.path.join(db.data_dir, 'snapshots')
+        self.snapshot_writer = SnapshotWriter(self.snapshot_root, keep_generations=config.SNAPSHOT_KEEP_GENERATIONS)
+
+    def build(self):
+        """Пересчет рекомендаций всех активных пользователей (блокирующий)"""
+        try:
+            cursor = db.pool.reader().execute("SELECT datetime('now')")
+            run_started_at = cursor.fetchone()[0]
+
+            columns, meta = db.candidate_index.export()
+            if not meta['rows']:
+                return None
+            if config.BIO_SIMILARITY_ENABLED:
+                columns.update(db.bio_vectors.export(columns['telegram_id']))
+            generation = self.snapshot_writer.publish(columns, meta)
+
+            stats = compute_recommendations(
+                self.snapshot_root, generation, config.RECOMMENDATIONS_WORKERS, db.compatibility_system.weights,
+                on_shard=db.save_recommendations, chunk_size=config.RECOMMENDATIONS_CHUNK_SIZE
+            )
+            stats['generation'] = generation
+            stats['purged'] = db.purge_recommendations(run_started_at)
+            logger.info(
+                f"Daily recommendations: {stats['users']} users, {stats['recommendations']} rows "
+                f"in {stats['seconds']}s ({stats['users_per_sec']} users/sec, {stats['workers']} workers)"
+            )
+            return stats
+        except Exception as e:
+            logger.error(f"Error building daily recommendations: {e}")
+            return None
+
+    async def run_daily(self, context: ContextTypes.DEFAULT_TYPE):
+        """Ночная задача JobQueue"""
+        if not config.AI_MATCHING_ENABLED or self._running:
+            return
+        self._running = True
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.build)
+        finally:
+            self._running = False
+
+# Глобальный экземпляр
+recommendation_engine = RecommendationEngine()
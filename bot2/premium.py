@@ -3,7 +3,7 @@ import logging
 from datetime import datetime, timedelta
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.constants import ParseMode
-from database import db
+from database import adb
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -38,37 +38,19 @@ class PremiumSystem:
             logger.error(f"❌ Критическая ошибка проверки подписки: {e}")
             return False
 
-    def activate_premium(self, telegram_id):
+    async def activate_premium(self, telegram_id):
         try:
             # ПРЕМИУМ НА 7 ДНЕЙ вместо 24 часов
             premium_until = (datetime.now() + timedelta(days=7)).isoformat()
             
-            cursor = db.connection.cursor()
-            cursor.execute("""
-                UPDATE users 
-                SET is_premium = 1, premium_until = ?, subscription_channel = ?
-                WHERE telegram_id = ?
-            """, (premium_until, self.subscription_channel, telegram_id))
-            db.connection.commit()
-            
-            cursor.execute("SELECT user_id FROM users WHERE telegram_id = ?", (telegram_id,))
-            result = cursor.fetchone()
-            user_id = result[0] if result else "неизвестен"
-            
-            logger.info(f"🎉 Премиум активирован для пользователя {telegram_id} (user_id: {user_id}) на 7 дней")
-            return True
+            return await adb.activate_premium(telegram_id, premium_until, self.subscription_channel)
         except Exception as e:
             logger.error(f"❌ Ошибка активации премиума: {e}")
             return False
 
-    def check_premium_status(self, telegram_id):
+    async def check_premium_status(self, telegram_id):
         try:
-            cursor = db.connection.cursor()
-            cursor.execute("""
-                SELECT is_premium, premium_until FROM users 
-                WHERE telegram_id = ?
-            """, (telegram_id,))
-            result = cursor.fetchone()
+            result = await adb.get_premium_status(telegram_id)
             
             if result and result[0] == 1 and result[1]:
                 try:
@@ -76,26 +58,17 @@ class PremiumSystem:
                     if premium_until > datetime.now():
                         return True
                     else:
-                        self.deactivate_premium(telegram_id)
+                        await self.deactivate_premium(telegram_id)
                 except ValueError:
-                    self.deactivate_premium(telegram_id)
+                    await self.deactivate_premium(telegram_id)
             return False
         except Exception as e:
             logger.error(f"Error checking premium status: {e}")
             return False
 
-    def deactivate_premium(self, telegram_id):
+    async def deactivate_premium(self, telegram_id):
         try:
-            cursor = db.connection.cursor()
-            cursor.execute("""
-                UPDATE users 
-                SET is_premium = 0, premium_until = NULL
-                WHERE telegram_id = ?
-            """, (telegram_id,))
-            db.connection.commit()
-            
-            logger.info(f"Premium deactivated for user {telegram_id}")
-            return True
+            return await adb.deactivate_premium(telegram_id)
         except Exception as e:
             logger.error(f"Error deactivating premium: {e}")
             return False
@@ -153,52 +126,41 @@ class PremiumSystem:
                 "💰 *Стоимость:* Бесплатно (по подписке)"
             )
 
-    def can_like_today(self, user_id):
+    def _daily_limit(self, is_premium, is_super_like=False):
+        if is_super_like:
+            # ПРЕМИУМ пользователи получают больше суперлайков
+            return config.SUPER_LIKES_PER_DAY * 3 if is_premium else config.SUPER_LIKES_PER_DAY
+        # ПРЕМИУМ пользователи получают неограниченные лайки
+        return 999999 if is_premium else config.FREE_LIKES_PER_DAY
+
+    async def get_daily_like_limit(self, user_id, is_super_like=False):
+        """Дневной лимит для атомарного списания в adb.process_like"""
         try:
-            db.reset_daily_likes()
-            
-            cursor = db.connection.cursor()
-            cursor.execute("""
-                SELECT likes_today, is_premium FROM users 
-                WHERE telegram_id = ?
-            """, (user_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                return False
-                
-            likes_today = result[0] or 0
-            is_premium = result[1]
-            
-            # ПРЕМИУМ пользователи получают неограниченные лайки
-            max_likes = 999999 if is_premium else config.FREE_LIKES_PER_DAY
-            
-            return likes_today < max_likes
+            is_premium = await self.check_premium_status(user_id)
+            return self._daily_limit(is_premium, is_super_like)
+        except Exception as e:
+            logger.error(f"Error getting like limit: {e}")
+            return 0
+
+    async def _has_like_quota(self, user_id, is_super_like=False):
+        """Осталась ли квота: тот же лимит и те же счетчики дня, что у списания в adb.process_like"""
+        counters = await adb.get_like_counters(user_id)
+        if not counters:
+            return False
+        limit = await self.get_daily_like_limit(user_id, is_super_like)
+        used = counters['super_likes_today' if is_super_like else 'likes_today'] or 0
+        return used < limit
+
+    async def can_like_today(self, user_id):
+        try:
+            return await self._has_like_quota(user_id)
         except Exception as e:
             logger.error(f"Error checking like limit: {e}")
             return False
 
-    def can_super_like_today(self, user_id):
+    async def can_super_like_today(self, user_id):
         try:
-            db.reset_daily_likes()
-            
-            cursor = db.connection.cursor()
-            cursor.execute("""
-                SELECT super_likes_today, is_premium FROM users 
-                WHERE telegram_id = ?
-            """, (user_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                return False
-                
-            super_likes_today = result[0] or 0
-            is_premium = result[1]
-            
-            # ПРЕМИУМ пользователи получают больше суперлайков
-            max_super_likes = config.SUPER_LIKES_PER_DAY * 3 if is_premium else config.SUPER_LIKES_PER_DAY
-            
-            return super_likes_today < max_super_likes
+            return await self._has_like_quota(user_id, is_super_like=True)
         except Exception as e:
             logger.error(f"Error checking super like limit: {e}")
             return False
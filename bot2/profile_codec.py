@@ -0,0 +1,200 @@
+# profile_codec.py
+"""Компактное кодирование полей анкеты.
+
+Интересы - фиксированный словарь из 16 пунктов, поэтому набор интересов
+хранится битовой маской (столбец users.interests_mask) рядом с JSON.
+Пересечение и объединение считаются побитово, размер - через popcount.
+"""
+from typing import Iterable, List
+
+INTERESTS_LIST = [
+    "🎵 Музыка", "🎨 Искусство", "🏀 Спорт", "📚 Книги",
+    "🎮 Игры", "✈️ Путешествия", "🍳 Готовка", "🎬 Кино",
+    "💻 IT", "📸 Фотография", "🐶 Животные", "🏋️ Фитнес",
+    "🧘 Йога", "🎯 Настолки", "🚗 Авто", "🌳 Природа"
+]
+
+# В базе интересы хранятся без эмодзи: "Музыка", "IT", ...
+INTEREST_NAMES = [interest.split(' ', 1)[1] for interest in INTERESTS_LIST]
+INTEREST_BITS = {name: 1 << bit for bit, name in enumerate(INTEREST_NAMES)}
+INTEREST_BITS.update({interest: 1 << bit for bit, interest in enumerate(INTERESTS_LIST)})
+
+RARE_INTERESTS = ['Настолки', 'Йога', 'Искусство', 'IT', 'Фотография']
+
+try:
+    bit_count = int.bit_count
+except AttributeError:  # Python < 3.10
+    def bit_count(mask: int) -> int:
+        return bin(mask).count('1')
+
+def normalize_interest(interest: str) -> str:
+    """Название интереса без эмодзи; незнакомые значения возвращаются как есть"""
+    bit = INTEREST_BITS.get(interest)
+    if bit is None:
+        return interest
+    return INTEREST_NAMES[bit.bit_length() - 1]
+
+def encode_interests(interests: Iterable[str]) -> int:
+    """Маска интересов; значения вне словаря пропускаются"""
+    mask = 0
+    for interest in interests or []:
+        mask |= INTEREST_BITS.get(interest, 0)
+    return mask
+
+def decode_interests(mask: int) -> List[str]:
+    return [name for bit, name in enumerate(INTEREST_NAMES) if mask >> bit & 1]
+
+RARE_INTERESTS_MASK = encode_interests(RARE_INTERESTS)
+
+# Коды признаков совместимости: 0 - не указано или значение вне словаря,
+# иначе номер в списке + 1. Коды считаются один раз при записи анкеты.
+RELATIONSHIP_GOAL_NAMES = [
+    'Серьезные отношения', 'Дружба и общение', 'Романтические встречи',
+    'Новые знакомства', 'Еще не определился(ась)'
+]
+LIFESTYLE_NAMES = [
+    'Активный спортсмен', 'Учеба и развитие', 'Работа и карьера',
+    'Творческий поиск', 'Спокойный и размеренный', 'Вечеринки и тусовки'
+]
+HABITS_NAMES = [
+    'Не курю и не пью', 'Иногда выпиваю', 'Курю иногда', 'Люблю вечеринки', 'Курю регулярно'
+]
+ZODIAC_NAMES = [
+    'Овен', 'Телец', 'Близнецы', 'Рак', 'Лев', 'Дева',
+    'Весы', 'Скорпион', 'Стрелец', 'Козерог', 'Водолей', 'Рыбы'
+]
+# Порядок важен при равенстве совпадений: побеждает первый тип
+PERSONALITY_NAMES = ['active', 'creative', 'intellectual', 'calm']
+
+PERSONALITY_WORDS = [
+    {'спорт', 'фитнес', 'путешествия', 'активный', 'танцы', 'бег', 'тренировки'},
+    {'искусство', 'творчество', 'музыка', 'рисование', 'фотография', 'дизайн'},
+    {'книги', 'наука', 'программирование', 'it', 'образование', 'изучение'},
+    {'отдых', 'семья', 'дом', 'уют', 'спокойствие', 'природа'}
+]
+
+def _build_matrix(names, scores, default):
+    """Таблица (len(names)+1)^2 по кодам; строка и столбец 0 - значение по умолчанию"""
+    size = len(names) + 1
+    matrix = [[default] * size for _ in range(size)]
+    for i, name1 in enumerate(names, start=1):
+        for j, name2 in enumerate(names, start=1):
+            matrix[i][j] = scores[name1][name2]
+    return matrix
+
+GOALS_MATRIX = _build_matrix(RELATIONSHIP_GOAL_NAMES, {
+    'Серьезные отношения': {
+        'Серьезные отношения': 95, 'Дружба и общение': 40, 'Романтические встречи': 70,
+        'Новые знакомства': 50, 'Еще не определился(ась)': 60
+    },
+    'Дружба и общение': {
+        'Серьезные отношения': 40, 'Дружба и общение': 90, 'Романтические встречи': 60,
+        'Новые знакомства': 75, 'Еще не определился(ась)': 70
+    },
+    'Романтические встречи': {
+        'Серьезные отношения': 70, 'Дружба и общение': 60, 'Романтические встречи': 85,
+        'Новые знакомства': 65, 'Еще не определился(ась)': 70
+    },
+    'Новые знакомства': {
+        'Серьезные отношения': 50, 'Дружба и общение': 75, 'Романтические встречи': 65,
+        'Новые знакомства': 80, 'Еще не определился(ась)': 75
+    },
+    'Еще не определился(ась)': {
+        'Серьезные отношения': 60, 'Дружба и общение': 70, 'Романтические встречи': 70,
+        'Новые знакомства': 75, 'Еще не определился(ась)': 70
+    }
+}, default=50)
+
+LIFESTYLE_MATRIX = _build_matrix(LIFESTYLE_NAMES, {
+    'Активный спортсмен': {
+        'Активный спортсмен': 90, 'Учеба и развитие': 65, 'Работа и карьера': 55,
+        'Творческий поиск': 70, 'Спокойный и размеренный': 45, 'Вечеринки и тусовки': 75
+    },
+    'Учеба и развитие': {
+        'Активный спортсмен': 65, 'Учеба и развитие': 85, 'Работа и карьера': 75,
+        'Творческий поиск': 80, 'Спокойный и размеренный': 70, 'Вечеринки и тусовки': 55
+    },
+    'Работа и карьера': {
+        'Активный спортсмен': 55, 'Учеба и развитие': 75, 'Работа и карьера': 80,
+        'Творческий поиск': 65, 'Спокойный и размеренный': 70, 'Вечеринки и тусовки': 50
+    },
+    'Творческий поиск': {
+        'Активный спортсмен': 70, 'Учеба и развитие': 80, 'Работа и карьера': 65,
+        'Творческий поиск': 90, 'Спокойный и размеренный': 75, 'Вечеринки и тусовки': 80
+    },
+    'Спокойный и размеренный': {
+        'Активный спортсмен': 45, 'Учеба и развитие': 70, 'Работа и карьера': 70,
+        'Творческий поиск': 75, 'Спокойный и размеренный': 85, 'Вечеринки и тусовки': 40
+    },
+    'Вечеринки и тусовки': {
+        'Активный спортсмен': 75, 'Учеба и развитие': 55, 'Работа и карьера': 50,
+        'Творческий поиск': 80, 'Спокойный и размеренный': 40, 'Вечеринки и тусовки': 95
+    }
+}, default=50)
+
+HABITS_MATRIX = _build_matrix(HABITS_NAMES, {
+    'Не курю и не пью': {
+        'Не курю и не пью': 95, 'Иногда выпиваю': 60, 'Курю иногда': 35,
+        'Люблю вечеринки': 40, 'Курю регулярно': 25
+    },
+    'Иногда выпиваю': {
+        'Не курю и не пью': 60, 'Иногда выпиваю': 80, 'Курю иногда': 55,
+        'Люблю вечеринки': 70, 'Курю регулярно': 45
+    },
+    'Курю иногда': {
+        'Не курю и не пью': 35, 'Иногда выпиваю': 55, 'Курю иногда': 85,
+        'Люблю вечеринки': 60, 'Курю регулярно': 75
+    },
+    'Люблю вечеринки': {
+        'Не курю и не пью': 40, 'Иногда выпиваю': 70, 'Курю иногда': 60,
+        'Люблю вечеринки': 90, 'Курю регулярно': 65
+    },
+    'Курю регулярно': {
+        'Не курю и не пью': 25, 'Иногда выпиваю': 45, 'Курю иногда': 75,
+        'Люблю вечеринки': 65, 'Курю регулярно': 90
+    }
+}, default=50)
+
+# Код 0 - пустое описание
+PERSONALITY_MATRIX = _build_matrix(PERSONALITY_NAMES, {
+    'active': {'active': 85, 'creative': 75, 'intellectual': 60, 'calm': 55},
+    'creative': {'active': 75, 'creative': 90, 'intellectual': 80, 'calm': 70},
+    'intellectual': {'active': 60, 'creative': 80, 'intellectual': 85, 'calm': 75},
+    'calm': {'active': 55, 'creative': 70, 'intellectual': 75, 'calm': 90}
+}, default=40)
+
+def _code(names, value) -> int:
+    try:
+        return names.index(value) + 1
+    except ValueError:
+        return 0
+
+def personality_code(bio: str) -> int:
+    """Тип личности по ключевым словам описания; без совпадений - 'calm'"""
+    if not bio:
+        return 0
+    bio_words = set(bio.lower().split())
+    scores = [len(bio_words & words) for words in PERSONALITY_WORDS]
+    best = max(scores)
+    if best == 0:
+        return PERSONALITY_NAMES.index('calm') + 1
+    return scores.index(best) + 1
+
+def profile_features(user) -> dict:
+    """Признаки совместимости, которые хранятся в анкете рядом с исходными полями"""
+    return {
+        'goal_code': _code(RELATIONSHIP_GOAL_NAMES, user.get('relationship_goal')),
+        'lifestyle_code': _code(LIFESTYLE_NAMES, user.get('lifestyle')),
+        'habits_code': _code(HABITS_NAMES, user.get('habits')),
+        'zodiac_code': _code(ZODIAC_NAMES, user.get('zodiac')),
+        'personality_code': personality_code(user.get('bio') or ''),
+        'interests_mask': encode_interests(user.get('interests', []))
+    }
+
+def user_features(user) -> dict:
+    """Сохраненные коды анкеты; для анкет без них (например, из регистрации) - на лету"""
+    if user.get('goal_code') is not None and user.get('interests_mask') is not None:
+        return user
+    return profile_features(user)
+
+FEATURE_COLUMNS = ['goal_code', 'lifestyle_code', 'habits_code', 'zodiac_code', 'personality_code']
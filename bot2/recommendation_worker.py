@@ -0,0 +1,187 @@
+# recommendation_worker.py
+"""Расчет ежедневных рекомендаций в пуле процессов.
+
+Процессы пула работают только со снимком индекса кандидатов (snapshot_store):
+отображают его через mmap, получают номер поколения и диапазон строк порции и
+возвращают готовые строки для таблицы recommendations. Модуль не импортирует
+database, поэтому процесс пула не открывает базу, не запускает потоки записи и
+не загружает индексы - память пула растет только на размер кода и порции.
+
+Пул живет в отдельном процессе `python -m recommendation_worker`: fork из
+процесса бота с работающими потоками может зависнуть на захваченных в момент
+fork блокировках, а процессы spawn и forkserver перед первой задачей заново
+выполняют главный модуль родителя - у бота это bot.py вместе с database.
+Главный модуль отдельного процесса - этот модуль, он ничего не открывает при
+импорте. Задание передается через stdin, готовые порции возвращаются через
+stdout (pickle).
+"""
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from batch_scoring import FEATURE_ARRAYS, rank_arrays
+from bio_vectors import csr_similarity
+from csr import take_rows
+from candidate_index import swipe_partitions
+from geo_index import covering_cells, haversine_km
+from snapshot_store import SnapshotReader
+from config import config
+
+_reader: Optional[SnapshotReader] = None
+_layout = None  # (поколение, раздел каждой строки, номер раздела по ключу)
+
+def _init_worker(root):
+    global _reader, _layout
+    _reader = SnapshotReader(root)
+    _layout = None
+
+def _snapshot_layout(snapshot):
+    global _layout
+    if _layout is None or _layout[0] != snapshot.generation:
+        offsets = np.asarray(snapshot.columns['partition_offsets'])
+        partition_of_row = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        lookup = {tuple(key): number for number, key in enumerate(snapshot.meta['partitions'])}
+        _layout = (snapshot.generation, partition_of_row, lookup)
+    return _layout[1], _layout[2]
+
+def _recommend_shard(generation, start, stop, top_n, min_score, age_range, radii, weights):
+    """Рекомендации для строк start:stop снимка; выполняется в процессе пула"""
+    snapshot = _reader.open(generation)
+    columns = snapshot.columns
+    offsets = columns['partition_offsets']
+    telegram_ids = columns['telegram_id']
+    latitudes = columns['latitude']
+    longitudes = columns['longitude']
+    partition_of_row, lookup = _snapshot_layout(snapshot)
+    partitions = snapshot.meta['partitions']
+    cities = snapshot.meta.get('cities', [])
+    city_codes = columns['city_code']
+
+    rows = []
+    for index in range(start, stop):
+        place, gender, target_gender = partitions[partition_of_row[index]]
+        # Как в Database._search_candidates: ячейки вокруг анкеты и раздел ее города
+        radius_km = radii[1] if columns['is_premium'][index] else radii[0]
+        center = (float(latitudes[index]), float(longitudes[index])) if isinstance(place, int) else None
+        city = cities[city_codes[index]] if city_codes[index] >= 0 else None
+        places = (covering_cells(center[0], center[1], radius_km) if center else []) + [city if center else place]
+        keys = swipe_partitions({'gender': gender, 'target_gender': target_gender}, places)
+        numbers = [number for number in (lookup.get(tuple(key)) for key in keys) if number is not None]
+        if not numbers:
+            continue
+
+        viewer_id = int(telegram_ids[index])
+        viewer = {name: int(columns[name][index]) for name in FEATURE_ARRAYS}
+        candidates = np.concatenate([np.arange(offsets[number], offsets[number + 1]) for number in numbers])
+        # Радиус - только для ячеек, у анкет из раздела города координат нет
+        in_cell = np.concatenate([np.full(offsets[number + 1] - offsets[number], isinstance(partitions[number][0], int))
+                                  for number in numbers])
+        keep = telegram_ids[candidates] != viewer_id
+        age = viewer['age']
+        if age:
+            ages = columns['age'][candidates]
+            keep &= (ages >= age - age_range) & (ages <= age + age_range)
+        if center:
+            keep &= ~in_cell | (haversine_km(center[0], center[1], latitudes[candidates], longitudes[candidates])
+                                <= radius_km)
+        candidates = candidates[keep]
+        if not len(candidates):
+            continue
+
+        # Между разделами - тот же порядок, что у выдачи поиска
+        order = np.lexsort((-columns['created_at'][candidates],
+                            -columns['trust_score'][candidates].astype(np.int64)))
+        candidates = candidates[order]
+
+        arrays = {name: columns[name][candidates] for name in FEATURE_ARRAYS}
+        if 'bio_indptr' in columns:
+            # Векторы описаний - строки CSR снимка, как BioVectorStore.similarity_many
+            bio_indptr = columns['bio_indptr']
+            viewer_terms = slice(bio_indptr[index], bio_indptr[index + 1])
+            indptr, positions = take_rows(bio_indptr, candidates)
+            arrays['bio_similarity'] = csr_similarity(
+                columns['bio_indices'][viewer_terms], columns['bio_weights'][viewer_terms],
+                indptr, columns['bio_indices'][positions], columns['bio_weights'][positions]
+            )
+        order, scores = rank_arrays(viewer, arrays, weights, top_k=top_n, min_score=min_score)
+        for rank, (position, score) in enumerate(zip(order, scores), start=1):
+            rows.append((viewer_id, int(telegram_ids[candidates[position]]), int(score), rank))
+    return telegram_ids[start:stop].tolist(), rows
+
+def compute_recommendations(root: str, generation: str, workers: int, weights: Dict[str, float],
+                            on_shard: Optional[Callable] = None, chunk_size: int = 500) -> Dict:
+    """Считает рекомендации для всех строк поколения generation в пуле из workers процессов.
+
+    on_shard(user_ids, rows) вызывается в основном процессе по мере готовности порций.
+    """
+    started = time.perf_counter()
+    total_users = len(SnapshotReader(root).open(generation))
+    total_rows = 0
+    job = {
+        'root': root,
+        'generation': generation,
+        'workers': workers,
+        'chunk_size': chunk_size,
+        'args': (config.MAX_DAILY_RECOMMENDATIONS, config.MIN_COMPATIBILITY_SCORE, config.AGE_RANGE,
+                 (config.DEFAULT_SEARCH_RADIUS, config.PREMIUM_SEARCH_RADIUS), weights)
+    }
+
+    process = subprocess.Popen([sys.executable, '-m', __name__], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        pickle.dump(job, process.stdin)
+        process.stdin.close()
+        while True:
+            try:
+                user_ids, rows = pickle.load(process.stdout)
+            except EOFError:
+                break
+            total_rows += len(rows)
+            if on_shard:
+                on_shard(user_ids, rows)
+        if process.wait() != 0:
+            raise RuntimeError(f"Recommendation worker exited with code {process.returncode}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'users': total_users,
+        'recommendations': total_rows,
+        'workers': workers,
+        'seconds': round(elapsed, 2),
+        'users_per_sec': round(total_users / elapsed, 1) if elapsed else 0.0
+    }
+
+def main():
+    """Процесс расчета: задание из stdin, порции (user_ids, rows) в stdout по мере готовности"""
+    job = pickle.load(sys.stdin.buffer)
+    output = sys.stdout.buffer
+    # stdout занят порциями, случайный вывод уходит в stderr
+    sys.stdout = sys.stderr
+
+    generation = job['generation']
+    chunk_size = job['chunk_size']
+    total_users = len(SnapshotReader(job['root']).open(generation))
+    with ProcessPoolExecutor(max_workers=job['workers'], mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(job['root'],)) as executor:
+        futures = [
+            executor.submit(_recommend_shard, generation, start, min(start + chunk_size, total_users), *job['args'])
+            for start in range(0, total_users, chunk_size)
+        ]
+        for future in as_completed(futures):
+            pickle.dump(future.result(), output, protocol=pickle.HIGHEST_PROTOCOL)
+            output.flush()
+
+if __name__ == '__main__':
+    main()
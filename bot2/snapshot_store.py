@@ -0,0 +1,120 @@
+# snapshot_store.py
+"""Снимки столбцов NumPy на диске для нескольких процессов.
+
+Поколение - каталог gen-NNNNNN с файлом .npy на каждый столбец и meta.json.
+Файл CURRENT указывает на последнее поколение и заменяется через os.replace,
+поэтому читатель видит либо старое, либо новое поколение целиком. Читатели
+открывают столбцы через np.load(mmap_mode='r'): страницы файла общие для всех
+процессов в кэше ОС, и память не растет с числом процессов. Новое поколение
+подхватывается при следующем обращении, без перезапуска процесса.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+POINTER_FILE = 'CURRENT'
+
+class Snapshot:
+    def __init__(self, generation: str, columns: Dict[str, np.ndarray], meta: Dict):
+        self.generation = generation
+        self.columns = columns
+        self.meta = meta
+
+    def __len__(self):
+        return int(self.meta.get('rows', 0))
+
+def _open_generation(root: str, generation: str) -> Snapshot:
+    path = os.path.join(root, generation)
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as meta_file:
+        meta = json.load(meta_file)
+    columns = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+        for name in meta['columns']
+    }
+    return Snapshot(generation, columns, meta)
+
+class SnapshotWriter:
+    def __init__(self, root: str, keep_generations: int = 2):
+        self.root = root
+        self.keep_generations = keep_generations
+        self._lock = threading.Lock()
+
+    def _generations(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if name.startswith('gen-') and not name.endswith('.tmp'))
+
+    def publish(self, columns: Dict[str, np.ndarray], meta: Optional[Dict] = None) -> str:
+        """Записывает новое поколение и атомарно переключает на него CURRENT"""
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            generations = self._generations()
+            number = int(generations[-1][4:]) + 1 if generations else 1
+            generation = f'gen-{number:06d}'
+            tmp_path = os.path.join(self.root, generation + '.tmp')
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+
+            for name, column in columns.items():
+                np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(column), allow_pickle=False)
+            meta = dict(meta or {})
+            meta.update({'columns': list(columns), 'created_at': time.time()})
+            with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as meta_file:
+                json.dump(meta, meta_file, ensure_ascii=False)
+
+            os.replace(tmp_path, os.path.join(self.root, generation))
+            pointer_tmp = os.path.join(self.root, POINTER_FILE + '.tmp')
+            with open(pointer_tmp, 'w', encoding='utf-8') as pointer_file:
+                pointer_file.write(generation)
+                pointer_file.flush()
+                os.fsync(pointer_file.fileno())
+            os.replace(pointer_tmp, os.path.join(self.root, POINTER_FILE))
+
+            self._cleanup(generation)
+            return generation
+
+    def _cleanup(self, current):
+        """Удаляет старые поколения; открытые читателями файлы остаются доступны до закрытия (POSIX)"""
+        for generation in self._generations()[:-self.keep_generations]:
+            if generation == current:
+                continue
+            try:
+                shutil.rmtree(os.path.join(self.root, generation))
+            except OSError as e:
+                # Windows не даст удалить отображенный файл - попробуем в следующий раз
+                logger.debug(f"Snapshot generation {generation} not removed: {e}")
+
+class SnapshotReader:
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Snapshot] = None
+
+    def _current_generation(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, POINTER_FILE), encoding='utf-8') as pointer_file:
+                return pointer_file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def get(self) -> Optional[Snapshot]:
+        """Текущее поколение; при смене CURRENT отображается новое"""
+        generation = self._current_generation()
+        if generation is None:
+            return None
+        return self.open(generation)
+
+    def open(self, generation: str) -> Snapshot:
+        """Конкретное поколение (например, то, по которому разбиты задачи пула)"""
+        with self._lock:
+            if self._snapshot is None or self._snapshot.generation != generation:
+                self._snapshot = _open_generation(self.root, generation)
+            return self._snapshot
@@ -0,0 +1,170 @@
+-- Схема базы до первой миграции (create_tables и create_indexes исходной версии).
+-- Служит отправной точкой для tests/test_migrations.py, не менять.
+
+CREATE TABLE IF NOT EXISTS blocked_users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    telegram_id INTEGER UNIQUE NOT NULL,
+    user_id TEXT NOT NULL,
+    blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    blocked_until TEXT,
+    ban_type TEXT DEFAULT '7days',
+    reason TEXT
+);
+
+CREATE TABLE IF NOT EXISTS user_agreements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER UNIQUE NOT NULL,
+    accepted_terms BOOLEAN DEFAULT FALSE,
+    accepted_privacy BOOLEAN DEFAULT FALSE,
+    accepted_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    telegram_id INTEGER UNIQUE NOT NULL,
+    user_id TEXT UNIQUE NOT NULL,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    name TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    gender TEXT NOT NULL,
+    target_gender TEXT NOT NULL,
+    bio TEXT NOT NULL,
+    interests TEXT DEFAULT '[]',
+    zodiac TEXT,
+    relationship_goal TEXT,
+    lifestyle TEXT,
+    habits TEXT,
+    photos TEXT NOT NULL DEFAULT '[]',
+    latitude REAL,
+    longitude REAL,
+    city TEXT,
+    is_active BOOLEAN DEFAULT TRUE,
+    is_premium BOOLEAN DEFAULT FALSE,
+    premium_until TEXT,
+    subscription_channel TEXT,
+    referral_code TEXT UNIQUE,
+    referred_by INTEGER,
+    likes_today INTEGER DEFAULT 0,
+    super_likes_today INTEGER DEFAULT 0,
+    last_like_reset TEXT DEFAULT CURRENT_TIMESTAMP,
+    trust_score INTEGER DEFAULT 50,
+    language TEXT DEFAULT 'ru',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS viewed_profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    viewer_id INTEGER NOT NULL,
+    viewed_id INTEGER NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(viewer_id, viewed_id)
+);
+
+CREATE TABLE IF NOT EXISTS likes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    from_user_id INTEGER NOT NULL,
+    to_user_id INTEGER NOT NULL,
+    is_super_like BOOLEAN DEFAULT FALSE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(from_user_id, to_user_id)
+);
+
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user1_id INTEGER NOT NULL,
+    user2_id INTEGER NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user1_id, user2_id)
+);
+
+CREATE TABLE IF NOT EXISTS like_notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    from_user_id INTEGER NOT NULL,
+    to_user_id INTEGER NOT NULL,
+    is_mutual BOOLEAN DEFAULT FALSE,
+    is_super_like BOOLEAN DEFAULT FALSE,
+    is_sent BOOLEAN DEFAULT FALSE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    from_user_id INTEGER NOT NULL,
+    to_user_id INTEGER NOT NULL,
+    message_text TEXT NOT NULL,
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    from_user_id INTEGER NOT NULL,
+    reported_user_id INTEGER NOT NULL,
+    reported_user_user_id TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    admin_action TEXT,
+    admin_id INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS referrals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    referrer_id INTEGER NOT NULL,
+    referred_id INTEGER NOT NULL,
+    bonus_applied BOOLEAN DEFAULT FALSE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(referred_id)
+);
+
+CREATE TABLE IF NOT EXISTS profile_views (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    viewer_id INTEGER NOT NULL,
+    viewed_id INTEGER NOT NULL,
+    view_count INTEGER DEFAULT 1,
+    last_viewed TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(viewer_id, viewed_id)
+);
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    likes_given INTEGER DEFAULT 0,
+    likes_received INTEGER DEFAULT 0,
+    views_given INTEGER DEFAULT 0,
+    views_received INTEGER DEFAULT 0,
+    UNIQUE(user_id, date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
+
+CREATE INDEX IF NOT EXISTS idx_users_city ON users(city);
+
+CREATE INDEX IF NOT EXISTS idx_users_is_active ON users(is_active);
+
+CREATE INDEX IF NOT EXISTS idx_users_gender ON users(gender);
+
+CREATE INDEX IF NOT EXISTS idx_users_target_gender ON users(target_gender);
+
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
+
+CREATE INDEX IF NOT EXISTS idx_likes_from_user ON likes(from_user_id);
+
+CREATE INDEX IF NOT EXISTS idx_likes_to_user ON likes(to_user_id);
+
+CREATE INDEX IF NOT EXISTS idx_viewed_profiles_viewer ON viewed_profiles(viewer_id);
+
+CREATE INDEX IF NOT EXISTS idx_viewed_profiles_viewed ON viewed_profiles(viewed_id);
+
+CREATE INDEX IF NOT EXISTS idx_matches_user1 ON matches(user1_id);
+
+CREATE INDEX IF NOT EXISTS idx_matches_user2 ON matches(user2_id);
+
+CREATE INDEX IF NOT EXISTS idx_users_premium ON users(is_premium);
+
+CREATE INDEX IF NOT EXISTS idx_users_trust_score ON users(trust_score);
@@ -0,0 +1,53 @@
+# conftest.py
+"""Общие фикстуры тестов.
+
+Импорт database создает глобальный Database(), поэтому путь к базе
+переводится во временный каталог до первого импорта: рабочая
+data/tochkasvoda.db тестами не открывается.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from profile_codec import INTEREST_NAMES
+
+_scratch_dir = tempfile.mkdtemp(prefix='tests-db-')
+config.DATABASE_PATH = os.path.join(_scratch_dir, 'global.db')
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+@pytest.fixture
+def database(tmp_path):
+    """Отдельная база на каждый тест"""
+    from database import Database
+
+    instance = Database(str(tmp_path / 'test.db'))
+    yield instance
+    instance.close()
+
+@pytest.fixture
+def make_user(database):
+    """Создает анкету с разумными значениями по умолчанию"""
+    def _make_user(telegram_id, **fields):
+        user_data = {
+            'telegram_id': telegram_id,
+            'name': f'User{telegram_id}',
+            'age': 25,
+            'gender': 'Женский' if telegram_id % 2 else 'Мужской',
+            'target_gender': '💝 Не важно',
+            'bio': 'люблю книги, горы и долгие прогулки',
+            'interests': INTEREST_NAMES[:2],
+            'photos': ['photo'],
+            'city': config.MAIN_CITY,
+        }
+        user_data.update(fields)
+        assert database.create_user(user_data)
+        return database.get_user(telegram_id)
+    return _make_user
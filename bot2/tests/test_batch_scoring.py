@@ -0,0 +1,60 @@
+# test_batch_scoring.py
+"""Пакетный расчет совместимости совпадает со скалярным"""
+import random
+
+import numpy as np
+import pytest
+
+from batch_scoring import profiles_to_arrays, score_arrays, rank_arrays
+from bio_vectors import BioVectorStore
+from database import AdvancedCompatibilitySystem
+from profile_codec import (
+    INTEREST_NAMES, RELATIONSHIP_GOAL_NAMES, LIFESTYLE_NAMES, HABITS_NAMES, ZODIAC_NAMES, PERSONALITY_WORDS
+)
+
+BIO_WORDS = sorted(set().union(*PERSONALITY_WORDS)) + ['привет', 'люблю', 'гулять', 'кофе', 'горы']
+
+def _random_profiles(count, seed):
+    rng = random.Random(seed)
+
+    def pick(names):
+        # Пустое значение и незнакомая строка получают код 0
+        return rng.choice(names + [None, 'Другое'])
+
+    profiles = []
+    for telegram_id in range(1, count + 1):
+        profiles.append({
+            'telegram_id': telegram_id,
+            'age': rng.randint(18, 45),
+            'interests': rng.sample(INTEREST_NAMES, rng.randint(0, 6)),
+            'relationship_goal': pick(RELATIONSHIP_GOAL_NAMES),
+            'lifestyle': pick(LIFESTYLE_NAMES),
+            'habits': pick(HABITS_NAMES),
+            'zodiac': pick(ZODIAC_NAMES),
+            'bio': ' '.join(rng.choice(BIO_WORDS) for _ in range(rng.randint(0, 10))),
+        })
+    return profiles
+
+@pytest.mark.parametrize('with_bio', [False, True])
+def test_batch_matches_scalar(with_bio):
+    profiles = _random_profiles(300, seed=15)
+    system = AdvancedCompatibilitySystem()
+    arrays = profiles_to_arrays(profiles)
+    telegram_ids = np.array([profile['telegram_id'] for profile in profiles])
+
+    if with_bio:
+        store = BioVectorStore()
+        store.rebuild((profile['telegram_id'], profile['bio']) for profile in profiles)
+        system.bio_vectors = store
+
+    for viewer in profiles[:40]:
+        if with_bio:
+            arrays['bio_similarity'] = store.similarity_many(viewer['telegram_id'], telegram_ids)
+        scalar = [system.calculate_advanced_compatibility(viewer, profile)['overall'] for profile in profiles]
+        assert score_arrays(viewer, arrays, system.weights).tolist() == scalar
+
+        order, scores = rank_arrays(viewer, arrays, system.weights, top_k=20, min_score=40)
+        expected = sorted((index for index in range(len(profiles)) if scalar[index] >= 40),
+                          key=lambda index: -scalar[index])[:20]
+        assert order.tolist() == expected
+        assert scores.tolist() == [scalar[index] for index in expected]
@@ -0,0 +1,113 @@
+# test_bio_vectors.py
+"""TF-IDF описаний, косинусная схожесть и согласованность хранилища с базой"""
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from bio_vectors import BioVectorStore, tokenize
+
+BIOS = {
+    1: 'Люблю книги и горы, книгами зачитываюсь',
+    2: 'горы, походы и книги',
+    3: 'музыка и кино по вечерам',
+    4: 'горы горы горы',
+    5: 'и или да',
+}
+
+def _dense_tfidf(bios):
+    """Эталон: (1 + log tf) * idf со сглаживанием, нормировка по L2"""
+    documents = {telegram_id: Counter(tokenize(bio)) for telegram_id, bio in bios.items()}
+    documents = {telegram_id: terms for telegram_id, terms in documents.items() if terms}
+    df = Counter()
+    for terms in documents.values():
+        df.update(terms.keys())
+    vectors = {}
+    for telegram_id, terms in documents.items():
+        weights = {term: (1 + math.log(count)) * (math.log((1 + len(documents)) / (1 + df[term])) + 1)
+                   for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        vectors[telegram_id] = {term: weight / norm for term, weight in weights.items()}
+    return vectors
+
+def _cosine(vector1, vector2):
+    return sum(weight * vector2.get(term, 0) for term, weight in vector1.items())
+
+def test_tokenize_stems_and_drops_stop_words():
+    assert tokenize('Люблю книги и книгами, ёлки!') == ['книг', 'книг', 'елк']
+    assert tokenize('') == []
+
+def test_rebuild_matches_dense_tfidf():
+    store = BioVectorStore()
+    store.rebuild(BIOS.items())
+    expected = _dense_tfidf(BIOS)
+    numbers = {number: term for term, number in store.vocabulary.items()}
+
+    assert dict(store.items()).keys() == expected.keys()
+    for telegram_id, (indices, weights) in store.items():
+        assert list(indices) == sorted(indices)
+        actual = {numbers[int(index)]: float(weight) for index, weight in zip(indices, weights)}
+        assert actual.keys() == expected[telegram_id].keys()
+        for term, weight in expected[telegram_id].items():
+            assert actual[term] == pytest.approx(weight, rel=1e-6)
+
+def test_similarity_is_cosine():
+    store = BioVectorStore()
+    store.rebuild(BIOS.items())
+    expected = _dense_tfidf(BIOS)
+
+    similarity = store.similarity_many(1, [1, 2, 3, 4, 5, 99])
+    for telegram_id, value in zip([1, 2, 3, 4], similarity):
+        assert value == pytest.approx(_cosine(expected[1], expected[telegram_id]), abs=1e-6)
+    assert similarity[0] == pytest.approx(1.0, abs=1e-6)
+    assert similarity[2] == 0
+    # Без вектора с любой стороны - NaN
+    assert np.isnan(similarity[4]) and np.isnan(similarity[5])
+    assert store.similarity(5, 1) is None
+    assert store.similarity(1, 2) == pytest.approx(similarity[1])
+
+def test_update_uses_current_idf():
+    store = BioVectorStore()
+    store.rebuild(BIOS.items())
+    store.update(3, 'горы и книги')
+
+    bios = {**BIOS, 3: 'горы и книги'}
+    expected = _dense_tfidf(bios)
+    numbers = {number: term for term, number in store.vocabulary.items()}
+    indices, weights = dict(store.items())[3]
+    actual = {numbers[int(index)]: float(weight) for index, weight in zip(indices, weights)}
+    assert actual == pytest.approx(expected[3], rel=1e-6)
+    assert store.get_stats()['documents'] == 4
+
+    # Новое слово получает следующий номер словаря
+    new_terms, vector = store.update(6, 'шахматы')
+    assert new_terms == [(len(store.vocabulary) - 1, 'шахмат')]
+    assert store.update(6, '')[1] is None
+    assert store.get_stats()['documents'] == 4
+
+def test_rolled_back_write_leaves_vectors_untouched(database, make_user):
+    make_user(1, bio='люблю книги и горы')
+    make_user(2, bio='горы и долгие походы')
+    before = database.bio_vectors.get_stats()
+    vocabulary = dict(database.bio_vectors.vocabulary)
+
+    def failing(connection):
+        database._write_bio_vector(connection.cursor(), 1, 'совершенно новые слова')
+        raise RuntimeError("write failed")
+
+    with pytest.raises(RuntimeError):
+        database.pool.write(failing)
+    assert database.bio_vectors.get_stats() == before
+    assert database.bio_vectors.vocabulary == vocabulary
+    assert database.bio_vectors.similarity(1, 2) > 0
+
+    # После успешной записи память и таблицы снова совпадают
+    make_user(1, bio='совершенно новые слова про горы')
+    reader = database.pool.reader()
+    loaded = BioVectorStore()
+    loaded.load(reader.execute("SELECT term_id, term FROM bio_vocabulary").fetchall(),
+                reader.execute("SELECT user_id, terms, weights FROM bio_vectors").fetchall())
+    assert loaded.vocabulary == database.bio_vectors.vocabulary
+    assert loaded.get_stats() == database.bio_vectors.get_stats()
+    assert np.array_equal(loaded.similarity_many(1, [1, 2]), database.bio_vectors.similarity_many(1, [1, 2]))
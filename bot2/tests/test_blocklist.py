@@ -0,0 +1,61 @@
+# test_blocklist.py
+"""Блок-лист в памяти: порядок снятия временных банов"""
+from datetime import datetime, timedelta
+
+from database import BlocklistIndex
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+def test_pop_expired_in_expiry_order():
+    blocklist = BlocklistIndex()
+    blocklist.load([
+        (1, (NOW + timedelta(days=3)).isoformat()),
+        (2, NOW - timedelta(hours=1)),
+        (3, None),
+        (4, (NOW - timedelta(days=2)).isoformat()),
+    ])
+    blocklist.add(5, NOW - timedelta(days=1))
+    blocklist.add(6, NOW + timedelta(hours=1))
+
+    assert blocklist.pop_expired(NOW) == [4, 5, 2]
+    assert blocklist.pop_expired(NOW) == []
+    assert [blocklist.is_blocked(telegram_id) for telegram_id in range(1, 7)] == [True, False, True, False, False, True]
+
+    # Бессрочный бан не истекает никогда
+    assert blocklist.pop_expired(NOW + timedelta(days=3650)) == [6, 1]
+    assert blocklist.is_blocked(3)
+    assert len(blocklist) == 1
+
+def test_stale_heap_entries_are_skipped():
+    blocklist = BlocklistIndex()
+    blocklist.add(1, NOW - timedelta(days=1))
+    blocklist.add(2, NOW - timedelta(days=1))
+    blocklist.add(3, NOW - timedelta(days=1))
+
+    # Разбан, продление и перевод в бессрочный оставляют в куче старые сроки
+    blocklist.remove(1)
+    blocklist.add(2, NOW + timedelta(days=7))
+    blocklist.add(3)
+
+    assert blocklist.pop_expired(NOW) == []
+    assert not blocklist.is_blocked(1)
+    assert blocklist.is_blocked(2) and blocklist.is_blocked(3)
+    assert blocklist.pop_expired(NOW + timedelta(days=8)) == [2]
+    assert blocklist.is_blocked(3)
+
+def test_expired_ban_is_lifted_in_database(database, make_user):
+    make_user(1)
+    make_user(2)
+    assert database.block_user(1, '7days')
+    assert database.block_user(2, 'permanent')
+    assert database.is_user_blocked(1) and database.is_user_blocked(2)
+
+    # Срок бана прошел, пока бот был остановлен
+    database.pool.execute("UPDATE blocked_users SET blocked_until = ? WHERE telegram_id = 1",
+                          ((datetime.now() - timedelta(minutes=1)).isoformat(),))
+    database.load_blocklist()
+
+    assert not database.is_user_blocked(1)
+    assert database.is_user_blocked(2)
+    rows = database.pool.reader().execute("SELECT telegram_id FROM blocked_users").fetchall()
+    assert [row[0] for row in rows] == [2]
@@ -0,0 +1,113 @@
+# test_candidate_index.py
+"""CandidateIndex против перебора всех анкет"""
+import random
+
+import numpy as np
+
+from candidate_index import CandidateIndex, GENDERS, swipe_partitions
+from geo_index import cell_of, covering_cells, haversine_km
+
+TARGET_GENDERS = ('👨 Парни', '👩 Девушки', '💝 Не важно')
+CENTER = (56.48, 84.95)
+RADIUS_KM = 60
+
+def _random_row(rng, telegram_id, created_at):
+    row = {
+        'telegram_id': telegram_id,
+        'age': rng.randint(18, 40),
+        'gender': rng.choice(GENDERS),
+        'target_gender': rng.choice(TARGET_GENDERS),
+        'city': rng.choice(['Томск', 'Северск']),
+        'trust_score': rng.randint(0, 5),
+        'created_at': created_at,
+        'is_active': rng.random() > 0.1,
+        'interests_mask': rng.getrandbits(16),
+        'latitude': None,
+        'longitude': None,
+        'geo_cell': None,
+    }
+    if rng.random() < 0.7:
+        row['latitude'] = CENTER[0] + rng.uniform(-1.2, 1.2)
+        row['longitude'] = CENTER[1] + rng.uniform(-1.5, 1.5)
+        row['geo_cell'] = cell_of(row['latitude'], row['longitude'])
+    return row
+
+def _brute_force(rows, keys, min_age, max_age, exclude):
+    keys = set(keys)
+    matched = []
+    for row in rows.values():
+        place = row['geo_cell'] if row['geo_cell'] is not None else row['city']
+        if not row['is_active'] or (place, row['gender'], row['target_gender']) not in keys:
+            continue
+        if not min_age <= row['age'] <= max_age or row['telegram_id'] in exclude:
+            continue
+        if row['geo_cell'] is not None:
+            # Те же float32, что хранит индекс
+            distance = haversine_km(CENTER[0], CENTER[1], np.float32([row['latitude']]), np.float32([row['longitude']]))
+            if distance[0] > RADIUS_KM:
+                continue
+        matched.append(row)
+    matched.sort(key=lambda row: (-row['trust_score'], -row['created_at']))
+    return [row['telegram_id'] for row in matched]
+
+def _check_queries(index, rows, rng):
+    for _ in range(20):
+        viewer = {'gender': rng.choice(GENDERS), 'target_gender': rng.choice(TARGET_GENDERS)}
+        keys = swipe_partitions(viewer, covering_cells(CENTER[0], CENTER[1], RADIUS_KM) + ['Томск'])
+        min_age = rng.randint(18, 30)
+        max_age = min_age + rng.randint(0, 10)
+        exclude = set(rng.sample(sorted(rows), 30))
+        found = index.candidates(keys, min_age, max_age, exclude=exclude, center=CENTER, radius_km=RADIUS_KM)
+        assert found['telegram_id'].tolist() == _brute_force(rows, keys, min_age, max_age, exclude)
+    assert len(index) == sum(row['is_active'] for row in rows.values())
+
+def test_candidates_match_brute_force():
+    rng = random.Random(19)
+    rows = {}
+    for telegram_id in range(1, 1501):
+        rows[telegram_id] = _random_row(rng, telegram_id, created_at=telegram_id)
+
+    index = CandidateIndex()
+    index.load(rows.values())
+    _check_queries(index, rows, rng)
+
+    # Обновления на месте, переезды между разделами и новые анкеты
+    created_at = len(rows)
+    for telegram_id in rng.sample(sorted(rows), 400) + list(range(1501, 1601)):
+        created_at += 1
+        rows[telegram_id] = _random_row(rng, telegram_id, created_at)
+        index.upsert(rows[telegram_id])
+    _check_queries(index, rows, rng)
+
+    # Массовые отключения приводят к уплотнению разделов
+    for telegram_id in rng.sample(sorted(rows), 1200):
+        if rng.random() < 0.5:
+            rows[telegram_id]['is_active'] = False
+            index.upsert(rows[telegram_id])
+        else:
+            rows[telegram_id]['is_active'] = False
+            index.remove(telegram_id)
+    _check_queries(index, rows, rng)
+
+    # После уплотнения позиции указывают на правильные строки
+    for telegram_id in [telegram_id for telegram_id, row in rows.items() if row['is_active']][:100]:
+        rows[telegram_id]['age'] = 18 + (rows[telegram_id]['age'] + 7) % 23
+        rows[telegram_id]['trust_score'] += 1
+        index.upsert(rows[telegram_id])
+    _check_queries(index, rows, rng)
+
+def test_compaction_keeps_partition_rows():
+    index = CandidateIndex()
+    rows = [{'telegram_id': telegram_id, 'age': 25, 'gender': 'Мужской', 'target_gender': '💝 Не важно',
+             'city': 'Томск', 'is_active': True, 'trust_score': 0, 'created_at': telegram_id}
+            for telegram_id in range(1, 201)]
+    index.load(rows)
+    for row in rows[:150]:
+        index.remove(row['telegram_id'])
+
+    key = ('Томск', 'Мужской', '💝 Не важно')
+    partition = index._partitions[key]
+    assert partition.dead < 150  # раздел уплотнялся по дороге
+    assert partition.size - partition.dead == 50
+    found = index.candidates([key], 18, 99)
+    assert sorted(found['telegram_id'].tolist()) == list(range(151, 201))
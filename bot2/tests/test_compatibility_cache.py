@@ -0,0 +1,63 @@
+# test_compatibility_cache.py
+"""Кэш совместимости: записи пары сбрасываются, когда растет версия профиля"""
+from database import CompatibilityCache, ProfileCache
+from profile_codec import INTEREST_NAMES
+
+def _result(score):
+    return {'total_score': score, 'breakdown': {'interests': score}}
+
+def test_version_change_invalidates_only_that_profile():
+    profiles = ProfileCache()
+    cache = CompatibilityCache(profiles)
+    for other_id in (2, 3):
+        cache.put(1, other_id, _result(other_id), cache.versions(1, other_id))
+    cache.put(3, 4, _result(34), cache.versions(3, 4))
+
+    # Пара симметрична, наружу отдается копия
+    assert cache.get(2, 1)['total_score'] == 2
+    cache.get(1, 2)['breakdown']['interests'] = 0
+    assert cache.get(1, 2)['breakdown']['interests'] == 2
+
+    profiles.invalidate(3)
+    assert cache.get(1, 3) is None
+    assert cache.get(4, 3) is None
+    assert cache.get(1, 2)['total_score'] == 2
+
+def test_invalidation_during_calculation_is_not_cached():
+    profiles = ProfileCache()
+    cache = CompatibilityCache(profiles)
+
+    versions = cache.versions(1, 2)  # до чтения профилей
+    profiles.invalidate(2)  # анкету правят, пока считается оценка
+    cache.put(1, 2, _result(50), versions)
+
+    assert cache.get(1, 2) is None
+    cache.put(1, 2, _result(60), cache.versions(1, 2))
+    assert cache.get(1, 2)['total_score'] == 60
+
+def test_invalidation_with_evicted_versions():
+    profiles = ProfileCache(max_versions=2)
+    cache = CompatibilityCache(profiles)
+    cache.put(1, 2, _result(12), cache.versions(1, 2))
+
+    # Версии 1 и 2 вытеснены чужими правками: версия по умолчанию выросла
+    for telegram_id in range(10, 20):
+        profiles.invalidate(telegram_id)
+    assert cache.get(1, 2) is None
+
+def test_profile_edit_recalculates(database, make_user):
+    make_user(1, interests=INTEREST_NAMES[:4])
+    make_user(2, interests=INTEREST_NAMES[:4])
+    before = database.calculate_compatibility(1, 2)
+    assert database.calculate_compatibility(2, 1) == before
+    hits = database.compatibility_cache.get_stats()['hits']
+    assert hits >= 1
+
+    make_user(2, interests=INTEREST_NAMES[8:12])
+    after = database.calculate_compatibility(1, 2)
+
+    assert database.compatibility_cache.get_stats()['hits'] == hits
+    assert after['breakdown']['interests'] < before['breakdown']['interests']
+    assert after == database.compatibility_system.calculate_advanced_compatibility(
+        database.get_user(1), database.get_user(2)
+    )
@@ -0,0 +1,85 @@
+# test_connection_manager.py
+"""Групповая фиксация писателя и видимость записей читателям"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from database import ConnectionManager
+
+@pytest.fixture
+def pool(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'pool.db'))
+    manager.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    yield manager
+    manager.close()
+
+def _wait_for_queue(pool, size, timeout=10):
+    deadline = time.monotonic() + timeout
+    while pool._queue.qsize() < size:
+        assert time.monotonic() < deadline, "writes did not reach the writer queue"
+        time.sleep(0.01)
+
+def test_failed_write_rolls_back_only_its_savepoint(pool):
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocker(connection):
+        started.set()
+        release.wait(10)
+
+    def failing(connection):
+        connection.execute("INSERT INTO items (id, name) VALUES (2, 'lost')")
+        raise ValueError("job failed")
+
+    executor = ThreadPoolExecutor(max_workers=4)
+    try:
+        # Пока писатель занят, остальные записи копятся в очереди и уходят одной транзакцией
+        blocked = executor.submit(pool.write, blocker)
+        assert started.wait(10)
+        first = executor.submit(pool.execute, "INSERT INTO items (id, name) VALUES (1, 'first')")
+        _wait_for_queue(pool, 1)
+        failed = executor.submit(pool.write, failing)
+        _wait_for_queue(pool, 2)
+        last = executor.submit(pool.execute, "INSERT INTO items (id, name) VALUES (3, 'last')")
+        _wait_for_queue(pool, 3)
+        release.set()
+
+        blocked.result(10)
+        assert first.result(10) == 1
+        with pytest.raises(ValueError):
+            failed.result(10)
+        assert last.result(10) == 1
+    finally:
+        release.set()
+        executor.shutdown()
+
+    # CREATE TABLE, блокирующая запись и одна общая транзакция на три записи
+    assert pool.stats['batches'] == 3
+    assert pool.stats['writes'] == 5
+    assert pool.stats['failed_writes'] == 1
+    rows = pool.reader().execute("SELECT id, name FROM items ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows] == [(1, 'first'), (3, 'last')]
+
+def test_failed_write_inside_write_is_not_committed(pool):
+    with pytest.raises(Exception):
+        pool.execute("INSERT INTO items (id, name) VALUES (1, NULL)")
+    assert pool.reader().execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
+def test_readers_see_committed_writes(pool):
+    reader_thread = ThreadPoolExecutor(max_workers=1)
+    try:
+        count = lambda: pool.reader().execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        # Соединение читателя открыто до записи и закреплено за своим потоком
+        assert reader_thread.submit(count).result(10) == 0
+
+        pool.executemany("INSERT INTO items (name) VALUES (?)", [('a',), ('b',)])
+        assert reader_thread.submit(count).result(10) == 2
+        assert count() == 2
+
+        # Читатель только читает
+        with pytest.raises(Exception):
+            pool.reader().execute("INSERT INTO items (name) VALUES ('c')")
+    finally:
+        reader_thread.shutdown()
@@ -0,0 +1,93 @@
+# test_counter_buffer.py
+"""Отложенная запись счетчиков: сброс, возврат в буфер при ошибке, ключ дня"""
+import pytest
+
+from database import ConnectionManager, CounterBuffer
+
+SCHEMA = [
+    """CREATE TABLE daily_stats (
+        user_id INTEGER, date TEXT, likes_given INTEGER DEFAULT 0, likes_received INTEGER DEFAULT 0,
+        views_given INTEGER DEFAULT 0, views_received INTEGER DEFAULT 0, UNIQUE(user_id, date)
+    )""",
+    """CREATE TABLE profile_views (
+        viewer_id INTEGER, viewed_id INTEGER, view_count INTEGER DEFAULT 1, last_viewed TEXT,
+        UNIQUE(viewer_id, viewed_id)
+    )""",
+    "CREATE TABLE users (telegram_id INTEGER PRIMARY KEY, trust_score INTEGER DEFAULT 0)",
+]
+
+@pytest.fixture
+def pool(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'counters.db'))
+    for statement in SCHEMA:
+        manager.execute(statement)
+    manager.execute("INSERT INTO users (telegram_id) VALUES (1), (2)")
+    yield manager
+    manager.close()
+
+@pytest.fixture
+def counters(pool):
+    # Таймер не мешает: сбрасываем вручную
+    buffer = CounterBuffer(pool, flush_interval=3600, max_pending=10 ** 6)
+    yield buffer
+    buffer.close()
+
+def _fetch(pool, sql, params=()):
+    return [tuple(row) for row in pool.reader().execute(sql, params).fetchall()]
+
+def test_flush_writes_all_counters(pool, counters):
+    counters.add_daily_stat(1, 'likes_given')
+    counters.add_daily_stat(1, 'likes_given')
+    counters.add_daily_stat(2, 'likes_received', 2)
+    counters.add_profile_view(1, 2)
+    counters.add_profile_view(1, 2)
+    counters.add_trust(2, 5)
+    counters.add_trust(2, -1)
+
+    assert counters.flush() == 4
+    assert counters.flush() == 0
+    today = _fetch(pool, "SELECT date('now')")[0][0]
+    assert _fetch(pool, "SELECT user_id, date, likes_given, likes_received FROM daily_stats ORDER BY user_id") == [
+        (1, today, 2, 0), (2, today, 0, 2)
+    ]
+    assert _fetch(pool, "SELECT viewer_id, viewed_id, view_count FROM profile_views") == [(1, 2, 2)]
+    assert _fetch(pool, "SELECT trust_score FROM users WHERE telegram_id = 2") == [(4,)]
+
+    # Следующий сброс складывается с уже записанным
+    counters.add_profile_view(1, 2)
+    counters.add_daily_stat(1, 'likes_given')
+    counters.flush()
+    assert _fetch(pool, "SELECT view_count FROM profile_views") == [(3,)]
+    assert _fetch(pool, "SELECT likes_given FROM daily_stats WHERE user_id = 1") == [(3,)]
+
+def test_daily_key_matches_sqlite_date(pool, counters):
+    counters.add_daily_stat(1, 'views_given')
+    today = _fetch(pool, "SELECT date('now')")[0][0]
+    assert CounterBuffer.today() == today
+    assert counters.pending_daily(1, today) == {'views_given': 1}
+
+def test_failed_flush_restores_buffer(pool, counters, monkeypatch):
+    counters.add_daily_stat(1, 'views_given')
+    counters.add_profile_view(1, 2)
+    counters.add_trust(1, 3)
+
+    def failing_write(func):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(pool, 'write', failing_write)
+    assert counters.flush() == 0
+    assert counters.stats['failed_flushes'] == 1
+    monkeypatch.undo()
+
+    # Возвращенные дельты видны читателям и складываются с новыми
+    today = CounterBuffer.today()
+    assert counters.pending_daily(1, today) == {'views_given': 1}
+    assert counters.pending_trust(1) == 3
+    assert counters.pending_viewers(2) == {1}
+    counters.add_daily_stat(1, 'views_given')
+    counters.add_profile_view(1, 2)
+
+    assert counters.flush() == 3
+    assert _fetch(pool, "SELECT views_given FROM daily_stats WHERE user_id = 1") == [(2,)]
+    assert _fetch(pool, "SELECT view_count FROM profile_views") == [(2,)]
+    assert _fetch(pool, "SELECT trust_score FROM users WHERE telegram_id = 1") == [(3,)]
@@ -0,0 +1,47 @@
+# test_feed.py
+"""Просмотры анкет в ленте"""
+import asyncio
+
+import modules.feed as feed
+from database import AsyncDatabase
+
+def _view_count(database, viewer_id, viewed_id):
+    database.counters.flush()
+    row = database.pool.reader().execute("""
+        SELECT view_count FROM profile_views WHERE viewer_id = ? AND viewed_id = ?
+    """, (viewer_id, viewed_id)).fetchone()
+    return row[0] if row else 0
+
+def _daily_stat(database, user_id, stat_type):
+    database.counters.flush()
+    row = database.pool.reader().execute(
+        f"SELECT COALESCE(SUM({stat_type}), 0) FROM daily_stats WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    return row[0]
+
+def test_like_counts_one_view(database, make_user, monkeypatch):
+    make_user(1)
+    make_user(2)
+    database.push_feed(1, [2])
+    monkeypatch.setattr(feed, 'adb', AsyncDatabase(database))
+
+    # Так же, как handle_inline_swipe: лайк, затем снятие анкеты с очереди
+    assert database.process_like(1, 2)['success']
+    asyncio.run(feed.FeedManager().advance(1, 2))
+
+    assert _view_count(database, 1, 2) == 1
+    assert _daily_stat(database, 1, 'views_given') == 1
+    assert _daily_stat(database, 2, 'views_received') == 1
+    assert database.get_feed(1) == []
+
+def test_skip_counts_one_view(database, make_user, monkeypatch):
+    make_user(1)
+    make_user(2)
+    database.push_feed(1, [2])
+    monkeypatch.setattr(feed, 'adb', AsyncDatabase(database))
+
+    assert database.skip_profile(1, 2)
+    asyncio.run(feed.FeedManager().advance(1, 2))
+
+    assert _view_count(database, 1, 2) == 1
+    assert _daily_stat(database, 1, 'views_given') == 1
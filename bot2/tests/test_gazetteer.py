@@ -0,0 +1,63 @@
+# test_gazetteer.py
+"""Ближайший пункт по KD-дереву против перебора по haversine"""
+import os
+
+import numpy as np
+import pytest
+
+from gazetteer import LEAF_SIZE, Gazetteer, read_gazetteer
+from geo_index import haversine_km
+
+CITIES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'gazetteer', 'cities.tsv')
+
+def _random_points(rng, count):
+    # Равномерно по сфере, без скопления у полюсов
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+    longitudes = rng.uniform(-180, 180, count)
+    return latitudes, longitudes
+
+def _assert_matches_brute_force(gazetteer, latitudes, longitudes):
+    for latitude, longitude in zip(latitudes, longitudes):
+        distances = haversine_km(float(latitude), float(longitude), gazetteer.latitudes, gazetteer.longitudes)
+        result = gazetteer.nearest(float(latitude), float(longitude))
+        assert result['distance_km'] == pytest.approx(distances.min(), abs=0.1)
+        # Совпадение названия - если ближайший пункт единственный
+        second = np.partition(distances, 1)[1] if len(distances) > 1 else np.inf
+        if second - distances.min() > 0.01:
+            assert result['name'] == gazetteer.names[int(distances.argmin())]
+
+def test_nearest_random_world():
+    rng = np.random.default_rng(17)
+    latitudes, longitudes = _random_points(rng, 3000)
+    gazetteer = Gazetteer((f'P{number}', latitude, longitude, 0, [])
+                          for number, (latitude, longitude) in enumerate(zip(latitudes, longitudes)))
+
+    query_latitudes, query_longitudes = _random_points(rng, 300)
+    # Полюса и 180-й меридиан: соседи по разные стороны от линии разреза координат
+    query_latitudes = np.concatenate([query_latitudes, [90, -90, 89.9, 0, 65, -40]])
+    query_longitudes = np.concatenate([query_longitudes, [0, 0, 45, 180, -179.99, 179.99]])
+    _assert_matches_brute_force(gazetteer, query_latitudes, query_longitudes)
+
+def test_nearest_dense_cluster():
+    # Плотное скопление, как пункты одной области: много листьев с близкими границами
+    rng = np.random.default_rng(23)
+    latitudes = 56.5 + rng.normal(0, 0.5, 20 * LEAF_SIZE)
+    longitudes = 85.0 + rng.normal(0, 0.8, 20 * LEAF_SIZE)
+    gazetteer = Gazetteer((f'P{number}', latitude, longitude, 0, [])
+                          for number, (latitude, longitude) in enumerate(zip(latitudes, longitudes)))
+
+    _assert_matches_brute_force(gazetteer, 56.5 + rng.uniform(-2, 2, 200), 85.0 + rng.uniform(-3, 3, 200))
+
+def test_small_and_empty():
+    assert Gazetteer().nearest(56.5, 85.0) is None
+    gazetteer = Gazetteer([('Томск', 56.4977, 84.9744, 570000, ['Tomsk'])])
+    result = gazetteer.nearest(55.0084, 82.9357)
+    assert result['name'] == 'Томск'
+    assert result['distance_km'] == pytest.approx(209, abs=1)
+
+@pytest.mark.skipif(not os.path.exists(CITIES_PATH), reason='нет data/gazetteer/cities.tsv')
+def test_nearest_shipped_gazetteer():
+    gazetteer = Gazetteer(read_gazetteer(CITIES_PATH))
+    assert len(gazetteer) > 0
+    rng = np.random.default_rng(29)
+    _assert_matches_brute_force(gazetteer, rng.uniform(41, 70, 300), rng.uniform(20, 180, 300))
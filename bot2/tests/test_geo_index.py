@@ -0,0 +1,49 @@
+# test_geo_index.py
+"""Сетка geo_index и поиск по радиусу вместе с разделом города"""
+import math
+import random
+
+import numpy as np
+import pytest
+
+from geo_index import EARTH_RADIUS_KM, cell_of, covering_cells, haversine_km
+from config import config
+
+@pytest.mark.parametrize('start, end, expected_km', [
+    ((56.48, 84.95), (56.48, 84.95), 0),
+    ((0.0, 0.0), (1.0, 0.0), math.pi * EARTH_RADIUS_KM / 180),  # градус меридиана
+    ((0.0, 0.0), (0.0, 90.0), math.pi * EARTH_RADIUS_KM / 2),  # четверть экватора
+    ((0.0, 179.5), (0.0, -179.5), math.pi * EARTH_RADIUS_KM / 180),  # через 180-й меридиан
+    ((55.7558, 37.6173), (59.9343, 30.3351), 633),  # Москва - Санкт-Петербург
+    ((56.4977, 84.9744), (55.0084, 82.9357), 209),  # Томск - Новосибирск
+])
+def test_haversine_known_distances(start, end, expected_km):
+    distance = haversine_km(start[0], start[1], np.array([end[0]]), np.array([end[1]]))[0]
+    assert distance == pytest.approx(expected_km, abs=1)
+
+@pytest.mark.parametrize('center, radius_km', [
+    ((56.48, 84.95), 50),
+    ((56.48, 84.95), 150),
+    ((0.1, 179.9), 80),  # круг через 180-й меридиан
+    ((89.5, 10.0), 100),  # круг через полюс
+])
+def test_covering_cells_contain_points_within_radius(center, radius_km):
+    rng = random.Random(1)
+    cells = set(covering_cells(center[0], center[1], radius_km))
+    latitudes = np.array([max(-90.0, min(90.0, center[0] + rng.uniform(-3, 3))) for _ in range(5000)])
+    longitudes = np.array([(center[1] + rng.uniform(-6, 6) + 180) % 360 - 180 for _ in range(5000)])
+    inside = haversine_km(center[0], center[1], latitudes, longitudes) <= radius_km
+    assert inside.any()
+    for latitude, longitude in zip(latitudes[inside], longitudes[inside]):
+        assert cell_of(latitude, longitude) in cells
+
+def test_search_includes_own_city_without_coordinates(database, make_user, monkeypatch):
+    monkeypatch.setattr(config, 'MIN_COMPATIBILITY_SCORE', 0)
+    # У анкеты с координатами город, которого нет в справочнике: соседка из
+    # того же города без координат лежит в разделе города, а не в ячейке
+    make_user(1, city='Неведомск', latitude=56.48, longitude=84.95)
+    make_user(2, city='Неведомск')
+    make_user(4, city='Неведомск', latitude=56.49, longitude=84.96)
+    make_user(6, city='Другомск')
+
+    assert sorted(database.get_swipe_candidate_ids(1, radius_km=50)) == [2, 4]
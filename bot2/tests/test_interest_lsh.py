@@ -0,0 +1,85 @@
+# test_interest_lsh.py
+"""MinHash-подписи интересов и корзины LSH"""
+import random
+
+from interest_lsh import LSH_BANDS, SIGNATURE_SIZE, InterestLSH, minhash_signature
+from profile_codec import INTEREST_NAMES
+
+INTEREST_COUNT = len(INTEREST_NAMES)
+
+def _jaccard(first, second):
+    return bin(first & second).count('1') / bin(first | second).count('1')
+
+def _random_mask(rng, size):
+    return sum(1 << bit for bit in rng.sample(range(INTEREST_COUNT), size))
+
+def _flip_one(rng, mask):
+    # Заменяет один интерес на другой: у масок из 5+ интересов Жаккар от 0.67
+    bits = [bit for bit in range(INTEREST_COUNT) if mask >> bit & 1]
+    free = [bit for bit in range(INTEREST_COUNT) if not mask >> bit & 1]
+    return mask & ~(1 << rng.choice(bits)) | 1 << rng.choice(free)
+
+def test_signature_agreement_estimates_jaccard():
+    rng = random.Random(7)
+    errors = []
+    for _ in range(2000):
+        first, second = _random_mask(rng, rng.randint(1, 8)), _random_mask(rng, rng.randint(1, 8))
+        equal = sum(a == b for a, b in zip(minhash_signature(first), minhash_signature(second)))
+        errors.append(equal / SIGNATURE_SIZE - _jaccard(first, second))
+    # Оценка несмещенная: средняя ошибка около нуля, отдельная - в пределах разброса 16 значений
+    assert abs(sum(errors) / len(errors)) < 0.02
+    assert sum(abs(error) for error in errors) / len(errors) < 0.12
+
+def test_identical_mask_matches_every_band():
+    rng = random.Random(3)
+    lsh = InterestLSH()
+    masks = {telegram_id: _random_mask(rng, 4) for telegram_id in range(1, 200)}
+    for telegram_id, mask in masks.items():
+        lsh.insert(telegram_id, 'group', minhash_signature(mask))
+
+    for telegram_id, mask in masks.items():
+        hits = dict(lsh.query(['group'], minhash_signature(mask)))
+        assert hits[telegram_id] == LSH_BANDS
+        assert max(hits.values()) == LSH_BANDS
+
+def test_similar_masks_are_retrieved():
+    rng = random.Random(5)
+    lsh = InterestLSH()
+    pairs = []
+    for telegram_id in range(1, 301):
+        mask = _random_mask(rng, rng.randint(5, 8))
+        similar = _flip_one(rng, mask)
+        lsh.insert(telegram_id, 'group', minhash_signature(similar))
+        pairs.append((telegram_id, mask))
+
+    found = sum(telegram_id in dict(lsh.query(['group'], minhash_signature(mask))) for telegram_id, mask in pairs)
+    # При Жаккаре 0.67 кандидат не совпадает ни в одной полосе с вероятностью (1 - 0.67 ** 2) ** 8, около 0.3 %
+    assert found / len(pairs) >= 0.97
+
+def test_limit_keeps_most_similar_first():
+    lsh = InterestLSH()
+    base = 0b1111_1100
+    lsh.insert(1, 'group', minhash_signature(base))
+    lsh.insert(2, 'group', minhash_signature(base ^ 0b1100_0000 | 0b11))
+    lsh.insert(3, 'group', minhash_signature(0b1111 << 12))
+
+    assert lsh.query(['group'], minhash_signature(base), limit=1) == [(1, LSH_BANDS)]
+
+def test_groups_moves_and_empty_masks():
+    lsh = InterestLSH()
+    signature = minhash_signature(0b1011)
+    lsh.insert(1, 'a', signature)
+    lsh.insert(2, 'b', signature)
+    lsh.insert(3, 'a', minhash_signature(0))
+
+    assert dict(lsh.query(['a'], signature)) == {1: LSH_BANDS}
+    assert lsh.query(['a'], minhash_signature(0)) == []
+    assert len(lsh) == 2
+
+    # Повторная вставка переносит анкету, удаление не оставляет пустых корзин
+    lsh.insert(1, 'b', signature)
+    assert lsh.query(['a'], signature) == []
+    assert dict(lsh.query(['b'], signature)) == {1: LSH_BANDS, 2: LSH_BANDS}
+    lsh.remove(1)
+    lsh.remove(2)
+    assert lsh.get_stats() == {'users': 0, 'buckets': 0, 'largest_bucket': 0}
@@ -0,0 +1,56 @@
+# test_like_neighbours.py
+"""Соседи по лайкам против плотного L^T L"""
+import numpy as np
+import pytest
+
+from csr import take_rows
+from like_neighbours import item_neighbours
+
+def _dense_neighbours(likers, liked, top_k, min_co_likes):
+    items = np.unique(liked)
+    users = np.unique(likers)
+    matrix = np.zeros((len(users), len(items)), dtype=np.int64)
+    matrix[np.searchsorted(users, likers), np.searchsorted(items, liked)] = 1
+    co_likes = matrix.T @ matrix
+    like_counts = np.diag(co_likes)
+
+    expected = []
+    for row, user_id in enumerate(items):
+        pairs = [(co_likes[row, column] / np.sqrt(like_counts[row] * like_counts[column]), column)
+                 for column in range(len(items))
+                 if column != row and co_likes[row, column] >= min_co_likes]
+        pairs.sort(key=lambda pair: (-pair[0], pair[1]))
+        expected.extend((int(user_id), int(items[column]), int(co_likes[row, column]), score)
+                        for score, column in pairs[:top_k])
+    return expected
+
+@pytest.mark.parametrize('block_size', [None, 7])
+def test_item_neighbours_match_dense_product(monkeypatch, block_size):
+    if block_size:
+        # Несколько блоков анкет вместо одного
+        monkeypatch.setattr('like_neighbours.BLOCK_SIZE', block_size * 30)
+    rng = np.random.default_rng(11)
+    pairs = {(int(liker), int(liked)) for liker, liked in
+             zip(rng.integers(100, 140, 600), rng.integers(1000, 1030, 600))}
+    likers, liked = (np.array(column, dtype=np.int64) for column in zip(*sorted(pairs)))
+
+    result = item_neighbours(likers, liked, top_k=5, min_co_likes=2, max_likes_per_user=1000)
+    actual = list(zip(result['user_id'].tolist(), result['neighbour_id'].tolist(), result['co_likes'].tolist()))
+    expected = _dense_neighbours(likers, liked, top_k=5, min_co_likes=2)
+
+    assert actual == [row[:3] for row in expected]
+    np.testing.assert_allclose(result['score'], [row[3] for row in expected], rtol=1e-6)
+
+def test_max_likes_per_user_keeps_latest():
+    # Пользователь 1 лайкнул 10, 11, 12 по порядку; с лимитом 2 учитываются 11 и 12
+    likers = np.array([1, 1, 1, 2, 2], dtype=np.int64)
+    liked = np.array([10, 11, 12, 10, 11], dtype=np.int64)
+    result = item_neighbours(likers, liked, top_k=5, min_co_likes=1, max_likes_per_user=2)
+    pairs = set(zip(result['user_id'].tolist(), result['neighbour_id'].tolist()))
+    assert pairs == {(10, 11), (11, 10), (11, 12), (12, 11)}
+
+def test_take_rows():
+    indptr = np.array([0, 2, 2, 5, 6])
+    new_indptr, positions = take_rows(indptr, np.array([3, 1, 0, 2]))
+    assert new_indptr.tolist() == [0, 1, 1, 3, 6]
+    assert positions.tolist() == [5, 0, 1, 2, 3, 4]
@@ -0,0 +1,78 @@
+# test_likes.py
+"""Лайки одной транзакцией: матчи и дневная квота"""
+from concurrent.futures import ThreadPoolExecutor
+
+def _count(database, sql, params=()):
+    return database.pool.reader().execute(sql, params).fetchone()[0]
+
+def test_mutual_like_creates_one_match(database, make_user):
+    make_user(1)
+    make_user(2)
+
+    first = database.process_like(1, 2)
+    assert first['success'] and not first['is_mutual'] and not first['match_created']
+
+    second = database.process_like(2, 1)
+    assert second['success'] and second['is_mutual'] and second['match_created']
+    assert second['notification']['is_mutual']
+    assert {second['from_user']['telegram_id'], second['to_user']['telegram_id']} == {1, 2}
+
+    # Повторные лайки и суперлайк поверх лайка матч не дублируют
+    assert database.process_like(2, 1)['already_liked']
+    again = database.process_like(1, 2, is_super_like=True)
+    assert again['success'] and not again['match_created']
+
+    assert _count(database, "SELECT COUNT(*) FROM matches") == 1
+    assert _count(database, "SELECT COUNT(*) FROM likes") == 2
+    # Суперлайк поверх лайка уведомляет еще раз
+    assert _count(database, "SELECT COUNT(*) FROM like_notifications") == 3
+
+def test_concurrent_mutual_likes_create_one_match(database, make_user):
+    for telegram_id in range(1, 21):
+        make_user(telegram_id)
+    pairs = [(a, b) for a in range(1, 21, 2) for b in (a + 1,)]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda pair: database.process_like(*pair),
+                                    pairs + [(b, a) for a, b in pairs]))
+
+    assert all(result['success'] for result in results)
+    assert sum(result['match_created'] for result in results) == len(pairs)
+    assert _count(database, "SELECT COUNT(*) FROM matches") == len(pairs)
+
+def _likes_today(database, user_id):
+    return _count(database, "SELECT likes_today FROM users WHERE telegram_id = ?", (user_id,))
+
+def test_like_quota_limit(database, make_user):
+    for telegram_id in range(1, 6):
+        make_user(telegram_id)
+
+    assert database.process_like(1, 2, daily_limit=2)['success']
+    third = database.process_like(1, 3, daily_limit=2)
+    assert third['success'] and third['likes_today'] == 2
+
+    exceeded = database.process_like(1, 4, daily_limit=2)
+    assert exceeded['quota_exceeded'] and not exceeded['success']
+    assert _count(database, "SELECT COUNT(*) FROM likes WHERE from_user_id = 1 AND to_user_id = 4") == 0
+    assert _likes_today(database, 1) == 2
+
+    # Суперлайки считаются отдельно
+    super_like = database.process_like(1, 4, is_super_like=True, daily_limit=1)
+    assert super_like['success'] and super_like['super_likes_today'] == 1
+    assert database.process_like(1, 5, is_super_like=True, daily_limit=1)['quota_exceeded']
+    assert _likes_today(database, 1) == 2
+
+def test_like_quota_resets_next_day(database, make_user):
+    for telegram_id in range(1, 4):
+        make_user(telegram_id)
+    assert database.process_like(1, 2, daily_limit=1)['success']
+    assert database.process_like(1, 3, daily_limit=1)['quota_exceeded']
+
+    # Последнее списание было вчера: счетчик считается обнуленным
+    database.pool.execute("""
+        UPDATE users SET last_like_reset = datetime('now', '-1 day'), super_likes_today = 5
+        WHERE telegram_id = 1
+    """)
+    result = database.process_like(1, 3, daily_limit=1)
+    assert result['success'] and result['likes_today'] == 1 and result['super_likes_today'] == 0
+    assert database.process_like(1, 3, is_super_like=True, daily_limit=1)['success']
@@ -0,0 +1,116 @@
+# test_migrations.py
+"""Миграции с исходной схемы и их повторный запуск"""
+import json
+import os
+import sqlite3
+
+from database import Database
+from interest_lsh import minhash_signature
+from profile_codec import FEATURE_COLUMNS, encode_interests, profile_features
+
+BASELINE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_schema.sql')
+
+# Анкеты в том виде, как их писала исходная версия: интересы с эмодзи, время из isoformat()
+BASELINE_USERS = [
+    (1, '10000001', 'Аня', 23, 'Женский', '👨 Парни', 'люблю книги и спорт',
+     '["📚 Книги", "🏀 Спорт"]', 'Рак', 'Серьезные отношения', 'Активный спортсмен', 'Не курю и не пью',
+     None, None, 'Томск', '2024-05-01T10:15:30.123456'),
+    (2, '10000002', 'Борис', 27, 'Мужской', '👩 Девушки', 'музыка и кино',
+     '["🎵 Музыка", "Кино", "Неизвестное"]', None, 'Дружба и общение', None, None,
+     56.48, 84.95, None, '2024-05-02 08:00:00'),
+    (3, '10000003', 'Вера', 30, 'Женский', '💝 Не важно', 'природа',
+     'не json', None, None, None, None, None, None, 'Неведомск', '2024-05-03T00:00:00'),
+]
+
+def _create_baseline(path):
+    connection = sqlite3.connect(path)
+    with open(BASELINE_SCHEMA, encoding='utf-8') as schema:
+        connection.executescript(schema.read())
+    connection.executemany("""
+        INSERT INTO users (telegram_id, user_id, name, age, gender, target_gender, bio, interests, zodiac,
+                           relationship_goal, lifestyle, habits, latitude, longitude, city, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, BASELINE_USERS)
+    connection.execute("""
+        INSERT INTO likes (from_user_id, to_user_id, created_at) VALUES (1, 2, '2024-05-04T12:00:00.5')
+    """)
+    connection.execute("""
+        INSERT INTO viewed_profiles (viewer_id, viewed_id, created_at) VALUES (2, 1, '2024-05-04 12:00:01')
+    """)
+    connection.commit()
+    connection.close()
+
+def _dump(connection):
+    """Схема и содержимое всех таблиц"""
+    tables = [row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    dump = {'schema': sorted(tuple(row) for row in connection.execute("SELECT type, name, sql FROM sqlite_master"))}
+    for table in tables:
+        dump[table] = sorted((tuple(row) for row in connection.execute(f"SELECT * FROM {table}")), key=repr)
+    return dump
+
+def test_upgrade_from_baseline_schema(tmp_path):
+    path = str(tmp_path / 'baseline.db')
+    _create_baseline(path)
+
+    database = Database(path)
+    try:
+        reader = database.pool.reader()
+        assert reader.execute("PRAGMA user_version").fetchone()[0] == len(database.migrations())
+
+        # 1: время в формате CURRENT_TIMESTAMP
+        assert [row[0] for row in reader.execute("SELECT created_at FROM users ORDER BY telegram_id")] == [
+            '2024-05-01 10:15:30', '2024-05-02 08:00:00', '2024-05-03 00:00:00'
+        ]
+        assert reader.execute("SELECT created_at FROM likes").fetchone()[0] == '2024-05-04 12:00:00'
+
+        users = {row['telegram_id']: dict(row) for row in reader.execute("SELECT * FROM users")}
+        # 2: интересы без эмодзи и маска
+        assert json.loads(users[1]['interests']) == ['Книги', 'Спорт']
+        assert json.loads(users[2]['interests']) == ['Музыка', 'Кино', 'Неизвестное']
+        assert json.loads(users[3]['interests']) == []
+        for user in users.values():
+            interests = json.loads(user['interests'])
+            assert user['interests_mask'] == encode_interests(interests)
+            # 3: коды признаков
+            features = profile_features(dict(user, interests=interests))
+            assert [user[column] for column in FEATURE_COLUMNS] == [features[column] for column in FEATURE_COLUMNS]
+            # 5: подписи MinHash
+            assert user['interests_minhash'] == minhash_signature(user['interests_mask'])
+
+        # 4: ячейка по координатам, по городу из справочника; незнакомый город без ячейки
+        assert users[1]['geo_cell'] == database.location_system.geo_cell({'city': 'Томск'})
+        assert users[2]['geo_cell'] == database.location_system.geo_cell({'latitude': 56.48, 'longitude': 84.95})
+        assert users[3]['geo_cell'] is None
+
+        # 6: очередь ленты с источником кандидата
+        columns = [row['name'] for row in reader.execute("PRAGMA table_info(feed_queue)")]
+        assert 'source' in columns
+
+        assert database.get_user(1)['interests'] == ['Книги', 'Спорт']
+    finally:
+        database.close()
+
+def test_migrations_rerun_is_noop(tmp_path):
+    path = str(tmp_path / 'baseline.db')
+    _create_baseline(path)
+
+    database = Database(path)
+    try:
+        before = _dump(database.pool.reader())
+        # Все миграции заново поверх уже обновленной базы
+        database.pool.execute("PRAGMA user_version = 0")
+        database.run_migrations()
+        assert _dump(database.pool.reader()) == before
+        assert database.pool.reader().execute("PRAGMA user_version").fetchone()[0] == len(database.migrations())
+    finally:
+        database.close()
+
+    # Повторное открытие ничего не применяет
+    reopened = Database(path)
+    try:
+        reader = reopened.pool.reader()
+        assert reader.execute("PRAGMA user_version").fetchone()[0] == len(reopened.migrations())
+        assert _dump(reader)['users'] == before['users']
+    finally:
+        reopened.close()
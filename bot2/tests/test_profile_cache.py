@@ -0,0 +1,71 @@
+# test_profile_cache.py
+"""Кэш профилей: LRU, TTL, защита версией и ограничение числа версий"""
+import database
+from database import ProfileCache
+
+def _profile(telegram_id, name='Аня'):
+    return {'telegram_id': telegram_id, 'name': name, 'photos': ['p'], 'interests': ['Книги']}
+
+def test_lru_eviction():
+    cache = ProfileCache(max_size=2)
+    for telegram_id in (1, 2):
+        assert cache.put(telegram_id, _profile(telegram_id), cache.version(telegram_id))
+    assert cache.get(1) is not None  # 1 становится самым свежим
+    cache.put(3, _profile(3), cache.version(3))
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    assert cache.get_stats()['evictions'] == 1
+
+def test_returns_copies():
+    cache = ProfileCache()
+    cache.put(1, _profile(1), cache.version(1))
+    cache.get(1)['photos'].append('x')
+    assert cache.get(1)['photos'] == ['p']
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.time, 'monotonic', lambda: now[0])
+    cache = ProfileCache(ttl=60)
+    cache.put(1, _profile(1), cache.version(1))
+
+    now[0] += 59
+    assert cache.get(1) is not None
+    now[0] += 2
+    assert cache.get(1) is None
+    assert cache.get_stats()['size'] == 0
+
+def test_version_guard_rejects_stale_put():
+    cache = ProfileCache()
+    version = cache.version(1)  # чтение из базы началось
+    cache.invalidate(1)         # параллельная правка анкеты
+    assert not cache.put(1, _profile(1, 'старое'), version)
+    assert cache.get(1) is None
+
+    fresh = cache.version(1)
+    assert fresh != version
+    assert cache.put(1, _profile(1, 'новое'), fresh)
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+def test_versions_are_bounded():
+    cache = ProfileCache(max_size=10)
+    stale = {telegram_id: cache.version(telegram_id) for telegram_id in range(1000)}
+    for telegram_id in range(1000):
+        cache.invalidate(telegram_id)
+        assert len(cache._versions) <= 2 * cache.max_versions
+
+    # Версии вытесненных пользователей не совпадают со взятыми до правки
+    for telegram_id in range(1000):
+        assert not cache.put(telegram_id, _profile(telegram_id), stale[telegram_id])
+        assert cache.version(telegram_id) != stale[telegram_id]
+
+    # Вытеснение не открывает путь устаревшей записи: версия взята до правки,
+    # затем отметка пользователя вытеснена чужими правками
+    version = cache.version(5000)
+    cache.invalidate(5000)
+    for telegram_id in range(2000, 2100):
+        cache.invalidate(telegram_id)
+    assert 5000 not in cache._versions
+    assert not cache.put(5000, _profile(5000), version)
+    assert cache.put(5000, _profile(5000), cache.version(5000))
@@ -0,0 +1,60 @@
+# test_purge_views.py
+"""Очистка просмотров старше суток пачками с ограничением по времени"""
+import types
+
+import database as database_module
+
+EXPIRED = 1050
+FRESH = 10
+
+def _insert_views(database):
+    def _write(connection):
+        connection.executemany(
+            "INSERT INTO viewed_profiles (viewer_id, viewed_id, created_at) VALUES (?, ?, datetime('now', '-25 hours'))",
+            [(1, viewed_id) for viewed_id in range(EXPIRED)]
+        )
+        connection.executemany(
+            "INSERT INTO viewed_profiles (viewer_id, viewed_id) VALUES (?, ?)",
+            [(2, viewed_id) for viewed_id in range(FRESH)]
+        )
+    database.pool.write(_write)
+
+def _count_views(database):
+    return database.pool.reader().execute("SELECT viewer_id, COUNT(*) FROM viewed_profiles GROUP BY viewer_id").fetchall()
+
+def _count_batches(database, monkeypatch):
+    """Считает пачки; часы модуля database сдвигаются на секунду за пачку"""
+    clock = types.SimpleNamespace(now=0.0, batches=[])
+    execute = database.pool.execute
+
+    def _execute(sql, params=()):
+        deleted = execute(sql, params)
+        clock.batches.append(deleted)
+        clock.now += 1
+        return deleted
+
+    monkeypatch.setattr(database.pool, 'execute', _execute)
+    monkeypatch.setattr(database_module, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+def test_purge_deletes_in_batches_of_batch_size(database, monkeypatch):
+    _insert_views(database)
+    clock = _count_batches(database, monkeypatch)
+
+    assert database.purge_expired_views(batch_size=100, time_budget=3600) == EXPIRED
+    assert clock.batches == [100] * 10 + [50]
+    assert [tuple(row) for row in _count_views(database)] == [(2, FRESH)]
+
+def test_purge_stops_at_time_budget(database, monkeypatch):
+    _insert_views(database)
+    clock = _count_batches(database, monkeypatch)
+
+    # Бюджет 2.5 с: пачка, которая его превысила, последняя
+    assert database.purge_expired_views(batch_size=100, time_budget=2.5) == 300
+    assert [tuple(row) for row in _count_views(database)] == [(1, EXPIRED - 300), (2, FRESH)]
+
+    # Нулевой бюджет - ровно одна пачка; остаток дочищается следующими запусками
+    assert database.purge_expired_views(batch_size=200, time_budget=0) == 200
+    assert database.purge_expired_views(batch_size=1000, time_budget=0) == EXPIRED - 500
+    assert clock.batches == [100, 100, 100, 200, EXPIRED - 500]
+    assert database.purge_expired_views() == 0
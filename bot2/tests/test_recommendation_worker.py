@@ -0,0 +1,86 @@
+# test_recommendation_worker.py
+"""Расчет рекомендаций в отдельном процессе, который не импортирует database"""
+import os
+import subprocess
+import sys
+
+import recommendation_worker
+from candidate_index import CandidateIndex
+from recommendation_worker import compute_recommendations
+from snapshot_store import SnapshotWriter
+from config import config
+from geo_index import cell_of
+
+WEIGHTS = {'interests': 0.30, 'goals': 0.25, 'lifestyle': 0.20, 'personality': 0.15, 'habits': 0.10}
+
+def _publish_snapshot(root):
+    index = CandidateIndex()
+    index.load({
+        'telegram_id': telegram_id,
+        'age': 20 + telegram_id % 10,
+        'gender': 'Женский' if telegram_id % 2 else 'Мужской',
+        'target_gender': '💝 Не важно',
+        'city': config.MAIN_CITY,
+        'is_active': True,
+        'trust_score': telegram_id % 3,
+        'created_at': telegram_id,
+        'interests_mask': telegram_id * 37 % (1 << 16),
+    } for telegram_id in range(1, 41))
+    columns, meta = index.export()
+    return SnapshotWriter(root).publish(columns, meta)
+
+def test_worker_module_does_not_import_database():
+    code = "import sys, recommendation_worker; print('database' in sys.modules)"
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(recommendation_worker.__file__),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == 'False'
+
+def test_compute_does_not_run_parent_main(tmp_path, monkeypatch):
+    # Главный модуль, как у бота, при импорте открывает базу; здесь - оставляет метку
+    marker = tmp_path / 'main-imported'
+    main_script = tmp_path / 'fake_bot.py'
+    main_script.write_text(f"open({str(marker)!r}, 'w').close()\n")
+    main = sys.modules['__main__']
+    monkeypatch.setattr(main, '__file__', str(main_script), raising=False)
+    monkeypatch.setattr(main, '__spec__', None, raising=False)
+    monkeypatch.setattr(config, 'MIN_COMPATIBILITY_SCORE', 0)
+
+    root = str(tmp_path / 'snapshots')
+    generation = _publish_snapshot(root)
+    shards = []
+    stats = compute_recommendations(root, generation, 2, WEIGHTS,
+                                    on_shard=lambda user_ids, rows: shards.append((user_ids, rows)), chunk_size=7)
+
+    assert not marker.exists()
+    assert sorted(user_id for user_ids, _ in shards for user_id in user_ids) == list(range(1, 41))
+    assert stats['users'] == 40
+    assert stats['recommendations'] == sum(len(rows) for _, rows in shards) > 0
+
+    # Те же строки, что у расчета порции в текущем процессе
+    recommendation_worker._init_worker(root)
+    args = (config.MAX_DAILY_RECOMMENDATIONS, config.MIN_COMPATIBILITY_SCORE, config.AGE_RANGE,
+            (config.DEFAULT_SEARCH_RADIUS, config.PREMIUM_SEARCH_RADIUS), WEIGHTS)
+    _, expected = recommendation_worker._recommend_shard(generation, 0, 40, *args)
+    assert sorted(row for _, rows in shards for row in rows) == sorted(expected)
+
+def test_shard_includes_own_city_without_coordinates(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'MIN_COMPATIBILITY_SCORE', 0)
+    base = {'age': 25, 'target_gender': '💝 Не важно', 'city': 'Неведомск', 'is_active': True,
+            'trust_score': 0, 'created_at': 0, 'interests_mask': 3}
+    index = CandidateIndex()
+    index.load([
+        dict(base, telegram_id=1, gender='Женский', latitude=56.48, longitude=84.95, geo_cell=cell_of(56.48, 84.95)),
+        dict(base, telegram_id=2, gender='Мужской'),
+        dict(base, telegram_id=4, gender='Мужской', latitude=56.49, longitude=84.96, geo_cell=cell_of(56.49, 84.96)),
+        dict(base, telegram_id=6, gender='Мужской', latitude=60.0, longitude=90.0, geo_cell=cell_of(60.0, 90.0)),
+        dict(base, telegram_id=8, gender='Мужской', city='Другомск'),
+    ])
+    root = str(tmp_path / 'snapshots')
+    columns, meta = index.export()
+    generation = SnapshotWriter(root).publish(columns, meta)
+
+    recommendation_worker._init_worker(root)
+    args = (config.MAX_DAILY_RECOMMENDATIONS, config.MIN_COMPATIBILITY_SCORE, config.AGE_RANGE,
+            (config.DEFAULT_SEARCH_RADIUS, config.PREMIUM_SEARCH_RADIUS), WEIGHTS)
+    _, rows = recommendation_worker._recommend_shard(generation, 0, meta['rows'], *args)
+    assert sorted(candidate_id for viewer_id, candidate_id, _, _ in rows if viewer_id == 1) == [2, 4]
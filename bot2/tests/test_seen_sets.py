@@ -0,0 +1,75 @@
+# test_seen_sets.py
+"""Seen-set'ы: сериализация в BLOB, окно просмотров и вытеснение"""
+import pytest
+
+from database import SeenSet, SeenSetStore
+
+def test_blob_round_trip():
+    hour = SeenSet.current_hour()
+    seen = SeenSet(liked=[5, 3, 2 ** 40])
+    seen.add_view(7, hour)
+    seen.add_view(8, hour)
+    seen.add_view(9, hour - 5)
+
+    restored = SeenSet.from_blobs(*seen.to_blobs())
+    assert restored.liked == {5, 3, 2 ** 40}
+    assert restored.view_buckets == {hour: {7, 8}, hour - 5: {9}}
+    assert restored.ids(hour) == {5, 3, 2 ** 40, 7, 8, 9}
+
+    empty = SeenSet.from_blobs(None, None)
+    assert empty.liked == set() and empty.view_buckets == {}
+
+def test_views_expire_after_window():
+    hour = SeenSet.current_hour()
+    seen = SeenSet(liked=[1])
+    seen.add_view(2, hour - SeenSet.VIEW_WINDOW_HOURS)
+    seen.add_view(3, hour - SeenSet.VIEW_WINDOW_HOURS - 1)
+
+    assert seen.contains(2, hour)
+    assert not seen.contains(3, hour)
+    assert seen.ids(hour) == {1, 2}
+    # Часом позже выпадает и вторая корзина, лайки не истекают
+    assert seen.ids(hour + 1) == {1}
+    assert seen.contains(1, hour + 1000)
+
+    # Устаревшие корзины не сохраняются
+    restored = SeenSet.from_blobs(*seen.to_blobs())
+    assert set(restored.view_buckets) == {hour - SeenSet.VIEW_WINDOW_HOURS}
+
+@pytest.fixture
+def store(database):
+    seen_sets = SeenSetStore(database.pool, flush_interval=3600, max_users=3)
+    yield seen_sets
+    seen_sets.close()
+
+def test_store_evicts_clean_sets_over_limit(store):
+    for user_id in (1, 2, 3, 4):
+        store.get(user_id)
+    assert list(store._sets) == [2, 3, 4]
+
+    # Обращение поднимает набор в конец LRU
+    store.get(2)
+    store.get(5)
+    assert list(store._sets) == [4, 2, 5]
+
+    # Несохраненный набор не вытесняется, пока не сброшен в базу
+    store.add_view(4, 100)
+    for user_id in (6, 7, 8):
+        store.get(user_id)
+    assert list(store._sets) == [4, 7, 8]
+
+    assert store.flush() == 1
+    store.get(9)
+    assert list(store._sets) == [7, 8, 9]
+
+def test_store_round_trip_through_database(database, store):
+    store.add_like(1, 10)
+    store.add_view(1, 11)
+    assert store.flush() == 1
+
+    reloaded = SeenSetStore(database.pool, flush_interval=3600, max_users=3)
+    try:
+        assert reloaded.seen_ids(1) == {10, 11}
+        assert [row['telegram_id'] for row in reloaded.filter_unseen(1, [{'telegram_id': 10}, {'telegram_id': 12}])] == [12]
+    finally:
+        reloaded.close()
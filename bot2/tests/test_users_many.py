@@ -0,0 +1,33 @@
+# test_users_many.py
+"""get_users_many на пачках больше лимита параметров SQLite"""
+import sqlite3
+
+import pytest
+
+USERS = 2 * 999 + 7
+
+def _insert_users(database, telegram_ids):
+    def _write(connection):
+        connection.executemany("""
+            INSERT INTO users (telegram_id, user_id, name, age, gender, target_gender, bio, city)
+            VALUES (?, ?, ?, 25, 'Женский', '💝 Не важно', 'bio', 'Томск')
+        """, [(telegram_id, f'u{telegram_id}', f'User{telegram_id}') for telegram_id in telegram_ids])
+    database.pool.write(_write)
+
+@pytest.mark.skipif(not hasattr(sqlite3.Connection, 'setlimit'), reason='Connection.setlimit - Python 3.11+')
+def test_get_users_many_across_chunks(database, make_user):
+    _insert_users(database, range(1, USERS + 1))
+    # Лимит старых сборок SQLite: запрос с 1000 параметров упал бы
+    database.pool.reader().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    database.get_user(10)  # одна анкета уже в кэше
+    make_user(USERS + 1)
+    assert database.block_user(USERS + 1, 'permanent')
+
+    requested = list(range(USERS + 1, 0, -1)) + [10, 11, 10**9]
+    users = database.get_users_many(requested)
+
+    assert sorted(users) == list(range(1, USERS + 1))
+    assert all(user['telegram_id'] == telegram_id for telegram_id, user in users.items())
+    assert users[999]['name'] == 'User999' and users[1000]['name'] == 'User1000'
+    # Прочитанные пачкой анкеты попали в кэш
+    assert database.profile_cache.get(USERS) is not None